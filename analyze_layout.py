@@ -1,70 +1,141 @@
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextContainer, LTImage, LTFigure, LTLine, LTRect
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTChar, LTTextContainer, LTImage, LTFigure, LTLine, LTRect
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
 import re
 
-def analyze_pdf_layout(pdf_path):
-    """Analyze the complete layout of the PDF including text, images, lines, and boxes."""
-    elements = []
+class RegionAggregator(PDFPageAggregator):
+    """Page aggregator that can drop objects outside a crop box and skip
+    layout grouping on pages with no text of interest.
     
-    for page_layout in extract_pages(pdf_path):
-        for element in page_layout:
-            if isinstance(element, LTTextContainer):
-                text = element.get_text().strip()
-                if text:  # Only include non-empty text
-                    elements.append({
-                        'type': 'text',
-                        'content': text,
-                        'bbox': element.bbox,
-                        'x0': element.bbox[0],
-                        'y0': element.bbox[1],
-                        'x1': element.bbox[2],
-                        'y1': element.bbox[3]
-                    })
-            elif isinstance(element, (LTImage, LTFigure)):
-                elements.append({
-                    'type': 'image',
-                    'bbox': element.bbox,
-                    'x0': element.bbox[0],
-                    'y0': element.bbox[1],
-                    'x1': element.bbox[2],
-                    'y1': element.bbox[3]
-                })
-            elif isinstance(element, (LTLine, LTRect)):
-                elements.append({
-                    'type': 'shape',
-                    'bbox': element.bbox,
-                    'x0': element.bbox[0],
-                    'y0': element.bbox[1],
-                    'x1': element.bbox[2],
-                    'y1': element.bbox[3]
-                })
+    Both happen before LTPage.analyze, which is where pdfminer spends most
+    of its time, so the work saved grows with what's left out.
+    """
     
-    return elements
+    def __init__(self, rsrcmgr, laparams=None, crop_box=None, interesting=None):
+        super().__init__(rsrcmgr, laparams=laparams)
+        self.crop_box = crop_box
+        self.interesting = interesting
+        self.grouped = True
+    
+    def end_page(self, page):
+        page_item = self.cur_item
+        if self.crop_box is not None:
+            x0, y0, x1, y1 = self.crop_box
+            page_item._objs = [obj for obj in page_item._objs
+                               if obj.x0 <= x1 and x0 <= obj.x1 and obj.y0 <= y1 and y0 <= obj.y1]
+        
+        self.grouped = True
+        if self.interesting is not None:
+            text = "".join(obj.get_text() for obj in page_item._objs if isinstance(obj, LTChar))
+            self.grouped = bool(self.interesting.search(text))
+        
+        if self.grouped:
+            super().end_page(page)
+        else:
+            # Nothing of interest: keep the page's shapes and images, skip grouping
+            laparams, self.laparams = self.laparams, None
+            try:
+                super().end_page(page)
+            finally:
+                self.laparams = laparams
+
+# Helper function for building one element dict
+def _element(elem_type, page_number, bbox, content=None):
+    elem = {'type': elem_type, 'page': page_number}
+    if content is not None:
+        elem['content'] = content
+    elem.update({
+        'bbox': bbox,
+        'x0': bbox[0],
+        'y0': bbox[1],
+        'x1': bbox[2],
+        'y1': bbox[3]
+    })
+    return elem
+
+def iter_layout_elements(pdf_path, pages=None, crop_box=None, laparams=None, interesting=None):
+    """Lazily yield the layout elements (text, images, shapes) of a PDF, page by page.
+    
+    pages is an optional collection of 0-based page numbers to analyze
+    (None for all pages; an empty collection yields nothing).
+    crop_box is an optional (x0, y0, x1, y1) region in PDF coordinates
+    (origin bottom left); objects outside it are dropped before layout
+    analysis. interesting is an optional regex (string or compiled): pages
+    whose text doesn't match it skip layout grouping and yield only their
+    images and shapes.
+    """
+    if laparams is None:
+        laparams = LAParams()
+    if isinstance(interesting, str):
+        interesting = re.compile(interesting)
+    if pages is not None and not pages:
+        return
+    last_page = None if pages is None else max(pages)
+    
+    with open(pdf_path, 'rb') as fp:
+        rsrcmgr = PDFResourceManager()
+        device = RegionAggregator(rsrcmgr, laparams, crop_box, interesting)
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page_number, page in enumerate(PDFPage.get_pages(fp)):
+            if last_page is not None and page_number > last_page:
+                break
+            if pages is not None and page_number not in pages:
+                continue
+            interpreter.process_page(page)
+            
+            for element in device.get_result():
+                if isinstance(element, LTTextContainer):
+                    text = element.get_text().strip()
+                    if text:  # Only include non-empty text
+                        yield _element('text', page_number, element.bbox, text)
+                elif isinstance(element, (LTImage, LTFigure)):
+                    yield _element('image', page_number, element.bbox)
+                elif isinstance(element, (LTLine, LTRect)):
+                    yield _element('shape', page_number, element.bbox)
+
+def analyze_pdf_layout(pdf_path, pages=None, crop_box=None, laparams=None, interesting=None):
+    """Analyze the complete layout of the PDF including text, images, lines, and boxes.
+    
+    Takes the same options as iter_layout_elements and returns a list.
+    """
+    return list(iter_layout_elements(pdf_path, pages, crop_box, laparams, interesting))
+
+# Elements whose bottom edges are within this many points print as one row
+ROW_TOLERANCE = 5
 
 def print_layout_analysis(elements):
-    """Print the layout analysis in a structured way."""
+    """Print the layout analysis in a structured way, row by row from the top of each page."""
+    from spatial_index import SpatialIndex
+    index = SpatialIndex(elements)
     print("=== PDF Layout Analysis ===\n")
     
-    # Group elements by vertical position (roughly)
-    vertical_groups = {}
-    for elem in elements:
-        y_pos = round(elem['y0'] / 10) * 10  # Round to nearest 10 for grouping
-        if y_pos not in vertical_groups:
-            vertical_groups[y_pos] = []
-        vertical_groups[y_pos].append(elem)
-    
-    # Print elements by vertical position (top to bottom)
-    for y_pos in sorted(vertical_groups.keys(), reverse=True):
-        print(f"\nAt y ≈ {y_pos}:")
-        for elem in vertical_groups[y_pos]:
-            if elem['type'] == 'text':
-                print(f"  Text: '{elem['content']}' at ({elem['x0']:.1f}, {elem['y0']:.1f})")
-            elif elem['type'] == 'image':
-                print(f"  Image at ({elem['x0']:.1f}, {elem['y0']:.1f})")
-            elif elem['type'] == 'shape':
-                print(f"  Shape at ({elem['x0']:.1f}, {elem['y0']:.1f}) to ({elem['x1']:.1f}, {elem['y1']:.1f})")
+    # The topmost element not printed yet starts a row; the rest of the row
+    # comes from an index query along it rather than a scan of the page
+    printed = set()
+    for page in sorted(index.extents):
+        if len(index.extents) > 1:
+            print(f"\n--- Page {page + 1} ---")
+        page_elements = [elem for elem in index.elements if elem.get('page', 0) == page]
+        for anchor in sorted(page_elements, key=lambda elem: -elem['y0']):
+            if id(anchor) in printed:
+                continue
+            y = anchor['y0']
+            row = [elem for elem in index.row(y, page, ROW_TOLERANCE)
+                   if id(elem) not in printed and abs(elem['y0'] - y) <= ROW_TOLERANCE]
+            print(f"\nAt y ≈ {y:.0f}:")
+            for elem in row:
+                printed.add(id(elem))
+                if elem['type'] == 'text':
+                    print(f"  Text: '{elem['content']}' at ({elem['x0']:.1f}, {elem['y0']:.1f})")
+                elif elem['type'] == 'image':
+                    print(f"  Image at ({elem['x0']:.1f}, {elem['y0']:.1f})")
+                elif elem['type'] == 'shape':
+                    print(f"  Shape at ({elem['x0']:.1f}, {elem['y0']:.1f}) to ({elem['x1']:.1f}, {elem['y1']:.1f})")
 
 if __name__ == "__main__":
     pdf_path = "pdfs/incorrect.pdf"
-    elements = analyze_pdf_layout(pdf_path)
+    from document_cache import enable_disk_cache, load_document
+    enable_disk_cache()
+    elements = load_document(pdf_path, parts=("layout",))["layout"]
     print_layout_analysis(elements) 
\ No newline at end of file
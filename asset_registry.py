@@ -0,0 +1,134 @@
+import hashlib
+import io
+import os
+from functools import lru_cache
+
+# Where the extracted branding images live
+ASSET_DIR = os.environ.get("PDF_EDIT_ASSET_DIR", "pdfs")
+# Prepared (downscaled, JPEG) copies, shared by every process
+PREPARED_DIR = os.path.join(os.environ.get("PDF_EDIT_CACHE_DIR", ".cache"), "assets")
+
+# Placement of each asset on the invoice: (x, y, width, height) in points,
+# y measured from the top of the page like the rest of the layout
+ASSET_PLACEMENTS = {
+    "logo": (250, 40, 178, 50),
+    "technician_signature": (300, 612, 120, 24),
+    "customer_signature": (440, 612, 120, 24),
+}
+
+# Assets drawn on every page vs only where the invoice is signed off
+PAGE_ASSETS = ("logo",)
+SIGNATURE_ASSETS = ("technician_signature", "customer_signature")
+DEFAULT_ASSETS = PAGE_ASSETS + SIGNATURE_ASSETS
+
+# Resolution the assets are downscaled to at their placed size
+ASSET_DPI = 200
+JPEG_QUALITY = 90
+
+def find_asset_source(name, asset_dir=ASSET_DIR):
+    """Return the path of an asset's source image (JPEG preferred, as it needs no re-encode)."""
+    for ext in ("jpg", "jpeg", "png"):
+        path = os.path.join(asset_dir, f"{name}.{ext}")
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No image for asset '{name}' in {asset_dir}")
+
+@lru_cache(maxsize=None)
+def prepared_asset(name, asset_dir=ASSET_DIR, dpi=ASSET_DPI):
+    """Return the path of an asset ready to embed, preparing it once per process.
+
+    The image is downscaled to `dpi` at its placed size and stored as a
+    JPEG, so it can be embedded as-is with no decode or Flate pass.
+    """
+    from PIL import Image
+
+    source = find_asset_source(name, asset_dir)
+    _, _, width, height = ASSET_PLACEMENTS[name]
+    target = (max(1, round(width / 72 * dpi)), max(1, round(height / 72 * dpi)))
+
+    image = Image.open(source)
+    if image.format == "JPEG" and image.width <= target[0] and image.height <= target[1]:
+        # Already small enough and already a JPEG
+        return source
+
+    image = image.convert("RGB")
+    image.thumbnail(target, Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=JPEG_QUALITY)
+    data = buffer.getvalue()
+
+    path = os.path.join(PREPARED_DIR, f"{name}_{hashlib.sha256(data).hexdigest()[:16]}.jpg")
+    if not os.path.exists(path):
+        os.makedirs(PREPARED_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path
+
+@lru_cache(maxsize=None)
+def asset_image_data(name):
+    """Return (jpeg_bytes, width, height, color_space) for an asset, read once per process."""
+    from reportlab.pdfbase.pdfutils import readJPEGInfo
+
+    with open(prepared_asset(name), "rb") as f:
+        width, height, components = readJPEGInfo(f)[:3]
+        f.seek(0)
+        data = f.read()
+    color_space = {1: "DeviceGray", 3: "DeviceRGB"}.get(components, "DeviceCMYK")
+    return data, width, height, color_space
+
+def asset_xobject_name(name):
+    """Return the XObject name an asset is registered under in each document."""
+    return f"asset_{name}"
+
+def register_asset(c, name):
+    """Embed an asset in canvas c's document unless it's already there.
+
+    reportlab's drawImage re-reads the file and ASCII85-encodes the JPEG in
+    pure Python for every document; here the bytes come from the
+    per-process cache and go in as a plain DCTDecode stream.
+    """
+    from reportlab.pdfbase.pdfdoc import PDFImageXObject
+
+    xobject_name = asset_xobject_name(name)
+    if c.hasForm(xobject_name):
+        return
+    data, width, height, color_space = asset_image_data(name)
+    image = PDFImageXObject(xobject_name)
+    image.width, image.height = width, height
+    image.bitsPerComponent = 8
+    image.colorSpace = color_space
+    image.streamContent = data
+    image._filters = ('DCTDecode',)
+    image.mask = None
+    c._doc.addForm(xobject_name, image)
+
+def asset_rect(name, placements=ASSET_PLACEMENTS):
+    """Return the (x, y, width, height) an asset is drawn at, y from the top of the page.
+
+    The image keeps its aspect ratio, left-aligned and vertically centred
+    in its placement box.
+    """
+    _, image_width, image_height, _ = asset_image_data(name)
+    x, y, width, height = placements[name]
+    scale = min(width / image_width, height / image_height)
+    draw_width, draw_height = image_width * scale, image_height * scale
+    return x, y + (height - draw_height) / 2, draw_width, draw_height
+
+def draw_assets(c, names, page_height, placements=ASSET_PLACEMENTS):
+    """Draw the named assets onto the current page of canvas c.
+
+    Each asset is embedded once per canvas (document or merged batch) and
+    every later page only references it. Images keep their aspect ratio,
+    left-aligned and vertically centred in their box; placements
+    overrides where each asset goes.
+    """
+    for name in names:
+        register_asset(c, name)
+        x, y, draw_width, draw_height = asset_rect(name, placements)
+        c.saveState()
+        c.translate(x, page_height - y - draw_height)
+        c.scale(draw_width, draw_height)
+        c.doForm(asset_xobject_name(name))
+        c.restoreState()
@@ -0,0 +1,250 @@
+import argparse
+import glob
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+
+from build_cache import BuildCache, data_hash, render_key
+from output_profiles import PROFILES
+from render_backends import BACKENDS
+from pdf_generator import extract_invoice_data, create_invoice_pdf
+
+def collect_sources(source):
+    """Return the sorted list of source PDFs for a directory or glob pattern."""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "*.pdf")
+    else:
+        pattern = source
+    return sorted(path for path in glob.glob(pattern) if path.lower().endswith(".pdf"))
+
+def output_path_for(source_path, output_dir):
+    """Map a source PDF to its generated invoice path."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(output_dir, f"{stem}_generated.pdf")
+
+def process_invoice(source_path, source_hash, output_path, profile=None, data=None, stamped_key=None,
+                    backend=None, template=False, assets=()):
+    """Run extract -> render for one invoice and return its manifest record.
+    
+    data is the invoice already extracted (from the build cache), if any.
+    Freshly extracted data is returned under 'data' for the caller to cache,
+    and if it renders to stamped_key (the key the existing output was built
+    from) the output is left alone.
+    """
+    record = {
+        "source": source_path,
+        "source_hash": source_hash,
+        "output": output_path,
+        "profile": profile,
+        "backend": backend,
+    }
+    try:
+        start = time.perf_counter()
+        if data is None:
+            data = extract_invoice_data(source_path, verbose=False)
+            record["data"] = data
+        extracted = time.perf_counter()
+        record["render_key"] = render_key(data_hash(data), profile=profile, backend=backend,
+                                          template=template, assets=assets)
+        if record["render_key"] != stamped_key:
+            create_invoice_pdf(output_path, data, verbose=False, profile=profile, backend=backend,
+                               template=template, assets=assets)
+        rendered = time.perf_counter()
+        record["extract_ms"] = round((extracted - start) * 1000, 3)
+        record["render_ms"] = round((rendered - extracted) * 1000, 3)
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+def run_batch(sources, output_dir, manifest_path, workers=None, max_pending=None, profile=None,
+              force=False, cache_dir=None, backend=None, template=False, assets=()):
+    """Generate invoices for all sources in parallel, skipping what's up to date.
+    
+    A build_cache.BuildCache decides what to skip: sources whose extraction
+    is cached aren't re-extracted, and outputs already built from the same
+    data, template code and render options (profile, backend, template,
+    assets) aren't re-rendered. force rebuilds everything. Every finished
+    invoice is logged to the JSONL manifest.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    # Bound the number of submitted-but-unfinished jobs so huge batches
+    # don't queue every task (and its arguments) up front
+    max_pending = max_pending or workers * 4
+
+    skipped = 0
+    processed = 0
+    failed = 0
+    start = time.perf_counter()
+
+    cache = BuildCache(cache_dir) if cache_dir else BuildCache()
+    with cache, open(manifest_path, "a") as manifest, ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def drain(return_when):
+            nonlocal processed, failed
+            done, still_pending = wait(pending, return_when=return_when)
+            for future in done:
+                record = future.result()
+                data = record.pop("data", None)
+                if record["status"] == "ok":
+                    if data is not None:
+                        cache.store_extract(record["source_hash"], data)
+                    cache.record_output(record["output"], record["render_key"])
+                else:
+                    failed += 1
+                    print(f"Failed {record['source']}: {record['error']}")
+                manifest.write(json.dumps(record) + "\n")
+                processed += 1
+            manifest.flush()
+            return still_pending
+
+        for source_path in sources:
+            source_hash = cache.source_hash(source_path)
+            output_path = output_path_for(source_path, output_dir)
+            data = None if force else cache.load_extract(source_hash)
+            stamp = None if force else cache.outputs.get(output_path)
+            stamped_key = stamp["key"] if stamp and cache.output_is_fresh(output_path, stamp["key"]) else None
+            if data is not None and stamped_key == render_key(data_hash(data), profile=profile, backend=backend,
+                                                              template=template, assets=assets):
+                skipped += 1
+                continue
+
+            pending.add(pool.submit(process_invoice, source_path, source_hash, output_path, profile,
+                                    data, stamped_key, backend, template, assets))
+            if len(pending) >= max_pending:
+                pending = drain(FIRST_COMPLETED)
+
+        if pending:
+            drain(ALL_COMPLETED)
+
+    elapsed = time.perf_counter() - start
+    throughput = processed / elapsed if elapsed > 0 else 0.0
+
+    print(f"\nProcessed {processed} invoices ({failed} failed, {skipped} up to date) in {elapsed:.2f}s")
+    print(f"Throughput: {throughput:.1f} invoices/sec")
+    return {
+        "processed": processed,
+        "failed": failed,
+        "skipped": skipped,
+        "elapsed": elapsed,
+        "invoices_per_sec": throughput,
+    }
+
+def _extract_job(source_path):
+    try:
+        return source_path, extract_invoice_data(source_path, verbose=False), None
+    except Exception as e:
+        return source_path, None, f"{type(e).__name__}: {e}"
+
+def _render_job(source_paths, render, options):
+    """Extract a run of sources and render them with a sink's render function.
+
+    Returns (rendered parts, [(source, error), ...] for the sources that failed).
+    """
+    invoices = []
+    errors = []
+    for source_path in source_paths:
+        _, data, error = _extract_job(source_path)
+        if error:
+            errors.append((source_path, error))
+        else:
+            invoices.append(data)
+    return (render(invoices, **options) if invoices else []), errors
+
+def run_batch_to_sink(sources, sink_path, workers=None, max_pending=None, **sink_options):
+    """Extract and render invoices in parallel and stream them, in source
+    order, into one merged PDF or ZIP archive (see output_sinks.open_sink).
+
+    Workers render runs of invoices (a merged PDF's chunks); the parent
+    only appends the finished PDFs to the sink.
+    """
+    from output_sinks import open_sink
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+
+    processed = 0
+    failed = 0
+    start = time.perf_counter()
+
+    with open_sink(sink_path, **sink_options) as sink, ProcessPoolExecutor(max_workers=workers) as pool:
+        render, options, chunk_size = sink.render_job()
+        # Split small batches so every worker gets some
+        job_size = max(1, min(chunk_size, -(-len(sources) // workers)))
+        # Futures in submission order, so the output keeps the source order
+        pending = deque()
+
+        def write_next():
+            nonlocal processed, failed
+            count, future = pending.popleft()
+            parts, errors = future.result()
+            processed += count
+            failed += len(errors)
+            for source_path, error in errors:
+                print(f"Failed {source_path}: {error}")
+            sink.add_rendered(parts)
+
+        for first in range(0, len(sources), job_size):
+            chunk = sources[first:first + job_size]
+            pending.append((len(chunk), pool.submit(_render_job, chunk, render, options)))
+            if len(pending) >= max_pending:
+                write_next()
+        while pending:
+            write_next()
+
+    elapsed = time.perf_counter() - start
+    throughput = processed / elapsed if elapsed > 0 else 0.0
+    print(f"\nWrote {processed - failed} invoices to {sink_path} ({failed} failed) in {elapsed:.2f}s")
+    print(f"Throughput: {throughput:.1f} invoices/sec")
+    return {
+        "processed": processed,
+        "failed": failed,
+        "elapsed": elapsed,
+        "invoices_per_sec": throughput,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate a batch of invoices from source PDFs.")
+    parser.add_argument("source", help="Directory of source PDFs or a glob pattern")
+    parser.add_argument("-o", "--output-dir", default="pdfs/generated", help="Directory for generated PDFs")
+    parser.add_argument("-m", "--manifest", default=None, help="JSONL manifest path (default: <output-dir>/manifest.jsonl)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--max-pending", type=int, default=None, help="Maximum number of in-flight jobs")
+    parser.add_argument("--sink", default=None,
+                        help="Write every invoice into one merged .pdf (bookmarked) or .zip instead of separate files")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None,
+                        help="Output profile for the generated PDFs (see output_profiles)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None,
+                        help="Render backend for separately written invoices (see render_backends)")
+    parser.add_argument("--template", action="store_true",
+                        help="Stamp the static layer as a form XObject (always on for merged PDFs)")
+    parser.add_argument("--branding", action="store_true", help="Place the logo and signatures")
+    parser.add_argument("--force", action="store_true", help="Ignore the build cache and rebuild everything")
+    args = parser.parse_args(argv)
+    assets = ()
+    if args.branding:
+        from asset_registry import DEFAULT_ASSETS as assets
+
+    sources = collect_sources(args.source)
+    if not sources:
+        print(f"No source PDFs found for {args.source}")
+        return None
+
+    if args.sink:
+        print(f"Found {len(sources)} source PDFs")
+        sink_options = {"profile": args.profile, "assets": assets}
+        if args.template:
+            sink_options["template"] = True
+        return run_batch_to_sink(sources, args.sink, args.workers, args.max_pending, **sink_options)
+
+    manifest_path = args.manifest or os.path.join(args.output_dir, "manifest.jsonl")
+    print(f"Found {len(sources)} source PDFs")
+    return run_batch(sources, args.output_dir, manifest_path, args.workers, args.max_pending, args.profile,
+                     args.force, backend=args.backend, template=args.template, assets=assets)
+
+if __name__ == "__main__":
+    main()
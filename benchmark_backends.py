@@ -0,0 +1,78 @@
+import io
+import sys
+import time
+
+from asset_registry import DEFAULT_ASSETS
+from output_profiles import profile_fonts
+from pdf_generator import extract_invoice_data, draw_invoice_page
+from render_backends import BACKENDS, new_backend
+
+# (label, invoices per document, draw options, output profile)
+WORKLOADS = [
+    ("plain", 1, {}, None),
+    ("branded", 1, {"assets": DEFAULT_ASSETS}, None),
+    ("template", 1, {"template": True}, None),
+    ("small profile", 1, {}, "small"),
+    ("archival profile", 1, {}, "archival"),
+    ("100 per document", 100, {"template": True}, None),
+    ("100 per document, branded", 100, {"template": True, "assets": DEFAULT_ASSETS}, None),
+]
+
+def render_document(data, backend, pages, options, profile):
+    """Render `pages` invoices into one in-memory PDF with a backend and return its bytes."""
+    buffer = io.BytesIO()
+    c = new_backend(buffer, profile, backend)
+    fonts = profile_fonts(profile)
+    for page in range(pages):
+        if page:
+            c.new_page()
+        draw_invoice_page(c, data, fonts=fonts, **options)
+    if pages == 1:
+        c.embed_payload(data)
+    c.save()
+    return buffer.getvalue()
+
+def benchmark_backend(data, backend, pages, options, profile, invoices, rounds=3):
+    """Return (ms per invoice, bytes per invoice), the best of several rounds."""
+    # Warm up caches (fonts, prepared assets, imports) outside the timed loop
+    render_document(data, backend, pages, options, profile)
+
+    documents = max(1, invoices // pages)
+    best = None
+    for _ in range(rounds):
+        total_bytes = 0
+        start = time.perf_counter()
+        for _ in range(documents):
+            total_bytes += len(render_document(data, backend, pages, options, profile))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    count = documents * pages
+    return best * 1000 / count, total_bytes / count
+
+def pick_backends(data, invoices=200, workloads=WORKLOADS):
+    """Benchmark every backend on every workload; return {label: (fastest backend, results)}."""
+    picks = {}
+    for label, pages, options, profile in workloads:
+        results = {backend: benchmark_backend(data, backend, pages, options, profile, invoices)
+                   for backend in BACKENDS}
+        picks[label] = (min(results, key=lambda backend: results[backend][0]), results)
+    return picks
+
+if __name__ == "__main__":
+    source_pdf = sys.argv[1] if len(sys.argv) > 1 else "pdfs/correct.pdf"
+    invoices = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    data = extract_invoice_data(source_pdf, verbose=False)
+
+    print(f"=== Render backend benchmark ({source_pdf}, {invoices} invoices per run) ===")
+    picks = pick_backends(data, invoices)
+    for label, (fastest, results) in picks.items():
+        print(f"\n{label}:")
+        for backend, (ms, size) in results.items():
+            print(f"  {backend:>9}: {ms:7.3f} ms/invoice, {size:8.0f} bytes/invoice")
+        slowest_ms = max(ms for ms, _ in results.values())
+        print(f"  fastest: {fastest} ({slowest_ms / results[fastest][0]:.2f}x)")
+
+    print("\nBackend per workload:")
+    for label, (fastest, _) in picks.items():
+        print(f"  {label:>26}: {fastest}")
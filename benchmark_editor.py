@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import time
+
+from pdf_editor import edit_pdf_in_place
+
+def benchmark_mode(label, edit, input_pdf, iterations):
+    """Time one editing mode and return (files/sec, bytes written per file)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output_pdf = os.path.join(tmp, "out.pdf")
+        edit(input_pdf, output_pdf)  # Warm up
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            edit(input_pdf, output_pdf)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(output_pdf)
+
+    files_per_sec = iterations / elapsed
+    print(f"{label:>12}: {files_per_sec:8.1f} files/sec, {elapsed * 1000 / iterations:7.2f} ms/file, {size:>8} bytes")
+    return files_per_sec, size
+
+if __name__ == "__main__":
+    input_pdf = sys.argv[1] if len(sys.argv) > 1 else "pdfs/incorrect.pdf"
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    input_size = os.path.getsize(input_pdf)
+
+    print(f"=== Editor benchmark ({iterations} edits of {input_pdf}, {input_size} bytes) ===\n")
+    incremental_rate, incremental_size = benchmark_mode(
+        "incremental", lambda i, o: edit_pdf_in_place(i, o, verbose=False), input_pdf, iterations)
+    rewrite_rate, _ = benchmark_mode(
+        "rewrite", lambda i, o: edit_pdf_in_place(i, o, incremental=False, verbose=False), input_pdf, iterations)
+
+    print(f"\nIncremental update appends {incremental_size - input_size} bytes to the original")
+    print(f"Incremental vs full rewrite: {incremental_rate / rewrite_rate:.2f}x throughput")
@@ -0,0 +1,53 @@
+import io
+import os
+import sys
+import tempfile
+import time
+
+from asset_registry import DEFAULT_ASSETS
+from output_profiles import PROFILES
+from output_sinks import MergedPdfSink
+from pdf_generator import extract_invoice_data, create_invoice_pdf
+
+def benchmark_single(data, profile, assets, iterations):
+    """Return (ms per invoice, bytes per invoice) rendering one PDF per invoice."""
+    # Warm up caches (fonts, prepared assets) outside the timed loop
+    create_invoice_pdf(io.BytesIO(), data, verbose=False, assets=assets, profile=profile)
+
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        buffer = io.BytesIO()
+        create_invoice_pdf(buffer, data, verbose=False, assets=assets, profile=profile)
+        total_bytes += len(buffer.getvalue())
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / iterations, total_bytes / iterations
+
+def benchmark_merged(data, profile, assets, invoices):
+    """Return (ms per invoice, bytes per invoice) for one merged PDF of all invoices."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "merged.pdf")
+        start = time.perf_counter()
+        with MergedPdfSink(path, assets=assets, profile=profile) as sink:
+            for _ in range(invoices):
+                sink.add(data)
+        elapsed = time.perf_counter() - start
+        return elapsed * 1000 / invoices, os.path.getsize(path) / invoices
+
+if __name__ == "__main__":
+    source_pdf = sys.argv[1] if len(sys.argv) > 1 else "pdfs/correct.pdf"
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    data = extract_invoice_data(source_pdf, verbose=False)
+
+    print(f"=== Output profile benchmark ({source_pdf}) ===")
+    for label, assets in [("plain", ()), ("branded", DEFAULT_ASSETS)]:
+        print(f"\n{label}, one PDF per invoice ({iterations} invoices):")
+        for name in PROFILES:
+            ms, size = benchmark_single(data, name, assets, iterations)
+            print(f"  {name:>8}: {ms:7.3f} ms/invoice, {size:8.0f} bytes/invoice")
+
+        print(f"\n{label}, merged into one PDF ({iterations} invoices):")
+        for name in PROFILES:
+            ms, size = benchmark_merged(data, name, assets, iterations)
+            print(f"  {name:>8}: {ms:7.3f} ms/invoice, {size:8.0f} bytes/invoice")
@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Words used to build synthetic service descriptions
+DESCRIPTION_WORDS = [
+    "MONTHLY", "SERVICE", "INSPECTION", "TREATMENT", "RODENT", "BAIT", "STATION",
+    "EQUIPMENT", "SPECIAL", "ACCOUNT", "NEW", "FOLLOW", "UP", "EXTERIOR", "INTERIOR",
+    "PERIMETER", "MONITORING", "COST", "EMERGENCY", "VISIT",
+]
+
+# Hot paths timed by the suite, in run order
+STAGES = ["extract", "generate", "edit", "layout", "rasterize"]
+
+def synthesize_invoice(rng, base_data, line_items, description_words):
+    """Build an invoice data dict with the given number of line items."""
+    data = dict(base_data)
+    data['invoice_number'] = str(rng.randint(1000000, 9999999))
+    items = []
+    for _ in range(line_items):
+        words = [rng.choice(DESCRIPTION_WORDS) for _ in range(description_words)]
+        items.append({
+            'description': " ".join(words),
+            'quantity': f"{rng.randint(1, 4)}.00",
+            'price': round(rng.uniform(20, 400), 2),
+        })
+    data['service_items'] = items
+    data['amounts'] = {'subtotal': 0.0, 'tax': 0.0, 'total': 0.0, 'paid': 0.0, 'due': 0.0}
+    return data
+
+def generate_corpus(corpus_dir, size, seed=0, max_line_items=200, max_description_words=12):
+    """Synthesize `size` invoices with create_invoice_pdf and return their paths.
+
+    Line-item counts are skewed towards small invoices, with a tail of long
+    statements that flow across many pages.
+    """
+    from pdf_generator import extract_invoice_data, create_invoice_pdf, fill_amount_fallbacks
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    rng = random.Random(seed)
+    base_data = extract_invoice_data("pdfs/correct.pdf", verbose=False)
+    paths = []
+    for index in range(size):
+        line_items = min(max_line_items, int(rng.expovariate(1 / 8)) + 1)
+        description_words = rng.randint(1, max_description_words)
+        data = synthesize_invoice(rng, base_data, line_items, description_words)
+        fill_amount_fallbacks(data['amounts'], data['service_items'])
+        path = os.path.join(corpus_dir, f"invoice_{index:05d}.pdf")
+        create_invoice_pdf(path, data, verbose=False)
+        paths.append(path)
+    return paths
+
+def percentiles(samples):
+    """Summarize latency samples (seconds) in milliseconds."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        if not ordered:
+            return 0.0
+        rank = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+        return ordered[rank] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) * 1000 / len(ordered) if ordered else 0.0,
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_stage(stage, paths, work_dir):
+    """Time one hot path over the corpus; runs in a fresh process."""
+    import document_cache
+    # Measure the parsers, not the document cache
+    document_cache.CACHE_ENABLED = False
+
+    from pdf_generator import extract_invoice_data, create_invoice_pdf
+    from pdf_editor import create_corrected_pdf
+    from analyze_layout import analyze_pdf_layout
+    from compare_pdfs import convert_pdf_to_image
+
+    os.makedirs(work_dir, exist_ok=True)
+    samples = []
+    for index, path in enumerate(paths):
+        output = os.path.join(work_dir, f"{stage}_{index % 8}")
+        if stage == "generate":
+            data = extract_invoice_data(path, verbose=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if stage == "extract":
+                extract_invoice_data(path, verbose=False)
+            elif stage == "generate":
+                create_invoice_pdf(output + ".pdf", data, verbose=False)
+            elif stage == "edit":
+                create_corrected_pdf(path, output + ".pdf")
+            elif stage == "layout":
+                analyze_pdf_layout(path)
+            elif stage == "rasterize":
+                convert_pdf_to_image(path, output + ".png")
+            samples.append(time.perf_counter() - start)
+
+    result = percentiles(samples)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+def run_suite(paths, work_dir, stages=STAGES):
+    """Run each stage in its own process so peak RSS is per stage."""
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for stage in stages:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[stage] = pool.submit(run_stage, stage, paths, work_dir).result()
+        r = results[stage]
+        print(f"{stage:>10}: p50 {r['p50_ms']:8.2f} ms  p90 {r['p90_ms']:8.2f} ms  "
+              f"p99 {r['p99_ms']:8.2f} ms  peak RSS {r['peak_rss_mb']:7.1f} MB")
+    return results
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of regression messages for stages slower than the baseline."""
+    regressions = []
+    for stage, current in results.items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p90_ms", "peak_rss_mb"):
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{stage} {metric}: {current[metric]:.2f} vs baseline {previous[metric]:.2f} "
+                    f"(+{(current[metric] / previous[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the invoice hot paths on a synthetic corpus.")
+    parser.add_argument("--corpus-dir", default="bench/corpus", help="Where to write the synthetic corpus")
+    parser.add_argument("--size", type=int, default=50, help="Number of invoices to synthesize")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the corpus")
+    parser.add_argument("--max-line-items", type=int, default=200, help="Longest invoice, in line items")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--output", default="bench/results.json", help="JSON results path")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    print(f"Synthesizing {args.size} invoices in {args.corpus_dir}...")
+    paths = generate_corpus(args.corpus_dir, args.size, args.seed, args.max_line_items)
+
+    print("\n=== Benchmark results ===")
+    stages = [stage for stage in args.stages.split(",") if stage]
+    results = run_suite(paths, os.path.join(os.path.dirname(args.output) or ".", "work"), stages)
+
+    report = {
+        "corpus": {"size": args.size, "seed": args.seed, "max_line_items": args.max_line_items},
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import io
+import sys
+import time
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+from pdf_generator import extract_invoice_data, draw_invoice_page
+
+def render_document(data, template, pages):
+    """Render `pages` invoices into one in-memory PDF and return its bytes."""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    for _ in range(pages):
+        draw_invoice_page(c, data, template=template)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+def benchmark_render(data, template, pages, iterations):
+    """Return (ms per invoice, bytes per invoice) for the given mode."""
+    # Warm up caches (static layer, font metrics) outside the timed loop
+    render_document(data, template, pages)
+
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        total_bytes += len(render_document(data, template, pages))
+    elapsed = time.perf_counter() - start
+    invoices = iterations * pages
+    return elapsed * 1000 / invoices, total_bytes / invoices
+
+if __name__ == "__main__":
+    source_pdf = sys.argv[1] if len(sys.argv) > 1 else "pdfs/correct.pdf"
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    data = extract_invoice_data(source_pdf, verbose=False)
+
+    print(f"=== Static template benchmark ({source_pdf}) ===")
+    for pages in [1, 10, 100]:
+        runs = max(1, iterations // pages)
+        print(f"\n{pages} invoice(s) per document, {runs} document(s):")
+        results = {}
+        for label, template in [("direct", False), ("template", True)]:
+            ms, size = benchmark_render(data, template, pages, runs)
+            results[label] = (ms, size)
+            print(f"  {label:>8}: {ms:.3f} ms/invoice, {size:.0f} bytes/invoice")
+
+        direct_ms, direct_size = results["direct"]
+        template_ms, template_size = results["template"]
+        print(f"  saved: {direct_ms - template_ms:.3f} ms/invoice, {direct_size - template_size:.0f} bytes/invoice")
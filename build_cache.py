@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+import instrumentation
+
+DEFAULT_BUILD_DIR = os.path.join(os.environ.get("PDF_EDIT_CACHE_DIR", ".cache"), "build")
+
+# Bump to invalidate every cached extraction or rendering by hand
+EXTRACT_VERSION = 1
+TEMPLATE_VERSION = 1
+
+# The code each stage depends on; editing any of these files invalidates
+# that stage's cached results, like a makefile's prerequisites. Statements
+# fill in missing amounts with invoice_extract's fallbacks, so the template
+# depends on the extractor, but not the other way round.
+EXTRACT_SOURCES = ("invoice_extract.py", "document_cache.py")
+TEMPLATE_SOURCES = ("pdf_generator.py", "invoice_layout.py", "table_flow.py", "invoice_extract.py",
+                    "font_metrics.py", "asset_registry.py", "invoice_payload.py", "output_profiles.py",
+                    "render_backends.py")
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@lru_cache(maxsize=None)
+def code_version(sources, version):
+    """Hash a stage's source files and manual version number."""
+    digest = hashlib.sha256(str(version).encode())
+    for name in sources:
+        with open(os.path.join(MODULE_DIR, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def extract_version():
+    return code_version(EXTRACT_SOURCES, EXTRACT_VERSION)
+
+def template_version():
+    return code_version(TEMPLATE_SOURCES, TEMPLATE_VERSION)
+
+def data_hash(data):
+    """Hash an extracted data dict (in the canonical form that gets embedded)."""
+    from invoice_payload import payload_bytes
+    return hashlib.sha256(payload_bytes(data)).hexdigest()
+
+def render_key(data_digest, **options):
+    """Key for one rendering: the data, the template code and the render options."""
+    return hashlib.sha256(json.dumps([data_digest, template_version(), options],
+                                     sort_keys=True).encode()).hexdigest()
+
+def _stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+class BuildCache:
+    """Make-style cache of extractions and renders.
+
+    Extractions are stored per source content hash (and extractor code
+    version); rendered outputs are stamped with the render_key they were
+    built from plus their size and mtime, so an output is rebuilt when its
+    data, the template code or the options change, or when the file itself
+    was touched. Source hashes are re-read only when a source's size or
+    mtime moves. Each new stamp is appended to stamps.log as it is made,
+    so a run that is killed keeps the work it finished; save() (or leaving
+    the context manager) folds the log into stamps.json.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_BUILD_DIR):
+        self.cache_dir = cache_dir
+        self.extract_dir = os.path.join(cache_dir, "extract")
+        self.state_path = os.path.join(cache_dir, "stamps.json")
+        self.log_path = os.path.join(cache_dir, "stamps.log")
+        self.sources = {}
+        self.outputs = {}
+        self.dirty = False
+        self._log = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.sources = state.get("sources", {})
+            self.outputs = state.get("outputs", {})
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        kind, path, stamp = json.loads(line)
+                    except ValueError:
+                        # The last line of a run killed mid-write
+                        break
+                    (self.sources if kind == "source" else self.outputs)[path] = stamp
+            self.dirty = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.save()
+
+    # Helper function for recording a stamp in memory and in the log
+    def _stamp(self, kind, path, stamp):
+        (self.sources if kind == "source" else self.outputs)[path] = stamp
+        if self._log is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._log = open(self.log_path, "a")
+        self._log.write(json.dumps([kind, path, stamp]) + "\n")
+        self._log.flush()
+        self.dirty = True
+
+    def source_hash(self, source_path):
+        """Return a source's SHA-256, reusing the stored one while its size and mtime hold."""
+        from document_cache import content_hash
+        stat = _stat(source_path)
+        stamp = self.sources.get(source_path)
+        if stamp and stamp[:2] == stat:
+            return stamp[2]
+        digest = content_hash(source_path)
+        self._stamp("source", source_path, stat + [digest])
+        return digest
+
+    def _extract_path(self, source_digest):
+        return os.path.join(self.extract_dir, f"{source_digest}.{extract_version()[:16]}.json")
+
+    def load_extract(self, source_digest):
+        """Return the cached extracted data for a source hash, or None."""
+        path = self._extract_path(source_digest)
+        if not os.path.exists(path):
+            instrumentation.count("build_extract_misses")
+            return None
+        instrumentation.count("build_extract_hits")
+        with open(path) as f:
+            return json.load(f)
+
+    def store_extract(self, source_digest, data):
+        os.makedirs(self.extract_dir, exist_ok=True)
+        path = self._extract_path(source_digest)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def output_is_fresh(self, output_path, key):
+        """Check whether output_path was built from key and hasn't been touched since."""
+        stamp = self.outputs.get(output_path)
+        if stamp is None or stamp["key"] != key or not os.path.exists(output_path):
+            return False
+        return [stamp["size"], stamp["mtime_ns"]] == _stat(output_path)
+
+    def record_output(self, output_path, key):
+        size, mtime_ns = _stat(output_path)
+        self._stamp("output", output_path, {"key": key, "size": size, "mtime_ns": mtime_ns})
+
+    def save(self):
+        """Write every stamp to stamps.json and start a new log."""
+        if not self.dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"sources": self.sources, "outputs": self.outputs}, f)
+        os.replace(tmp_path, self.state_path)
+        # Only now that stamps.json has them; replaying the log again is harmless
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.dirty = False
+
+def build_invoice(source_path, output_path, cache, verbose=True, force=False, **render_options):
+    """Extract and render one invoice, skipping whichever steps are up to date.
+
+    render_options are passed to create_invoice_pdf (template, assets,
+    payload, profile). Returns 'fresh' (nothing to do), 'rendered' (data
+    reused, output rebuilt) or 'extracted' (both steps ran).
+    """
+    from pdf_generator import extract_invoice_data, create_invoice_pdf
+    source_digest = cache.source_hash(source_path)
+    data = None if force else cache.load_extract(source_digest)
+    status = "rendered"
+    if data is None:
+        data = extract_invoice_data(source_path, verbose=verbose)
+        cache.store_extract(source_digest, data)
+        status = "extracted"
+
+    key = render_key(data_hash(data), **render_options)
+    if not force and cache.output_is_fresh(output_path, key):
+        if verbose:
+            print(f"{output_path} is up to date")
+        return "fresh"
+    create_invoice_pdf(output_path, data, verbose=verbose, **render_options)
+    cache.record_output(output_path, key)
+    return status
@@ -0,0 +1,117 @@
+import io
+import sys
+
+import fitz
+
+from asset_registry import DEFAULT_ASSETS
+from invoice_payload import PAYLOAD_RE
+from output_profiles import PROFILES
+from pdf_generator import extract_invoice_data, create_invoice_pdf
+from render_backends import BACKENDS
+
+# Text origins, lines and image boxes must land within this many points
+POSITION_TOLERANCE = 0.01
+# Span right edges may differ more: each library rounds TrueType widths its own way
+EXTENT_TOLERANCE = 0.5
+
+# Helper function for comparing a font name across backends, e.g.
+# "ABCDEF+Bitstream Vera Sans Bold" and "BitstreamVeraSans-Bold"
+def _font_key(name):
+    return name.split("+", 1)[-1].replace(" ", "").replace("-", "")
+
+def page_geometry(pdf_bytes):
+    """Return the text spans, drawings and image boxes of every page in a PDF."""
+    pages = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page in doc:
+            spans = [(span["text"], _font_key(span["font"]), span["size"], span["origin"], span["bbox"][2])
+                     for block in page.get_text("dict")["blocks"] if block["type"] == 0
+                     for line in block["lines"] for span in line["spans"]]
+            drawings = [(tuple(item[0] for item in drawing["items"]), tuple(drawing["rect"]), drawing["width"])
+                        for drawing in page.get_drawings()]
+            images = [tuple(info["bbox"]) for info in page.get_image_info()]
+            pages.append({"spans": sorted(spans), "drawings": sorted(drawings), "images": sorted(images)})
+    return pages
+
+# Helper function for pulling the embedded payload out of a PDF's XMP
+def _payload(pdf_bytes):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        match = PAYLOAD_RE.search(doc.get_xml_metadata() or "")
+    return match.groups() if match else None
+
+# Helper function for matching font keys; the name PyMuPDF reports for a
+# font it subsetted itself can be missing its last letter
+def _same_font(a, b):
+    return a.startswith(b) or b.startswith(a)
+
+# Helper function for checking two tuples of coordinates
+def _close(a, b, tolerance=POSITION_TOLERANCE):
+    return len(a) == len(b) and all(abs(x - y) <= tolerance for x, y in zip(a, b))
+
+def compare_geometry(expected, actual):
+    """Return a list of differences between two page_geometry results."""
+    if len(expected) != len(actual):
+        return [f"{len(expected)} pages vs {len(actual)}"]
+    problems = []
+    for number, (a, b) in enumerate(zip(expected, actual), 1):
+        for kind in ("spans", "drawings", "images"):
+            if len(a[kind]) != len(b[kind]):
+                problems.append(f"page {number}: {len(a[kind])} {kind} vs {len(b[kind])}")
+        for x, y in zip(a["spans"], b["spans"]):
+            if (x[0] != y[0] or not _same_font(x[1], y[1]) or x[2] != y[2]
+                    or not _close(x[3], y[3]) or abs(x[4] - y[4]) > EXTENT_TOLERANCE):
+                problems.append(f"page {number}: span {x} vs {y}")
+        for x, y in zip(a["drawings"], b["drawings"]):
+            if x[0] != y[0] or not _close(x[1], y[1]) or not _close((x[2] or 0,), (y[2] or 0,)):
+                problems.append(f"page {number}: drawing {x} vs {y}")
+        for x, y in zip(a["images"], b["images"]):
+            if not _close(x, y):
+                problems.append(f"page {number}: image {x} vs {y}")
+    return problems
+
+def render(data, backend, **options):
+    buffer = io.BytesIO()
+    create_invoice_pdf(buffer, data, verbose=False, backend=backend, **options)
+    return buffer.getvalue()
+
+def check_parity(data, reference="reportlab"):
+    """Render data with every backend, profile and branding option and compare each to reference.
+
+    Returns a list of (label, problems) for the combinations that differ.
+    """
+    failures = []
+    for profile in PROFILES:
+        for assets in ((), DEFAULT_ASSETS):
+            options = {"profile": profile, "assets": assets}
+            expected_pdf = render(data, reference, **options)
+            expected = page_geometry(expected_pdf)
+            for backend in BACKENDS:
+                if backend == reference:
+                    continue
+                actual_pdf = render(data, backend, **options)
+                problems = compare_geometry(expected, page_geometry(actual_pdf))
+                if _payload(actual_pdf) != _payload(expected_pdf):
+                    problems.append("embedded payloads differ")
+                if problems:
+                    label = f"{backend} vs {reference}, {profile}{', branded' if assets else ''}"
+                    failures.append((label, problems))
+    return failures
+
+if __name__ == "__main__":
+    sources = sys.argv[1:] or ["pdfs/correct.pdf"]
+
+    cases = [(path, extract_invoice_data(path, verbose=False)) for path in sources]
+    # Text the backends must escape or encode the same way
+    cases.append(("escaping", dict(cases[0][1], customer_name="O'Brien (Main St) \\ Café",
+                                   customer_contact="50% off ((nested))")))
+
+    failed = 0
+    for label, data in cases:
+        failures = check_parity(data)
+        print(f"{label}: {'ok' if not failures else 'MISMATCH'}")
+        for case, problems in failures:
+            failed += 1
+            print(f"  {case}:")
+            for problem in problems[:10]:
+                print(f"    {problem}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,64 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PDF = os.path.join(REPO_DIR, "pdfs", "incorrect.pdf")
+RULE_FILE = os.path.join(REPO_DIR, "corrections.json")
+
+# (label, pdf-edit arguments); {pdf} is a fresh copy of the source and
+# {out} an output path, and each mode must leave the same dollar amounts
+MODES = [
+    ("edit", ["edit", "{pdf}", "{out}"]),
+    ("edit in place", ["edit", "{pdf}"]),
+    ("edit --rewrite", ["edit", "{pdf}", "{out}", "--rewrite"]),
+    ("edit --rewrite in place", ["edit", "{pdf}", "--rewrite"]),
+    ("correct in place", ["correct", RULE_FILE, "{pdf}"]),
+    ("correct --rewrite in place", ["correct", RULE_FILE, "{pdf}", "--rewrite"]),
+]
+
+def dollar_amounts(pdf_path):
+    from verify_changes import extract_dollar_amounts
+    return extract_dollar_amounts(pdf_path)
+
+def run_mode(args, work_dir):
+    """Run one pdf-edit command on a fresh copy of the source; return (exit code, edited PDF)."""
+    pdf_path = os.path.join(work_dir, "input.pdf")
+    out_path = os.path.join(work_dir, "output.pdf")
+    shutil.copyfile(SOURCE_PDF, pdf_path)
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    argv = [arg.format(pdf=pdf_path, out=out_path) for arg in args]
+    result = subprocess.run([sys.executable, os.path.join(REPO_DIR, "pdf-edit"), *argv],
+                            cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(result.stderr.strip())
+    return result.returncode, out_path if "{out}" in args else pdf_path
+
+def main():
+    failures = []
+    expected = None
+    original = dollar_amounts(SOURCE_PDF)
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label, args in MODES:
+            code, edited = run_mode(args, work_dir)
+            if code != 0:
+                failures.append(f"{label}: exit code {code}")
+                continue
+            amounts = dollar_amounts(edited)
+            if expected is None:
+                expected = amounts
+                if amounts == original:
+                    failures.append(f"{label}: no amounts were corrected")
+            elif amounts != expected:
+                failures.append(f"{label}: amounts {amounts} differ from {expected}")
+            print(f"{label}: {'ok' if amounts == expected else 'MISMATCH'}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import time
+
+# Cold-start budget for `pdf-edit --help`, in milliseconds
+STARTUP_BUDGET_MS = float(os.environ.get("PDF_EDIT_STARTUP_BUDGET_MS", "150"))
+
+# Backends that must not be imported just to parse the command line
+HEAVY_MODULES = ["reportlab", "PyPDF2", "fitz", "pymupdf", "pdfminer", "numpy", "PIL"]
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def measure_startup(runs=5):
+    """Return the fastest of several cold `pdf-edit --help` runs, in ms."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(REPO_DIR, "pdf-edit"), "--help"],
+                       check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def heavy_imports():
+    """Return the heavy modules pulled in by importing the CLI and building its parser."""
+    code = ("import sys, cli; cli.build_parser(); "
+            f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True,
+                            capture_output=True, text=True).stdout
+    return output.split()
+
+def cli_choice_mismatches():
+    """Return how the CLI's hardcoded profile and backend names differ from the real ones."""
+    import cli
+    from output_profiles import PROFILES
+    from render_backends import BACKENDS
+    problems = []
+    for label, listed, actual in (("output profiles", cli.OUTPUT_PROFILES, PROFILES),
+                                  ("render backends", cli.RENDER_BACKENDS, BACKENDS)):
+        if set(listed) != set(actual):
+            problems.append(f"cli.py lists {label} {', '.join(listed)} but there are {', '.join(actual)}")
+    return problems
+
+def main():
+    failures = cli_choice_mismatches()
+
+    loaded = heavy_imports()
+    if loaded:
+        failures.append(f"CLI startup imports heavy backends: {', '.join(loaded)}")
+
+    # Measure against bare interpreter start, so the budget is about our code
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    interpreter_ms = (time.perf_counter() - start) * 1000
+    startup_ms = measure_startup()
+
+    print(f"Interpreter start: {interpreter_ms:.1f} ms")
+    print(f"pdf-edit --help:   {startup_ms:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+    if startup_ms > STARTUP_BUDGET_MS:
+        failures.append(f"cold start {startup_ms:.1f} ms is over the {STARTUP_BUDGET_MS:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
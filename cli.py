@@ -0,0 +1,215 @@
+import argparse
+import json
+import sys
+
+# Each subcommand imports its backend inside its handler, so `pdf-edit
+# --help` or `pdf-edit layout` never pays for reportlab, PyMuPDF, etc.
+
+# Names of output_profiles.PROFILES and render_backends.BACKENDS, listed
+# here for the same reason; check_startup.py fails if they drift apart
+OUTPUT_PROFILES = ("default", "fast", "small", "archival")
+RENDER_BACKENDS = ("reportlab", "pymupdf")
+
+def cmd_extract(args):
+    if args.all_pages:
+        from pdf_generator import iter_invoices
+        for data in iter_invoices(args.source):
+            print(json.dumps(data))
+        return 0
+    from pdf_generator import extract_invoice_data
+    data = extract_invoice_data(args.source, verbose=not args.json)
+    if args.json:
+        print(json.dumps(data, indent=2))
+    return 0
+
+def cmd_generate(args):
+    import os
+    if os.path.isdir(args.source) or any(ch in args.source for ch in "*?["):
+        from batch_generate import main as batch_main
+        batch_argv = [args.source, "-o", args.output or "pdfs/generated"]
+        if args.workers:
+            batch_argv += ["-j", str(args.workers)]
+        if args.sink:
+            batch_argv += ["--sink", args.sink]
+        if args.profile:
+            batch_argv += ["--profile", args.profile]
+        if args.force:
+            batch_argv.append("--force")
+        if args.backend:
+            batch_argv += ["--backend", args.backend]
+        if args.template:
+            batch_argv.append("--template")
+        if args.branding:
+            batch_argv.append("--branding")
+        result = batch_main(batch_argv)
+        return 1 if result is None or result["failed"] else 0
+    from build_cache import BuildCache, build_invoice
+    output = args.output or "pdfs/generated.pdf"
+    assets = ()
+    if args.branding:
+        from asset_registry import DEFAULT_ASSETS as assets
+    with BuildCache() as cache:
+        status = build_invoice(args.source, output, cache, verbose=False, force=args.force,
+                               template=args.template, assets=assets, profile=args.profile, backend=args.backend)
+    print(f"{output} is up to date" if status == "fresh" else f"Created new invoice PDF at {output}")
+    return 0
+
+def cmd_edit(args):
+    from pdf_editor import CORRECTIONS, edit_pdf_in_place
+    rules = CORRECTIONS
+    if args.rules:
+        from correction_rules import load_rules
+        rules = load_rules(args.rules)
+    report = edit_pdf_in_place(args.input, args.output, rules=rules, incremental=not args.rewrite)
+    return 0 if any(r['status'] == 'replaced' for r in report) else 1
+
+def cmd_correct(args):
+    from correction_rules import main as correct_main
+    correct_argv = [args.rules, *args.sources]
+    if args.output_dir:
+        correct_argv += ["-o", args.output_dir]
+    if args.rewrite:
+        correct_argv.append("--rewrite")
+    if args.report:
+        correct_argv += ["--report", args.report]
+    if args.workers:
+        correct_argv += ["-j", str(args.workers)]
+    return correct_main(correct_argv)
+
+def cmd_preview(args):
+    from preview_tiles import main as preview_main
+    preview_argv = [*args.pdf, "--page", str(args.page)]
+    for level in args.level or ():
+        preview_argv += ["--level", str(level)]
+    if args.cache_dir:
+        preview_argv += ["--cache-dir", args.cache_dir]
+    if args.workers:
+        preview_argv += ["-j", str(args.workers)]
+    return preview_main(preview_argv)
+
+def cmd_compare(args):
+    from raster_diff import diff_many, print_diff_results
+    results = diff_many([(args.expected, args.actual)], zoom=args.zoom,
+                        heatmap_dir=args.heatmap_dir, workers=args.workers)
+    print_diff_results(results)
+    return 1 if any(r["status"] == "different" for r in results) else 0
+
+def cmd_layout(args):
+    from analyze_layout import analyze_pdf_layout, print_layout_analysis
+    pages = {int(page) - 1 for page in args.pages.split(",")} if args.pages else None
+    crop_box = tuple(float(v) for v in args.crop.split(",")) if args.crop else None
+    print_layout_analysis(analyze_pdf_layout(args.pdf, pages=pages, crop_box=crop_box,
+                                             interesting=args.interesting))
+    return 0
+
+def cmd_verify(args):
+    if args.original or (len(args.pdf) == 1 and not args.cross_check):
+        # Single-file checks reread the same files often; keep their parsed text
+        from document_cache import enable_disk_cache
+        enable_disk_cache()
+    if args.original:
+        from verify_changes import main as verify_changes_main
+        verify_changes_main(args.original, args.pdf[0])
+        return 0
+    if len(args.pdf) == 1 and not args.cross_check:
+        from verify_generated import main as verify_generated_main
+        verify_generated_main(args.pdf[0])
+        return 0
+    from invoice_payload import verify_many, print_verify_results
+    results = verify_many(args.pdf, cross_check=args.cross_check, workers=args.workers)
+    print_verify_results(results)
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pdf-edit", description="Invoice PDF extraction, generation and editing.")
+    parser.add_argument("--metrics", default=None,
+                        help="Record stage timings and write them here (.prom for Prometheus, else JSON; - to print)")
+    parser.add_argument("--trace-memory", action="store_true", help="With --metrics, also record peak memory per stage")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("extract", help="Extract invoice data from a PDF")
+    p.add_argument("source", help="Source invoice PDF")
+    p.add_argument("--json", action="store_true", help="Print the data as JSON")
+    p.add_argument("--all-pages", action="store_true", help="Stream every invoice in the file as JSON lines")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("generate", help="Regenerate an invoice (or a batch) from source PDFs")
+    p.add_argument("source", help="Source PDF, directory or glob")
+    p.add_argument("-o", "--output", default=None, help="Output PDF (or directory in batch mode)")
+    p.add_argument("--template", action="store_true", help="Stamp the static layer as a form XObject")
+    p.add_argument("--branding", action="store_true", help="Place the logo and signatures")
+    p.add_argument("-j", "--workers", type=int, default=None, help="Worker processes in batch mode")
+    p.add_argument("--sink", default=None, help="Batch mode: write one merged .pdf or .zip instead of separate files")
+    p.add_argument("--profile", choices=OUTPUT_PROFILES, default=None,
+                   help="Output profile: fast (no compression), small (object streams), archival (embedded fonts)")
+    p.add_argument("--backend", choices=RENDER_BACKENDS, default=None,
+                   help="Render backend: reportlab (default) or pymupdf")
+    p.add_argument("--force", action="store_true", help="Rebuild even what the build cache says is up to date")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("edit", help="Apply corrections to a PDF in place")
+    p.add_argument("input", help="PDF to correct")
+    p.add_argument("output", nargs="?", default=None, help="Output PDF (default: edit the input)")
+    p.add_argument("--rewrite", action="store_true", help="Rewrite the whole file instead of appending an update")
+    p.add_argument("--rules", default=None, help="Correction rule file (.json or .jsonl) instead of the built-in rules")
+    p.set_defaults(func=cmd_edit)
+
+    p = sub.add_parser("correct", help="Apply a correction rule file to many PDFs in parallel")
+    p.add_argument("rules", help="Correction rule file (.json or .jsonl)")
+    p.add_argument("sources", nargs="+", help="PDFs, directories or globs")
+    p.add_argument("-o", "--output-dir", default=None, help="Write corrected copies here (default: edit in place)")
+    p.add_argument("--rewrite", action="store_true", help="Rewrite whole files instead of appending updates")
+    p.add_argument("--report", default=None, help="Write the per-file and per-rule report here as JSON")
+    p.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    p.set_defaults(func=cmd_correct)
+
+    p = sub.add_parser("compare", help="Raster-diff two PDFs")
+    p.add_argument("expected", help="Reference PDF")
+    p.add_argument("actual", help="PDF to check")
+    p.add_argument("--zoom", type=float, default=2, help="Render zoom")
+    p.add_argument("--heatmap-dir", default=None, help="Write per-page heatmaps here")
+    p.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    p.set_defaults(func=cmd_compare)
+
+    p = sub.add_parser("preview", help="Render cached thumbnails and zoom tiles of PDFs")
+    p.add_argument("pdf", nargs="+", help="PDF(s) to preview")
+    p.add_argument("--page", type=int, default=0, help="Page number (0-based)")
+    p.add_argument("--level", type=int, action="append", default=None,
+                   help="Zoom level to tile (0 = thumbnail scale, 4 = 4x); repeatable")
+    p.add_argument("--cache-dir", default=None, help="Tile cache directory")
+    p.add_argument("-j", "--workers", type=int, default=None, help="Render threads")
+    p.set_defaults(func=cmd_preview)
+
+    p = sub.add_parser("layout", help="Print the layout analysis of a PDF")
+    p.add_argument("pdf", help="PDF to analyze")
+    p.add_argument("--pages", default=None, help="Comma-separated 1-based page numbers")
+    p.add_argument("--crop", default=None, help="Only analyze the region x0,y0,x1,y1 (PDF points, origin bottom left)")
+    p.add_argument("--interesting", default=None, help="Regex; pages whose text doesn't match skip layout grouping")
+    p.set_defaults(func=cmd_layout)
+
+    p = sub.add_parser("verify", help="Check the dollar amounts of a generated or corrected PDF")
+    p.add_argument("pdf", nargs="+", help="Generated or corrected PDF(s)")
+    p.add_argument("--original", default=None, help="Original PDF, to compare before/after an edit")
+    p.add_argument("--cross-check", action="store_true", help="Also check the embedded amounts against the rendered text")
+    p.add_argument("-j", "--workers", type=int, default=None, help="Worker processes for many PDFs")
+    p.set_defaults(func=cmd_verify)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.metrics:
+        return args.func(args)
+    
+    import instrumentation
+    instrumentation.enable(trace_memory=args.trace_memory)
+    try:
+        return args.func(args)
+    finally:
+        if args.metrics == "-":
+            instrumentation.print_metrics()
+        else:
+            instrumentation.write_metrics(args.metrics)
+
+if __name__ == "__main__":
+    sys.exit(main())
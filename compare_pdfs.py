@@ -2,81 +2,132 @@ import fitz
 from PIL import Image
 import io
 import os
+from document_cache import load_document, print_cache_stats
+import instrumentation
 
-def extract_images_from_pdf(pdf_path):
-    """Extract images from the PDF and save them."""
-    doc = fitz.open(pdf_path)
-    page = doc[0]  # First page
+def iter_page_images(doc):
+    """Yield each distinct image (by xref) in the document, page by page."""
+    seen = set()
+    for page in doc:
+        for img in page.get_images():
+            if img[0] not in seen:
+                seen.add(img[0])
+                yield img
+
+@instrumentation.timed("image_extract.named")
+def extract_images_from_pdf(pdf_path, passthrough=False):
+    """Extract images from the PDF and save them.
     
-    # Get list of images on the page
-    image_list = page.get_images()
+    With passthrough=True the image streams are written as stored, with
+    their native extension (e.g. .jpg), instead of being decoded and
+    re-encoded as PNG.
+    """
+    doc = fitz.open(pdf_path)
     
     print(f"\nExtracting images from {os.path.basename(pdf_path)}:")
-    for img_index, img in enumerate(image_list):
-        # Get image data
-        xref = img[0]
-        base_image = doc.extract_image(xref)
-        image_bytes = base_image["image"]
-        
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        
+    for img_index, img in enumerate(iter_page_images(doc)):
         # Save with appropriate name based on index
         # First image is typically the logo
         if img_index == 0:
-            output_path = "pdfs/logo.png"
+            stem = "pdfs/logo"
         elif img_index == 1:
-            output_path = "pdfs/customer_signature.png"
+            stem = "pdfs/customer_signature"
         elif img_index == 2:
-            output_path = "pdfs/technician_signature.png"
+            stem = "pdfs/technician_signature"
         elif img_index == 3:  # If there's a barcode
-            output_path = "pdfs/barcode.png"
+            stem = "pdfs/barcode"
         else:
-            output_path = f"pdfs/image_{img_index}.png"
+            stem = f"pdfs/image_{img_index}"
+        
+        xref = img[0]
+        if passthrough:
+            from image_extract import raw_image
+            image_bytes, ext = raw_image(doc, xref, img[8])
+            output_path = f"{stem}.{ext}"
+            with open(output_path, "wb") as f:
+                f.write(image_bytes)
+            print(f"Saved image to {output_path}")
+            print(f"  Size: {(img[2], img[3])}")
+            continue
+        
+        # Get image data
+        base_image = doc.extract_image(xref)
+        image_bytes = base_image["image"]
+        
+        # Convert to PIL Image
+        image = Image.open(io.BytesIO(image_bytes))
         
         # Save image
+        output_path = f"{stem}.png"
         image.save(output_path)
         print(f"Saved image to {output_path}")
         print(f"  Size: {image.size}")
 
-def convert_pdf_to_image(pdf_path, output_path, zoom=2):
-    """Convert a PDF to a high-resolution image and save it."""
+@instrumentation.timed("rasterize.png")
+def convert_pdf_to_image(pdf_path, output_path, zoom=2, page_number=0, fingerprints=None):
+    """Convert a PDF page to a high-resolution image and save it.
+    
+    With a page_fingerprints.FingerprintIndex, an existing image of a page
+    whose content hash hasn't moved since it was rendered is kept as is.
+    For thumbnails or zoomed regions, see preview_tiles instead.
+    """
     try:
+        if fingerprints is not None:
+            content_hash = fingerprints.page_hashes(pdf_path)[page_number]
+            if fingerprints.render_is_current(output_path, content_hash, zoom):
+                instrumentation.count("rasterize_skipped")
+                return True
+        
         # Open PDF
         doc = fitz.open(pdf_path)
-        page = doc[0]  # First page
+        page = doc[page_number]
         
         # Set high resolution
         matrix = fitz.Matrix(zoom, zoom)
         pix = page.get_pixmap(matrix=matrix)
         
-        # Convert to PIL Image
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        img.save(output_path)
+        if output_path.lower().endswith(".png"):
+            # PyMuPDF writes PNG itself; no copy through PIL
+            pix.save(output_path)
+        else:
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            img.save(output_path)
+        if fingerprints is not None:
+            fingerprints.record_render(output_path, content_hash, zoom)
         return True
     except Exception as e:
         print(f"Error converting {pdf_path}: {str(e)}")
     return False
 
-def analyze_pdf_text(pdf_path):
-    """Extract and analyze text elements with their positions."""
-    doc = fitz.open(pdf_path)
-    page = doc[0]
+def iter_text_spans(pdf_path, pages=None):
+    """Lazily yield (page number, span) for every non-empty text span.
     
+    pages is an optional iterable of page numbers; by default every page
+    is visited, one at a time.
+    """
+    # The document is closed when the generator finishes or is discarded
+    with fitz.open(pdf_path) as doc:
+        for page_number in (range(len(doc)) if pages is None else pages):
+            page = doc[page_number]
+            for block in page.get_text("dict")["blocks"]:
+                if "lines" in block:
+                    for line in block["lines"]:
+                        for span in line["spans"]:
+                            if span["text"].strip():
+                                yield page_number, span
+
+def analyze_pdf_text(pdf_path, pages=(0,)):
+    """Extract and analyze text elements with their positions."""
+    model = load_document(pdf_path, parts=("spans",))
     print(f"\nAnalyzing text in {os.path.basename(pdf_path)}:")
-    blocks = page.get_text("dict")["blocks"]
-    for block in blocks:
-        if "lines" in block:
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    text = span["text"].strip()
-                    if text:
-                        font = span["font"]
-                        size = span["size"]
-                        bbox = span["bbox"]
-                        print(f"Text: '{text}'")
-                        print(f"  Position: ({bbox[0]:.1f}, {bbox[1]:.1f})")
-                        print(f"  Font: {font}, Size: {size:.1f}")
+    for span in (span for page_number in pages for span in model["spans"][page_number]):
+        text = span["text"].strip()
+        font = span["font"]
+        size = span["size"]
+        bbox = span["bbox"]
+        print(f"Text: '{text}'")
+        print(f"  Position: ({bbox[0]:.1f}, {bbox[1]:.1f})")
+        print(f"  Font: {font}, Size: {size:.1f}")
 
 def analyze_differences():
     """Convert both PDFs to images and analyze their differences."""
@@ -86,9 +137,17 @@ def analyze_differences():
     incorrect_img_path = "pdfs/incorrect.png"
     generated_img_path = "pdfs/generated.png"
     
-    print("Converting PDFs to high-resolution images for analysis...")
-    convert_pdf_to_image(correct_path, incorrect_img_path)
-    convert_pdf_to_image(generated_path, generated_img_path)
+    # Pages whose fingerprint hasn't moved since the last run aren't re-rendered
+    from page_fingerprints import FingerprintIndex
+    with FingerprintIndex() as fingerprints:
+        print("Converting PDFs to high-resolution images for analysis...")
+        convert_pdf_to_image(correct_path, incorrect_img_path, fingerprints=fingerprints)
+        convert_pdf_to_image(generated_path, generated_img_path, fingerprints=fingerprints)
+        
+        print("\nDiffing rasters...")
+        from raster_diff import diff_many, print_diff_results
+        print_diff_results(diff_many([(correct_path, generated_path)], heatmap_dir="pdfs",
+                                     fingerprints=fingerprints))
     
     print("\nExtracting images from original PDF...")
     extract_images_from_pdf(correct_path)  # Extract from correct.pdf
@@ -102,6 +161,9 @@ def analyze_differences():
     print("\nAnalysis complete. Image files generated for visual comparison:")
     print(f"Original PDF image: {incorrect_img_path}")
     print(f"Generated PDF image: {generated_img_path}")
+    print_cache_stats()
 
 if __name__ == "__main__":
+    from document_cache import enable_disk_cache
+    enable_disk_cache()
     analyze_differences() 
\ No newline at end of file
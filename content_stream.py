@@ -0,0 +1,322 @@
+import re
+
+# PDF lexical classes
+WHITESPACE = b"\x00\t\n\x0c\r "
+DELIMITERS = b"()<>[]{}/%"
+
+# Text-positioning operators that move to a new line; a run of text shown
+# after one of these is not joined to the text before it
+LINE_MOVES = {b"T*", b"Tm", b"'", b'"'}
+
+_ESCAPES = {
+    ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t",
+    ord("b"): b"\b", ord("f"): b"\f",
+    ord("("): b"(", ord(")"): b")", ord("\\"): b"\\",
+}
+
+_BFCHAR_BLOCK = re.compile(rb"beginbfchar(.*?)endbfchar", re.DOTALL)
+_BFRANGE_BLOCK = re.compile(rb"beginbfrange(.*?)endbfrange", re.DOTALL)
+_HEX_TOKEN = re.compile(rb"<([0-9A-Fa-f\s]*)>")
+_BFRANGE_ENTRY = re.compile(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]+>|\[[^\]]*\])")
+
+def tokenize(data):
+    """Yield (kind, value, start, end) tokens from a content stream.
+
+    kind is one of 'number', 'name', 'string', 'hexstring', 'array_start',
+    'array_end', 'dict_start', 'dict_end', 'operator' or 'inline_image'.
+    start/end are byte offsets into data, so tokens can be rewritten in place.
+    """
+    i = 0
+    n = len(data)
+    while i < n:
+        ch = data[i]
+        if ch in WHITESPACE:
+            i += 1
+        elif ch == 0x25:  # % comment
+            while i < n and data[i] not in b"\r\n":
+                i += 1
+        elif ch == 0x28:  # ( literal string
+            start = i
+            i += 1
+            depth = 1
+            value = bytearray()
+            while i < n and depth:
+                ch = data[i]
+                if ch == 0x5C:  # backslash
+                    i += 1
+                    if i >= n:
+                        break
+                    ch = data[i]
+                    if ch in _ESCAPES:
+                        value += _ESCAPES[ch]
+                        i += 1
+                    elif 0x30 <= ch <= 0x37:
+                        octal = data[i:i + 3]
+                        digits = len(octal) - len(octal.lstrip(b"01234567"))
+                        value.append(int(octal[:digits], 8) & 0xFF)
+                        i += digits
+                    elif ch in b"\r\n":
+                        # Line continuation
+                        i += 2 if data[i:i + 2] == b"\r\n" else 1
+                    else:
+                        value.append(ch)
+                        i += 1
+                    continue
+                if ch == 0x28:
+                    depth += 1
+                elif ch == 0x29:
+                    depth -= 1
+                    if not depth:
+                        i += 1
+                        break
+                value.append(ch)
+                i += 1
+            yield "string", bytes(value), start, i
+        elif ch == 0x3C:  # < hex string or << dict
+            start = i
+            if data[i:i + 2] == b"<<":
+                i += 2
+                yield "dict_start", b"<<", start, i
+                continue
+            end = data.index(b">", i)
+            hex_digits = bytes(b for b in data[i + 1:end] if b not in WHITESPACE)
+            if len(hex_digits) % 2:
+                hex_digits += b"0"
+            i = end + 1
+            yield "hexstring", bytes.fromhex(hex_digits.decode()), start, i
+        elif ch == 0x3E:  # >> dict end
+            start = i
+            i += 2
+            yield "dict_end", b">>", start, i
+        elif ch == 0x5B:
+            i += 1
+            yield "array_start", b"[", i - 1, i
+        elif ch == 0x5D:
+            i += 1
+            yield "array_end", b"]", i - 1, i
+        elif ch == 0x2F:  # / name
+            start = i
+            i += 1
+            while i < n and data[i] not in WHITESPACE and data[i] not in DELIMITERS:
+                i += 1
+            yield "name", data[start + 1:i], start, i
+        else:
+            start = i
+            while i < n and data[i] not in WHITESPACE and data[i] not in DELIMITERS:
+                i += 1
+            if i == start:
+                # Stray delimiter ({ or }); skip it
+                i += 1
+                continue
+            word = data[start:i]
+            if word == b"BI":
+                # Inline image: skip the binary payload up to EI
+                end = data.find(b"EI", i)
+                while end != -1 and not (data[end - 1] in WHITESPACE and
+                                         (end + 2 >= n or data[end + 2] in WHITESPACE)):
+                    end = data.find(b"EI", end + 2)
+                i = n if end == -1 else end + 2
+                yield "inline_image", data[start:i], start, i
+                continue
+            try:
+                yield "number", float(word), start, i
+            except ValueError:
+                yield "operator", word, start, i
+
+def _parse_hex_code(hex_digits):
+    return bytes.fromhex(hex_digits.decode())
+
+def _decode_unicode(hex_digits):
+    raw = _parse_hex_code(hex_digits)
+    return raw.decode("utf-16-be", errors="replace")
+
+def parse_to_unicode(cmap_data):
+    """Parse a ToUnicode CMap into a {code bytes: text} dict."""
+    mapping = {}
+    for block in _BFCHAR_BLOCK.findall(cmap_data):
+        hex_tokens = _HEX_TOKEN.findall(block)
+        for src, dst in zip(hex_tokens[0::2], hex_tokens[1::2]):
+            mapping[_parse_hex_code(src)] = _decode_unicode(dst)
+    for block in _BFRANGE_BLOCK.findall(cmap_data):
+        for lo, hi, dst in _BFRANGE_ENTRY.findall(block):
+            width = len(lo) // 2
+            lo_value = int(lo, 16)
+            hi_value = int(hi, 16)
+            if dst.startswith(b"["):
+                targets = [_decode_unicode(t) for t in _HEX_TOKEN.findall(dst)]
+                for offset, text in enumerate(targets[:hi_value - lo_value + 1]):
+                    mapping[(lo_value + offset).to_bytes(width, "big")] = text
+            else:
+                base = _parse_hex_code(dst.strip(b"<>"))
+                base_value = int.from_bytes(base, "big")
+                for offset in range(hi_value - lo_value + 1):
+                    text = (base_value + offset).to_bytes(len(base), "big")
+                    mapping[(lo_value + offset).to_bytes(width, "big")] = text.decode("utf-16-be", errors="replace")
+    return mapping
+
+class FontCodec:
+    """Maps between a font's character codes and Unicode text."""
+
+    def __init__(self, code_width, to_unicode=None):
+        self.code_width = code_width
+        self.to_unicode = to_unicode or {}
+        self.from_unicode = {}
+        for code, text in self.to_unicode.items():
+            # First code wins, so a glyph that already appears is reused
+            self.from_unicode.setdefault(text, code)
+
+    def split(self, raw):
+        """Split a string operand into character codes."""
+        width = self.code_width
+        return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+    def decode_code(self, code):
+        text = self.to_unicode.get(code)
+        if text is None:
+            # Simple fonts without a ToUnicode map: assume a Latin encoding
+            text = code.decode("latin-1") if self.code_width == 1 else "�"
+        return text
+
+    def encode(self, text):
+        """Encode text as raw codes, or return None if a glyph is missing."""
+        codes = []
+        for char in text:
+            code = self.from_unicode.get(char)
+            if code is None:
+                if self.code_width != 1 or self.to_unicode:
+                    return None
+                try:
+                    code = char.encode("latin-1")
+                except UnicodeEncodeError:
+                    return None
+            codes.append(code)
+        return b"".join(codes)
+
+def load_page_fonts(doc, page):
+    """Build a FontCodec for each font resource name on a PyMuPDF page."""
+    fonts = {}
+    for xref, _ext, font_type, _basefont, name, _encoding in page.get_fonts():
+        code_width = 2 if font_type == "Type0" else 1
+        to_unicode = None
+        kind, value = doc.xref_get_key(xref, "ToUnicode")
+        if kind == "xref":
+            to_unicode = parse_to_unicode(doc.xref_stream(int(value.split()[0])))
+        fonts[name.encode()] = FontCodec(code_width, to_unicode)
+    return fonts
+
+def _multiply(m1, m2):
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (a1 * a2 + b1 * c2, a1 * b2 + b1 * d2,
+            c1 * a2 + d1 * c2, c1 * b2 + d1 * d2,
+            e1 * a2 + f1 * c2 + e2, e1 * b2 + f1 * d2 + f2)
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+def text_segments(streams, fonts):
+    """Walk the page's content streams and yield text runs.
+
+    streams is a list of decoded content-stream bytes, in page order. Yields
+    one run per line of text (a BT block is split wherever the text moves to
+    a new line). Each run is a list of segments; a segment is one string
+    operand of Tj/TJ/'/" as a dict with the stream index, byte span, font
+    codec, decoded codes/text and the line origin (x, y) in user space.
+    """
+    ctm = IDENTITY
+    ctm_stack = []
+    text_matrix = line_matrix = IDENTITY
+    leading = 0.0
+    font = None
+    run = []
+    operands = []
+    array = None
+
+    def line_origin():
+        a, b, c, d, e, f = _multiply(line_matrix, ctm)
+        return e, f
+
+    def add_segment(stream_index, token):
+        _kind, raw, start, end = token
+        if font is None:
+            return
+        codes = font.split(raw)
+        run.append({
+            "stream": stream_index,
+            "start": start,
+            "end": end,
+            "font": font,
+            "codes": codes,
+            "text": [font.decode_code(code) for code in codes],
+            "origin": line_origin(),
+        })
+
+    for stream_index, data in enumerate(streams):
+        for token in tokenize(data):
+            kind, value = token[0], token[1]
+            if kind == "array_start":
+                array = []
+                continue
+            if kind == "array_end":
+                operands.append(("array", array))
+                array = None
+                continue
+            if array is not None:
+                array.append(token)
+                continue
+            if kind != "operator":
+                operands.append(token)
+                continue
+
+            op = value
+            # Moving to a new line ends the current run; a purely horizontal
+            # Td (e.g. kerning inside "$217.75") keeps it going
+            new_line = op in LINE_MOVES or (op in (b"Td", b"TD") and len(operands) >= 2
+                                            and operands[-1][1] != 0)
+            if new_line and run:
+                yield run
+                run = []
+
+            if op == b"q":
+                ctm_stack.append(ctm)
+            elif op == b"Q":
+                if ctm_stack:
+                    ctm = ctm_stack.pop()
+            elif op == b"cm" and len(operands) >= 6:
+                ctm = _multiply(tuple(t[1] for t in operands[-6:]), ctm)
+            elif op == b"BT":
+                text_matrix = line_matrix = IDENTITY
+            elif op == b"ET":
+                if run:
+                    yield run
+                    run = []
+            elif op == b"Tf" and len(operands) >= 2:
+                font = fonts.get(operands[-2][1])
+            elif op == b"TL" and operands:
+                leading = operands[-1][1]
+            elif op in (b"Td", b"TD") and len(operands) >= 2:
+                tx, ty = operands[-2][1], operands[-1][1]
+                if op == b"TD":
+                    leading = -ty
+                line_matrix = _multiply((1.0, 0.0, 0.0, 1.0, tx, ty), line_matrix)
+                text_matrix = line_matrix
+            elif op == b"Tm" and len(operands) >= 6:
+                line_matrix = text_matrix = tuple(t[1] for t in operands[-6:])
+            elif op in (b"T*", b"'", b'"'):
+                line_matrix = _multiply((1.0, 0.0, 0.0, 1.0, 0.0, -leading), line_matrix)
+                text_matrix = line_matrix
+
+            if op in (b"Tj", b"'", b'"') and operands and operands[-1][0] in ("string", "hexstring"):
+                add_segment(stream_index, operands[-1])
+            elif op == b"TJ" and operands and operands[-1][0] == "array":
+                for item in operands[-1][1]:
+                    if item[0] in ("string", "hexstring"):
+                        add_segment(stream_index, item)
+
+            operands = []
+
+    if run:
+        yield run
+
+def encode_hex(raw):
+    """Serialize raw string bytes as a PDF hex string."""
+    return b"<" + raw.hex().upper().encode() + b">"
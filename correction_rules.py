@@ -0,0 +1,307 @@
+import json
+import os
+import re
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# One correction. Exactly one of find (literal) / pattern (compiled regex) is
+# used; x_range / y_range are (min, max, min inclusive, max inclusive)
+# bounds on the run's origin, either end None; check is an optional
+# callable(x, y) for rules built in code.
+Rule = namedtuple("Rule", ["id", "find", "replace", "pattern", "x_range", "y_range", "check"])
+
+STATUSES = ("replaced", "split glyph", "missing glyph")
+
+class AhoCorasick:
+    """Finds every occurrence of many literal strings in a single pass over a text."""
+
+    def __init__(self, patterns):
+        # Trie of dicts; out[node] lists (pattern index, length) ending there
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = child
+            self.out[node].append((index, len(pattern)))
+
+        # Failure links, breadth first, so a node's shorter suffixes are done first
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, text):
+        """Yield (pattern index, start, end) for every occurrence, overlaps included."""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index, length in out[node]:
+                yield index, end - length, end
+
+# Helper function for checking a value against an optional range (see Rule)
+def _within(value, bounds):
+    if bounds is None:
+        return True
+    low, high, low_inclusive, high_inclusive = bounds
+    return ((low is None or value > low or (low_inclusive and value == low))
+            and (high is None or value < high or (high_inclusive and value == high)))
+
+class RuleSet:
+    """A compiled list of rules; earlier rules take priority where matches overlap."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        seen = set()
+        for i, rule in enumerate(self.rules):
+            if rule.id in seen:
+                raise ValueError(f"Rule {i}: duplicate id {rule.id!r}")
+            seen.add(rule.id)
+        self.literal_index = [i for i, rule in enumerate(self.rules) if rule.pattern is None]
+        self.regex_index = [i for i, rule in enumerate(self.rules) if rule.pattern is not None]
+        self.matcher = AhoCorasick([self.rules[i].find for i in self.literal_index])
+
+    def allows(self, rule_index, x, y):
+        """Check a rule's position constraints for a match at (x, y)."""
+        rule = self.rules[rule_index]
+        return (_within(x, rule.x_range) and _within(y, rule.y_range)
+                and (rule.check is None or rule.check(x, y)))
+
+    def matches(self, text):
+        """Return (rule index, start, end, replacement) candidates in priority order.
+
+        Like repeated str.find, each rule's own matches don't overlap: scanning
+        resumes after every match, whether or not it is later accepted.
+        """
+        by_rule = {}
+        for literal, start, end in self.matcher.search(text):
+            by_rule.setdefault(self.literal_index[literal], []).append((start, end))
+        found = []
+        for rule_index in sorted(by_rule):
+            rule = self.rules[rule_index]
+            resume = 0
+            for start, end in sorted(by_rule[rule_index]):
+                if start >= resume:
+                    found.append((rule_index, start, end, rule.replace))
+                    resume = end
+        for rule_index in self.regex_index:
+            rule = self.rules[rule_index]
+            for match in rule.pattern.finditer(text):
+                if match.end() > match.start():
+                    found.append((rule_index, match.start(), match.end(), match.expand(rule.replace)))
+        found.sort(key=lambda m: (m[0], m[1]))
+        return found
+
+    def apply(self, text, x=0, y=0, whole=False):
+        """Return text with every allowed, non-overlapping match replaced.
+
+        With whole=True a rule only applies when it matches all of text.
+        """
+        taken = [False] * len(text)
+        edits = []
+        for rule_index, start, end, replacement in self.matches(text):
+            if whole and (start, end) != (0, len(text)):
+                continue
+            if any(taken[start:end]) or not self.allows(rule_index, x, y):
+                continue
+            taken[start:end] = [True] * (end - start)
+            edits.append((start, end, replacement))
+        for start, end, replacement in sorted(edits, reverse=True):
+            text = text[:start] + replacement + text[end:]
+        return text
+
+# Bound keys of the object form of a range: key -> (is the minimum, inclusive)
+_BOUND_KEYS = {"ge": (True, True), "gt": (True, False), "le": (False, True), "lt": (False, False)}
+
+# Helper function for validating one end of a range
+def _number_or_none(value):
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+def _range(where, key, index):
+    """Parse one "where" range: [min, max] (inclusive, either may be null) or {"gt"/"ge"/"lt"/"le": n}."""
+    bounds = where.get(key)
+    if bounds is None:
+        return None
+    if isinstance(bounds, list) and len(bounds) == 2 and all(map(_number_or_none, bounds)):
+        return (bounds[0], bounds[1], True, True)
+    if (isinstance(bounds, dict) and bounds and set(bounds) <= set(_BOUND_KEYS)
+            and all(value is not None and _number_or_none(value) for value in bounds.values())):
+        low = high = None
+        low_inclusive = high_inclusive = True
+        for name, value in bounds.items():
+            is_min, inclusive = _BOUND_KEYS[name]
+            if is_min:
+                if low is not None:
+                    raise ValueError(f"Rule {index}: 'where' {key} has two lower bounds")
+                low, low_inclusive = value, inclusive
+            else:
+                if high is not None:
+                    raise ValueError(f"Rule {index}: 'where' {key} has two upper bounds")
+                high, high_inclusive = value, inclusive
+        return (low, high, low_inclusive, high_inclusive)
+    raise ValueError(f"Rule {index}: 'where' {key} must be [min, max] or an object of gt/ge/lt/le bounds, "
+                     f"not {bounds!r}")
+
+def rule_from_dict(spec, index=0):
+    """Build a Rule from its rule-file form (see load_rules)."""
+    if "replace" not in spec or ("find" in spec) == ("regex" in spec):
+        raise ValueError(f"Rule {index}: needs 'replace' and exactly one of 'find' or 'regex'")
+    find = spec.get("find")
+    if find == "":
+        raise ValueError(f"Rule {index}: 'find' must not be empty")
+    try:
+        pattern = re.compile(spec["regex"]) if "regex" in spec else None
+    except re.error as e:
+        raise ValueError(f"Rule {index}: bad regex: {e}") from None
+    where = spec.get("where") or {}
+    if not isinstance(where, dict) or not set(where) <= {"x", "y"}:
+        raise ValueError(f"Rule {index}: 'where' must be an object with 'x' and/or 'y', not {where!r}")
+    return Rule(spec.get("id") or find or spec["regex"], find, spec["replace"], pattern,
+                _range(where, "x", index), _range(where, "y", index), None)
+
+def load_rules(path):
+    """Load correction rules from a JSON list or a JSONL file (one rule per line).
+
+    Each rule is an object with "replace" and either "find" (a literal) or
+    "regex" (a Python regex; the replacement may use \\1 etc.), plus an
+    optional "id" for the report (unique; it defaults to the find or regex)
+    and "where": {"x": ..., "y": ...} bounding the text run's origin in PDF
+    points. A bound is either [min, max], inclusive with either end null,
+    or an object such as {"gt": 500} or {"ge": 100, "lt": 200} for strict
+    bounds. Rules are applied in file order; an earlier rule wins an overlap.
+    """
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            specs = [json.loads(line) for line in f if line.strip()]
+        else:
+            specs = json.load(f)
+    return [rule_from_dict(spec, i) for i, spec in enumerate(specs)]
+
+def compile_rules(rules):
+    """Return a RuleSet from a RuleSet, Rules, rule-file dicts or (find, replace, check) tuples."""
+    if isinstance(rules, RuleSet):
+        return rules
+    compiled = []
+    for i, rule in enumerate(rules):
+        if isinstance(rule, Rule):
+            compiled.append(rule)
+        elif isinstance(rule, dict):
+            compiled.append(rule_from_dict(rule, i))
+        else:
+            find, replace, check = rule
+            compiled.append(Rule(find, find, replace, None, None, None, check))
+    return RuleSet(compiled)
+
+def summarize_reports(reports, rule_set):
+    """Aggregate per-file edit reports into per-rule counts.
+
+    Returns {rule id: {'replaced': n, 'split glyph': n, 'missing glyph': n,
+    'files': n}}, with every rule listed, matched or not.
+    """
+    summary = {rule.id: dict.fromkeys(STATUSES + ("files",), 0) for rule in rule_set.rules}
+    for report in reports:
+        touched = set()
+        for result in report:
+            summary[result['rule']][result['status']] += 1
+            touched.add(result['rule'])
+        for rule_id in touched:
+            summary[rule_id]['files'] += 1
+    return summary
+
+def print_rule_summary(summary):
+    """Print one line of match counts per rule."""
+    print(f"{'rule':>30} {'replaced':>9} {'split':>7} {'missing':>8} {'files':>7}")
+    for rule_id, counts in summary.items():
+        print(f"{rule_id[:30]:>30} {counts['replaced']:9d} {counts['split glyph']:7d} "
+              f"{counts['missing glyph']:8d} {counts['files']:7d}")
+
+# Each worker compiles the rules once, not once per file
+_WORKER_RULES = None
+
+def _init_worker(rules):
+    global _WORKER_RULES
+    _WORKER_RULES = compile_rules(rules)
+
+def _correct_job(args):
+    from pdf_editor import edit_pdf_in_place
+    input_path, output_path, incremental = args
+    try:
+        report = edit_pdf_in_place(input_path, output_path, rules=_WORKER_RULES,
+                                   incremental=incremental, verbose=False)
+        return input_path, report, None
+    except Exception as e:
+        return input_path, [], f"{type(e).__name__}: {e}"
+
+def correct_many(jobs, rules, workers=None, incremental=True):
+    """Apply rules to many PDFs in parallel.
+
+    jobs is a list of (input path, output path or None for in place); rules
+    must be picklable (Rules from load_rules or rule-file dicts, not
+    lambdas). Returns (per-file results, per-rule summary), where each
+    result is {'path', 'report', 'error'}.
+    """
+    jobs = [(input_path, output_path, incremental) for input_path, output_path in jobs]
+    if workers == 1 or len(jobs) <= 1:
+        _init_worker(rules)
+        outcomes = [_correct_job(job) for job in jobs]
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules,)) as pool:
+            outcomes = list(pool.map(_correct_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    results = [{"path": path, "report": report, "error": error} for path, report, error in outcomes]
+    return results, summarize_reports([r["report"] for r in results], compile_rules(rules))
+
+def main(argv=None):
+    import argparse
+    import time
+    from batch_generate import collect_sources
+
+    parser = argparse.ArgumentParser(description="Apply a correction rule file to many PDFs.")
+    parser.add_argument("rules", help="Rule file (.json list or .jsonl)")
+    parser.add_argument("sources", nargs="+", help="PDFs, directories or globs")
+    parser.add_argument("-o", "--output-dir", default=None, help="Write corrected copies here (default: edit in place)")
+    parser.add_argument("--rewrite", action="store_true", help="Rewrite whole files instead of appending updates")
+    parser.add_argument("--report", default=None, help="Write the per-file and per-rule report here as JSON")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    args = parser.parse_args(argv)
+
+    rules = load_rules(args.rules)
+    sources = [path for source in args.sources for path in collect_sources(source)]
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(path, os.path.join(args.output_dir, os.path.basename(path)) if args.output_dir else None)
+            for path in sources]
+
+    start = time.perf_counter()
+    results, summary = correct_many(jobs, rules, args.workers, incremental=not args.rewrite)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        if result["error"]:
+            print(f"Failed {result['path']}: {result['error']}")
+    print_rule_summary(summary)
+    print(f"\nProcessed {len(results)} PDFs with {len(rules)} rules in {elapsed:.2f}s")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"files": results, "rules": summary}, f, indent=2)
+    return 1 if any(result["error"] for result in results) else 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from types import MappingProxyType
+
+# Bump when the cached model layout changes, so stale entries are ignored
+MODEL_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("PDF_EDIT_CACHE_DIR", ".cache"), "documents")
+DEFAULT_MAX_ENTRIES = 1000
+MEMORY_CACHE_SIZE = 128
+
+# Directory models are also kept in across runs. Off (None) by default, so
+# library callers (batch workers, daemon jobs, payload cross-checks) never
+# write into the working directory; commands opt in with enable_disk_cache.
+DISK_CACHE_DIR = None
+
+# Set to False to always parse (e.g. when benchmarking the parsers themselves)
+CACHE_ENABLED = True
+
+# Parts of the document model; each is parsed only when first asked for
+ALL_PARTS = ("text", "spans", "images", "layout")
+
+DOLLAR_AMOUNT = re.compile(r'\$\d+\.\d{2}')
+
+# When a cache directory is over max_entries, eviction takes it down to
+# this fraction of the limit, so the directory is rescanned only once
+# every so many new entries rather than on every miss
+EVICT_TO = 0.9
+
+# In-process models by content hash (LRU), so a file is parsed at most once per run
+_MEMORY_CACHE = OrderedDict()
+
+# Entries in each cache directory as of the last scan, plus the ones this
+# process has written since; other processes' writes show up at the next scan
+_DISK_ENTRY_COUNTS = {}
+
+CACHE_STATS = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+def enable_disk_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """Keep parsed models on disk under cache_dir for later runs (None turns it off again)."""
+    global DISK_CACHE_DIR
+    DISK_CACHE_DIR = cache_dir
+
+def _freeze(value):
+    """Return a read-only copy of a model value: dicts become mapping proxies, lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def content_hash(pdf_path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _parse_text(pdf_path):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(pdf_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+def _parse_first_page_text(pdf_path):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+    return (reader.pages[0].extract_text() or "") if page_count else "", page_count
+
+def _parse_spans_and_images(pdf_path):
+    import fitz
+    doc = fitz.open(pdf_path)
+    spans = []
+    images = []
+    for page in doc:
+        page_spans = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                for span in line["spans"]:
+                    if span["text"].strip():
+                        page_spans.append({
+                            "text": span["text"],
+                            "bbox": list(span["bbox"]),
+                            "font": span["font"],
+                            "size": span["size"],
+                        })
+        spans.append(page_spans)
+
+        page_images = []
+        for img in page.get_images():
+            xref = img[0]
+            page_images.append({
+                "xref": xref,
+                "width": img[2],
+                "height": img[3],
+                "bboxes": [list(rect) for rect in page.get_image_rects(xref)],
+            })
+        images.append(page_images)
+    doc.close()
+    return spans, images
+
+def _parse_layout(pdf_path):
+    from analyze_layout import analyze_pdf_layout
+    elements = analyze_pdf_layout(pdf_path)
+    for elem in elements:
+        elem["bbox"] = list(elem["bbox"])
+    return elements
+
+def _build_parts(model, pdf_path, parts):
+    """Parse any requested parts the model doesn't have yet."""
+    if "text" in parts and "text" not in model:
+        model["text"] = _parse_text(pdf_path)
+        model["dollar_amounts"] = [
+            match.group() for text in model["text"] for match in DOLLAR_AMOUNT.finditer(text)
+        ]
+        model["page_count"] = len(model["text"])
+    if "first_page_text" in parts and "first_page_text" not in model:
+        if "text" in model:
+            model["first_page_text"] = model["text"][0] if model["text"] else ""
+        else:
+            model["first_page_text"], model["page_count"] = _parse_first_page_text(pdf_path)
+    if ("spans" in parts and "spans" not in model) or ("images" in parts and "images" not in model):
+        model["spans"], model["images"] = _parse_spans_and_images(pdf_path)
+        model["page_count"] = len(model["spans"])
+    if "layout" in parts and "layout" not in model:
+        model["layout"] = _parse_layout(pdf_path)
+
+def _entry_path(cache_dir, digest):
+    return os.path.join(cache_dir, f"{digest}.v{MODEL_VERSION}.json")
+
+def _evict(cache_dir, max_entries):
+    """Drop the least recently used entries, down to EVICT_TO of max_entries."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".json"):
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry.path))
+            except OSError:
+                continue
+    entries.sort()
+    keep = int(max_entries * EVICT_TO) if len(entries) > max_entries else len(entries)
+    for _, path in entries[:len(entries) - keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    _DISK_ENTRY_COUNTS[cache_dir] = keep
+
+# Helper function for counting a newly written entry, evicting once the
+# directory is over the limit
+def _added_entry(cache_dir, max_entries):
+    if cache_dir not in _DISK_ENTRY_COUNTS:
+        # First write here from this process; one scan finds the current count
+        _evict(cache_dir, max_entries)
+        return
+    _DISK_ENTRY_COUNTS[cache_dir] += 1
+    if _DISK_ENTRY_COUNTS[cache_dir] > max_entries:
+        _evict(cache_dir, max_entries)
+
+def load_document(pdf_path, parts=ALL_PARTS, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES):
+    """Return the parsed document model for a PDF, using the cache when possible.
+
+    The model is a dict with 'sha256', 'page_count' and the requested parts:
+    'text' (per-page text, plus 'dollar_amounts'), 'spans' (per-page text
+    spans with bboxes), 'images' (per-page image xrefs and placements) and
+    'layout' (analyze_layout elements). 'first_page_text' is the text of
+    page 0 alone, for callers that only need that; it is parsed on its own
+    (no other page's text is extracted) unless 'text' is already cached.
+    Entries are keyed by content hash, so an edited file is parsed again
+    while a copy of the same file is not.
+
+    The model is shared by every caller, so it is read-only: a mapping
+    proxy, with tuples for lists and mapping proxies for nested dicts.
+    Models are kept in memory; cache_dir (default DISK_CACHE_DIR, see
+    enable_disk_cache) also keeps them on disk.
+    """
+    if cache_dir is None:
+        cache_dir = DISK_CACHE_DIR
+    if not CACHE_ENABLED:
+        model = {"sha256": None}
+        _build_parts(model, pdf_path, parts)
+        return _freeze(model)
+
+    digest = content_hash(pdf_path)
+    model = _MEMORY_CACHE.get(digest)
+    entry_path = _entry_path(cache_dir, digest) if cache_dir else None
+
+    if model is not None:
+        CACHE_STATS["memory_hits"] += 1
+    elif entry_path and os.path.exists(entry_path):
+        with open(entry_path) as f:
+            model = _freeze(json.load(f))
+        # Touch the entry so eviction sees it as recently used
+        os.utime(entry_path)
+        CACHE_STATS["disk_hits"] += 1
+    else:
+        model = MappingProxyType({"sha256": digest})
+        CACHE_STATS["misses"] += 1
+
+    missing = [part for part in parts if part not in model]
+    if missing:
+        updated = dict(model)
+        _build_parts(updated, pdf_path, missing)
+        if entry_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            is_new = not os.path.exists(entry_path)
+            tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                # Parts already in the model are frozen; write them back as plain JSON
+                json.dump(updated, f, default=dict)
+            os.replace(tmp_path, entry_path)
+            if is_new:
+                _added_entry(cache_dir, max_entries)
+        # Only the new parts need freezing
+        model = MappingProxyType({key: value if key in model else _freeze(value)
+                                  for key, value in updated.items()})
+
+    _MEMORY_CACHE[digest] = model
+    _MEMORY_CACHE.move_to_end(digest)
+    if len(_MEMORY_CACHE) > MEMORY_CACHE_SIZE:
+        _MEMORY_CACHE.popitem(last=False)
+    return model
+
+def cache_hit_rate():
+    """Fraction of load_document calls served without parsing."""
+    total = sum(CACHE_STATS.values())
+    if not total:
+        return 0.0
+    return (CACHE_STATS["memory_hits"] + CACHE_STATS["disk_hits"]) / total
+
+def print_cache_stats():
+    """Print the document cache hit counts and hit rate."""
+    total = sum(CACHE_STATS.values())
+    print(f"\nDocument cache: {CACHE_STATS['memory_hits']} memory hits, "
+          f"{CACHE_STATS['disk_hits']} disk hits, {CACHE_STATS['misses']} misses "
+          f"({cache_hit_rate() * 100:.1f}% hit rate over {total} loads)")
+
+if __name__ == "__main__":
+    import sys
+
+    paths = sys.argv[1:] or ["pdfs/correct.pdf", "pdfs/incorrect.pdf", "pdfs/generated.pdf"]
+    enable_disk_cache()
+    for path in paths:
+        model = load_document(path)
+        print(f"{path}: {model['page_count']} page(s), {sum(len(s) for s in model['spans'])} spans, "
+              f"{sum(len(i) for i in model['images'])} images, {len(model['dollar_amounts'])} dollar amounts")
+    print_cache_stats()
@@ -0,0 +1,60 @@
+from reportlab.pdfbase import pdfmetrics
+
+# (regular, bold) fonts the invoice layout is designed around
+DEFAULT_FONTS = ("Helvetica", "Helvetica-Bold")
+
+class GlyphWidthTable(dict):
+    """Glyph widths for one (font, size), filled in lazily on first use."""
+
+    def __init__(self, font_name, font_size):
+        super().__init__()
+        self.font_name = font_name
+        self.font_size = font_size
+
+    def __missing__(self, char):
+        width = pdfmetrics.stringWidth(char, self.font_name, self.font_size)
+        self[char] = width
+        return width
+
+# One table per (font, size); each only ever holds the glyphs actually used
+_GLYPH_TABLES = {}
+
+def glyph_width_table(font_name, font_size):
+    """Return the shared glyph-width table for a font and size."""
+    key = (font_name, font_size)
+    table = _GLYPH_TABLES.get(key)
+    if table is None:
+        table = _GLYPH_TABLES[key] = GlyphWidthTable(font_name, font_size)
+    return table
+
+def string_width(text, font_name="Helvetica", font_size=10):
+    """Width of text in points, summed from the cached glyph widths."""
+    return sum(map(glyph_width_table(font_name, font_size).__getitem__, text))
+
+def word_widths(words, font_name="Helvetica", font_size=10):
+    """Widths of a batch of words, looked up against one glyph table."""
+    widths = glyph_width_table(font_name, font_size).__getitem__
+    return [sum(map(widths, word)) for word in words]
+
+def wrap_text(text, width_points, font_name="Helvetica", font_size=10):
+    """Word-wrap text into lines no wider than width_points."""
+    words = text.split()
+    lines = []
+    current_line = []
+    current_width = 0
+    space_width = string_width(" ", font_name, font_size)
+
+    for word, word_width in zip(words, word_widths(words, font_name, font_size)):
+        if current_width + word_width <= width_points:
+            current_line.append(word)
+            current_width += word_width + space_width
+        else:
+            if current_line:  # Only add non-empty lines
+                lines.append(" ".join(current_line))
+            current_line = [word]
+            current_width = word_width + space_width
+
+    if current_line:  # Add the last line if it exists
+        lines.append(" ".join(current_line))
+
+    return lines
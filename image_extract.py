@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+import instrumentation
+
+# Native file extension for image streams that are complete files as stored
+PASSTHROUGH_EXTENSIONS = {
+    "DCTDecode": "jpg",
+    "JPXDecode": "jp2",
+    "JBIG2Decode": "jb2",
+}
+
+def raw_image(doc, xref, filter_name):
+    """Return (bytes, extension) for an image xref without decoding it.
+
+    JPEG, JPEG 2000 and JBIG2 streams are written exactly as stored. Other
+    encodings (Flate, CCITT, ...) are not image files on their own, so
+    MuPDF wraps those into a PNG instead.
+    """
+    ext = PASSTHROUGH_EXTENSIONS.get(filter_name)
+    if ext:
+        return doc.xref_stream_raw(xref), ext
+    base_image = doc.extract_image(xref)
+    return base_image["image"], base_image["ext"]
+
+def store_image(data, ext, output_dir):
+    """Write data under its content hash and return (sha256, path, written).
+
+    Files are content addressed, so the same image found in many PDFs (or
+    by several workers at once) is stored once.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(output_dir, digest[:2], f"{digest}.{ext}")
+    if os.path.exists(path):
+        return digest, path, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return digest, path, True
+
+@instrumentation.timed("image_extract")
+def extract_images(pdf_path, output_dir):
+    """Extract every distinct image (by xref) in a PDF into output_dir.
+
+    Returns one record per image placement: page, xref, size, filter,
+    sha256 and the stored path.
+    """
+    records = []
+    stored = {}
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            for img in page.get_images():
+                xref, width, height, filter_name = img[0], img[2], img[3], img[8]
+                if xref not in stored:
+                    data, ext = raw_image(doc, xref, filter_name)
+                    stored[xref] = store_image(data, ext, output_dir)
+                digest, path, written = stored[xref]
+                records.append({
+                    "page": page.number,
+                    "xref": xref,
+                    "width": width,
+                    "height": height,
+                    "filter": filter_name,
+                    "sha256": digest,
+                    "path": path,
+                    "written": written,
+                })
+                # Count the write only once per file
+                stored[xref] = (digest, path, False)
+    instrumentation.count("image_placements", len(records))
+    instrumentation.count("images_written", sum(record["written"] for record in records))
+    return records
+
+def _extract_job(args):
+    pdf_path, output_dir = args
+    try:
+        return pdf_path, extract_images(pdf_path, output_dir), None
+    except Exception as e:
+        return pdf_path, [], f"{type(e).__name__}: {e}"
+
+def extract_corpus(pdf_paths, output_dir, index_path=None, workers=None):
+    """Extract images from many PDFs in parallel, deduplicated by content hash.
+
+    Writes an index JSON mapping each PDF to its image records (and each
+    hash to the files that use it) when index_path is given, and returns
+    the index dict.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(path, output_dir) for path in pdf_paths]
+    if workers == 1 or len(jobs) <= 1:
+        results = [_extract_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_extract_job, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
+
+    index = {"files": {}, "images": {}, "errors": {}}
+    for pdf_path, records, error in results:
+        if error:
+            index["errors"][pdf_path] = error
+            continue
+        index["files"][pdf_path] = records
+        for record in records:
+            entry = index["images"].setdefault(record["sha256"], {"path": record["path"], "used_by": []})
+            if pdf_path not in entry["used_by"]:
+                entry["used_by"].append(pdf_path)
+
+    if index_path:
+        with open(index_path, "w") as f:
+            json.dump(index, f, indent=2)
+    return index
+
+def print_extract_summary(index):
+    """Print how many placements were found and how many unique images were stored."""
+    placements = sum(len(records) for records in index["files"].values())
+    written = sum(record["written"] for records in index["files"].values() for record in records)
+    print(f"Scanned {len(index['files'])} PDF(s): {placements} image placement(s), "
+          f"{len(index['images'])} unique image(s), {written} file(s) written")
+    for pdf_path, error in index["errors"].items():
+        print(f"  Error in {pdf_path}: {error}")
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from batch_generate import collect_sources
+
+    parser = argparse.ArgumentParser(description="Extract embedded images from PDFs without decoding them.")
+    parser.add_argument("sources", nargs="*", default=["pdfs"], help="PDF files, directories or globs")
+    parser.add_argument("-o", "--output-dir", default="pdfs/images", help="Content-addressed image store")
+    parser.add_argument("--index", default=None, help="Write the image index JSON here")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    pdf_paths = [path for source in args.sources for path in collect_sources(source)]
+    index = extract_corpus(pdf_paths, args.output_dir, args.index, args.workers)
+    print_extract_summary(index)
+    print(f"Done in {time.perf_counter() - start:.2f}s")
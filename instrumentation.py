@@ -0,0 +1,164 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# Also record the peak traced memory of each timed stage (slow; implies ENABLED)
+TRACE_MEMORY = os.environ.get("PDF_EDIT_TRACE_MEMORY", "") not in ("", "0")
+# Off unless asked for; every hook below checks this flag first
+ENABLED = TRACE_MEMORY or os.environ.get("PDF_EDIT_METRICS", "") not in ("", "0")
+
+METRIC_PREFIX = "pdf_edit"
+
+# stage -> {'count', 'seconds', 'max_seconds', 'peak_bytes'}
+TIMINGS = {}
+# name -> value
+COUNTERS = {}
+# label -> list of top allocation sites
+MEMORY_SNAPSHOTS = {}
+
+_NULL = nullcontext()
+
+def enable(trace_memory=False):
+    """Turn instrumentation on (optionally with tracemalloc per stage)."""
+    global ENABLED, TRACE_MEMORY
+    ENABLED = True
+    TRACE_MEMORY = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    """Turn instrumentation off; recorded metrics are kept until reset()."""
+    global ENABLED, TRACE_MEMORY
+    ENABLED = False
+    TRACE_MEMORY = False
+
+def reset():
+    """Forget every recorded timing, counter and snapshot."""
+    TIMINGS.clear()
+    COUNTERS.clear()
+    MEMORY_SNAPSHOTS.clear()
+
+def observe(stage, seconds, peak_bytes=None):
+    """Record one timed run of a stage."""
+    stats = TIMINGS.get(stage)
+    if stats is None:
+        stats = TIMINGS[stage] = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'peak_bytes': 0}
+    stats['count'] += 1
+    stats['seconds'] += seconds
+    if seconds > stats['max_seconds']:
+        stats['max_seconds'] = seconds
+    if peak_bytes is not None and peak_bytes > stats['peak_bytes']:
+        stats['peak_bytes'] = peak_bytes
+
+# tracemalloc has a single peak, so a stage's peak_bytes only covers the
+# part after the last stage nested inside it started
+@contextmanager
+def _timed_block(stage):
+    # Read the flag once, so disable() mid-block can't leave baseline unset
+    trace_memory = TRACE_MEMORY
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - baseline if trace_memory else None
+        observe(stage, seconds, peak)
+
+def timer(stage):
+    """Context manager timing a stage; a shared no-op when disabled."""
+    if not ENABLED:
+        return _NULL
+    return _timed_block(stage)
+
+def timed(stage):
+    """Decorator form of timer(); when disabled the call goes straight through."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _timed_block(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, value=1):
+    """Add value to a counter (no-op when disabled)."""
+    if ENABLED:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+def snapshot_memory(label, top=10):
+    """Store the top allocation sites right now (needs trace_memory)."""
+    if not (ENABLED and tracemalloc.is_tracing()):
+        return
+    stats = tracemalloc.take_snapshot().statistics("lineno")[:top]
+    MEMORY_SNAPSHOTS[label] = [
+        {"site": str(stat.traceback), "bytes": stat.size, "blocks": stat.count} for stat in stats
+    ]
+
+def metrics():
+    """Return every recorded metric as a JSON-ready dict."""
+    return {
+        "timings": {stage: dict(stats) for stage, stats in sorted(TIMINGS.items())},
+        "counters": dict(sorted(COUNTERS.items())),
+        "memory_snapshots": MEMORY_SNAPSHOTS,
+    }
+
+# Helper function for turning stage names into Prometheus label values
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def prometheus_text():
+    """Return the metrics in the Prometheus text exposition format."""
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        if not samples:
+            return
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{METRIC_PREFIX}_{name}{labels} {value}")
+
+    stages = sorted(TIMINGS.items())
+    family("stage_runs_total", "counter", "Times each stage ran.",
+           [(f'{{stage="{_label(s)}"}}', t['count']) for s, t in stages])
+    family("stage_seconds_total", "counter", "Total seconds spent in each stage.",
+           [(f'{{stage="{_label(s)}"}}', f"{t['seconds']:.6f}") for s, t in stages])
+    family("stage_max_seconds", "gauge", "Slowest single run of each stage.",
+           [(f'{{stage="{_label(s)}"}}', f"{t['max_seconds']:.6f}") for s, t in stages])
+    family("stage_peak_bytes", "gauge", "Peak traced memory of each stage.",
+           [(f'{{stage="{_label(s)}"}}', t['peak_bytes']) for s, t in stages if t['peak_bytes']])
+    family("events_total", "counter", "Instrumentation counters.",
+           [(f'{{name="{_label(n)}"}}', v) for n, v in sorted(COUNTERS.items())])
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path):
+    """Write the metrics to path: Prometheus textfile format for .prom, else JSON.
+
+    Written atomically, as the node_exporter textfile collector expects.
+    """
+    content = prometheus_text() if path.endswith(".prom") else json.dumps(metrics(), indent=2)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def print_metrics():
+    """Print a one-line summary per stage and every counter."""
+    for stage, stats in sorted(TIMINGS.items()):
+        mean = stats['seconds'] / stats['count'] * 1000
+        line = f"{stage:>28}: {stats['count']:6d} runs, mean {mean:8.3f} ms, max {stats['max_seconds'] * 1000:8.3f} ms"
+        if stats['peak_bytes']:
+            line += f", peak {stats['peak_bytes'] / 1024:.0f} KiB"
+        print(line)
+    for name, value in sorted(COUNTERS.items()):
+        print(f"{name:>28}: {value}")
@@ -0,0 +1,277 @@
+from PyPDF2 import PdfReader
+from document_cache import load_document
+import instrumentation
+import os
+import re
+import time
+from collections import namedtuple
+
+COMPANY_ADDRESS = (
+    "Liberty Pest Control",
+    "8220 17th Avenue",
+    "Brooklyn, NY 11214",
+    "800-595-4692"
+)
+
+# Flags shared by every field pattern
+FIELD_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL
+
+# A field spec describes one value to pull out of the page text:
+#   name    - key in the extracted data (dotted names go into a sub-dict)
+#   pattern - regex, compiled once at import
+#   group   - capture group holding the value
+#   post    - post-processor applied to the stripped match (or None)
+#   default - value used when the pattern doesn't match
+#   literal - lowercase text every match contains (or None); when the page
+#             doesn't contain it the regex isn't run at all
+FieldSpec = namedtuple('FieldSpec', 'name pattern group post default literal')
+
+def _field(name, pattern, group=1, post=None, default=None, literal=None):
+    return FieldSpec(name, re.compile(pattern, FIELD_FLAGS), group, post, default, literal)
+
+# Customer names whose address block is copied from the source invoice,
+# comma separated; PDF_EDIT_CUSTOMER_NAMES overrides the default
+CUSTOMER_NAMES = tuple(name.strip() for name in
+                       os.environ.get("PDF_EDIT_CUSTOMER_NAMES", "Prime Produce").split(",") if name.strip())
+
+def customer_block_pattern(names=CUSTOMER_NAMES):
+    """Return the regex for a customer address block starting with one of the names."""
+    alternatives = [r'\s+'.join(re.escape(word) for word in name.split()) for name in names]
+    return r'(?:' + '|'.join(alternatives) + r')[^\n]*(?:\n[^\n]+){3}'
+
+def _first_six(value):
+    # Location number is concatenated with the bill-to number
+    return value[:6] if len(value) > 6 else value
+
+def _split_address_block(value):
+    lines = [line.strip() for line in value.strip().split('\n')]
+    if len(lines) < 4:
+        return None
+    # The city/state line runs into the start of the repeated customer name
+    name_start = lines[0].split()[0]
+    return {
+        'customer_name': lines[0],
+        'customer_contact': lines[1],
+        'customer_address': lines[2],
+        'customer_city_state': lines[3].split(name_start)[0].strip(),
+    }
+
+INVOICE_NUMBER_PATTERN = r'Invoice\s*#\s*(\d+)'
+INVOICE_NUMBER_RE = re.compile(INVOICE_NUMBER_PATTERN, FIELD_FLAGS)
+# Marks a continuation page of a multi-page invoice
+CONTINUATION_RE = re.compile(r'BROUGHT\s+FORWARD|Page\s+(?:[2-9]|\d{2,})\b', FIELD_FLAGS)
+WEEKDAY = r'(?:Mon|Tues|Wednes|Thurs|Fri|Satur|Sun)day'
+DATE = r'\d{2}/\d{2}/\d{4}'
+
+FIELD_SPECS = [
+    _field('invoice_number', INVOICE_NUMBER_PATTERN, literal='invoice'),
+    _field('day', r'Time:\s*(' + WEEKDAY + r')', literal='time:'),
+    _field('date', r'(' + DATE + r')', literal='/'),
+    _field('time', r'(\d{2}:\d{2}\s*[APM]+)', literal=':'),
+    # Bill-to number sits in front of the date in the bottom section, where it's cleaner
+    _field('bill_to', r'(\d{6})\s+' + DATE, literal='/'),
+    _field('location', r'Location:\s*(\d+)', post=_first_six, literal='location:'),
+    _field('terms', r'Terms:\s*([^\n]+)', literal='terms:'),
+    # Customer address block (first occurrence)
+    _field('customer', customer_block_pattern(), group=0, post=_split_address_block),
+    # Amounts appear in reverse order due to text layout
+    _field('amounts.subtotal', r'\$(\d+\.\d{2})\s+SUBTOTAL', post=float, default=0.0, literal='subtotal'),
+    _field('amounts.tax', r'\$(\d+\.\d{2})\s+TAX', post=float, default=0.0, literal='tax'),
+    _field('amounts.total', r'TOTAL\s*\$(\d+\.\d{2})', post=float, default=0.0, literal='total'),
+    # AMT PAID is shown in parentheses
+    _field('amounts.paid', r'\(\$(\d+\.\d{2})\)', post=float, default=0.0, literal='($'),
+    _field('amounts.due', r'\$(\d+\.\d{2})\s*AMOUNT\s+DUE', post=float, default=0.0, literal='amount'),
+]
+
+# Any service description followed by quantity and price
+SERVICE_PATTERN = re.compile(
+    r'([A-Z][A-Z\s]+(?:OR\s+)?[A-Z\s]+?)(?:SERVICE)?\s*(\d+\.\d{2})\s+\$(\d+\.\d{2})',
+    re.MULTILINE | re.DOTALL)
+
+# Per-field hit/miss counters and cumulative match time in seconds
+FIELD_STATS = {name: {'hits': 0, 'misses': 0, 'seconds': 0.0}
+               for name in [spec.name for spec in FIELD_SPECS] + ['service_items']}
+
+def reset_field_stats():
+    """Zero the per-field extraction counters."""
+    for stats in FIELD_STATS.values():
+        stats.update(hits=0, misses=0, seconds=0.0)
+
+def extract_fields(text):
+    """Search the text for each field spec's first match; return the raw values by name."""
+    timing = instrumentation.ENABLED
+    lowered = text.lower()
+    values = {}
+    for spec in FIELD_SPECS:
+        start = time.perf_counter()
+        value = None
+        if spec.literal is None or spec.literal in lowered:
+            match = spec.pattern.search(text)
+            if match:
+                value = match.group(spec.group).strip()
+                if spec.post is not None:
+                    value = spec.post(value)
+        seconds = time.perf_counter() - start
+        stats = FIELD_STATS[spec.name]
+        stats['seconds'] += seconds
+        if timing:
+            instrumentation.observe(f"extract.field.{spec.name}", seconds)
+        if value is None:
+            stats['misses'] += 1
+            value = spec.default
+        else:
+            stats['hits'] += 1
+        values[spec.name] = value
+    return values
+
+def extract_service_items(text):
+    """Extract all service line items (description, quantity, price)."""
+    start = time.perf_counter()
+    service_items = []
+    for match in SERVICE_PATTERN.finditer(text):
+        # Clean up description by removing extra whitespace and newlines
+        description = ' '.join(match.group(1).split())
+        if description.endswith('OR SPECIAL'):
+            description += ' SERVICE'
+        service_items.append({
+            'description': description,
+            'quantity': match.group(2),
+            'price': float(match.group(3))
+        })
+    seconds = time.perf_counter() - start
+    stats = FIELD_STATS['service_items']
+    stats['seconds'] += seconds
+    if instrumentation.ENABLED:
+        instrumentation.observe("extract.field.service_items", seconds)
+    stats['hits' if service_items else 'misses'] += 1
+    return service_items
+
+def fill_amount_fallbacks(amounts, service_items, tax_rate=0.08875):
+    """Calculate any amounts that weren't found in the text."""
+    if amounts['subtotal'] == 0 and len(service_items) > 0:
+        amounts['subtotal'] = sum(item['price'] for item in service_items)
+    if amounts['tax'] == 0 and amounts['subtotal'] > 0:
+        amounts['tax'] = round(amounts['subtotal'] * tax_rate, 2)
+    if amounts['total'] == 0:
+        amounts['total'] = amounts['subtotal'] + amounts['tax']
+    if amounts['due'] == 0:
+        amounts['due'] = amounts['total'] - amounts['paid']
+    return amounts
+
+def parse_invoice_text(text):
+    """Build the invoice data dict from the extracted text of an invoice."""
+    data = {
+        'customer_name': None,
+        'customer_contact': None,
+        'customer_address': None,
+        'customer_city_state': None,
+        'amounts': {},
+        'company_address': list(COMPANY_ADDRESS)
+    }
+    
+    for name, value in extract_fields(text).items():
+        if name == 'customer':
+            if value:
+                data.update(value)
+        elif name.startswith('amounts.'):
+            data['amounts'][name.split('.', 1)[1]] = value
+        else:
+            data[name] = value
+    
+    data['service_items'] = extract_service_items(text)
+    fill_amount_fallbacks(data['amounts'], data['service_items'])
+    return data
+
+def iter_invoices(source_pdf_path):
+    """Lazily yield the invoices in a (possibly very large) PDF.
+    
+    Pages are read one at a time. A page whose invoice number differs from
+    the current invoice starts a new one, as does a repeated number on a
+    page that isn't marked as a continuation (BROUGHT FORWARD / Page N).
+    Pages without a number are continuation pages. Each yielded dict also
+    has 'pages', the (first, last) zero-based page range of the invoice.
+    
+    PdfReader flattens the whole page tree up front (one small dict per
+    page) and caches every object it resolves, content streams included;
+    the cache is dropped after each page, so beyond the page tree only the
+    text of the invoice being assembled is held in memory.
+    """
+    reader = PdfReader(source_pdf_path)
+    current_number = None
+    current_texts = []
+    first_page = 0
+    
+    for page_index in range(len(reader.pages)):
+        text = reader.pages[page_index].extract_text() or ""
+        # Let go of this page's content streams and fonts
+        reader.resolved_objects.clear()
+        match = INVOICE_NUMBER_RE.search(text)
+        number = match.group(1) if match else None
+        
+        starts_invoice = number is not None and (
+            number != current_number or not CONTINUATION_RE.search(text))
+        if current_texts and starts_invoice:
+            data = parse_invoice_text("\n".join(current_texts))
+            data['pages'] = (first_page, page_index - 1)
+            yield data
+            current_texts = []
+        
+        if not current_texts:
+            first_page = page_index
+            current_number = number
+        elif current_number is None:
+            current_number = number
+        current_texts.append(text)
+    
+    if current_texts:
+        data = parse_invoice_text("\n".join(current_texts))
+        data['pages'] = (first_page, len(reader.pages) - 1)
+        yield data
+
+def extract_invoice_data(source_pdf_path, verbose=True):
+    """Extract all required data from the source PDF."""
+    with instrumentation.timer("extract.text"):
+        # Only the first page holds the fields; don't extract the others
+        text = load_document(source_pdf_path, parts=("first_page_text",))["first_page_text"]
+    
+    if verbose:
+        print("\nRaw text from PDF:")
+        print(text)
+    
+    with instrumentation.timer("extract.parse"):
+        data = parse_invoice_text(text)
+    instrumentation.count("invoices_extracted")
+    
+    if not verbose:
+        return data
+    
+    # Print extracted data for debugging
+    print("\nExtracted Data:")
+    print(f"Invoice Number: {data['invoice_number']}")
+    print(f"Day: {data['day']}")
+    print(f"Date: {data['date']}")
+    print(f"Time: {data['time']}")
+    print(f"Bill-To: {data['bill_to']}")
+    print(f"Location: {data['location']}")
+    print(f"Terms: {data['terms']}")
+    
+    print("\nCustomer Info:")
+    print(f"Name: {data['customer_name']}")
+    print(f"Contact: {data['customer_contact']}")
+    print(f"Address: {data['customer_address']}")
+    print(f"City/State: {data['customer_city_state']}")
+    
+    print("\nService Items:")
+    for index, item in enumerate(data['service_items'], start=1):
+        print(f"{index}. Description: {item['description']}")
+        print(f"   Quantity: {item['quantity']}")
+        print(f"   Price: ${item['price']:.2f}")
+        print()
+    print("Amounts:")
+    print(f"Subtotal: ${data['amounts']['subtotal']:.2f}")
+    print(f"Tax: ${data['amounts']['tax']:.2f}")
+    print(f"Total: ${data['amounts']['total']:.2f}")
+    print(f"Amount Paid: ${data['amounts']['paid']:.2f}")
+    print(f"Amount Due: ${data['amounts']['due']:.2f}")
+    
+    return data
@@ -0,0 +1,121 @@
+from functools import lru_cache
+
+from font_metrics import string_width
+
+# Right edges used to align the quantity and price columns
+PRICE_RIGHT_EDGE = 473 + string_width("Price", "Helvetica-Bold", 10)
+QUANTITY_RIGHT_EDGE = 290 + string_width("Quantity", "Helvetica-Bold", 10)
+
+# Parts of the static layer, in drawing order
+STATIC_SECTIONS = ("header", "table", "amounts", "bottom")
+
+# Draw operations are tuples replayed by draw_ops:
+#   ('text', x, y, text, size, bold), ('rect', x, y, w, h), ('line', x1, y1, x2, y2)
+# with y measured from the top of the page.
+
+@lru_cache(maxsize=None)
+def build_static_layer(company_address, sections=STATIC_SECTIONS):
+    """Build the draw operations for everything that doesn't vary per invoice.
+
+    Built once per process (per company address and set of sections) and
+    replayed into each document, as a form XObject where the backend has
+    them.
+    """
+    ops = []
+
+    if "header" in sections:
+        # Header section - company info
+        ops.append(('text', 50, 65, company_address[0], 12, True))
+        for i, line in enumerate(company_address[1:], 1):
+            ops.append(('text', 50, 65 + (15 * i), line, 10, False))
+
+        # Invoice detail labels (top right)
+        ops.append(('text', 450, 65, "Invoice", 10, True))
+        ops.append(('text', 460, 80, "Date:", 10, True))
+        ops.append(('text', 460, 95, "Time:", 10, True))
+        ops.append(('text', 454, 110, "Bill-To:", 9, True))
+        ops.append(('text', 445, 125, "Location:", 9, True))
+
+    if "table" in sections:
+        # Service table header
+        y = 225
+        ops.append(('rect', 15, y-5, 580, 25))
+        ops.append(('text', 18, y+10, "Service Description", 10, True))
+        ops.append(('text', 290, y+10, "Quantity", 10, True))
+        ops.append(('text', 473, y+10, "Price", 10, True))
+
+    if "amounts" in sections:
+        # Amount labels
+        y = 315
+        ops.append(('line', 365, y-15, 500, y-15))
+        for label in ["SUBTOTAL", "TAX", "AMT PAID", "TOTAL", "AMOUNT DUE"]:
+            ops.append(('text', 366, y, label, 10, True))
+            y += 15
+
+    if "bottom" in sections:
+        # Bottom section labels
+        y = 560
+        ops.append(('text', 19, y, "Bill-To:", 9, False))
+        ops.append(('text', 273, y+15, "PO Number:", 9, False))
+        ops.append(('text', 435, y+15, "Invoice #:", 9, False))
+        ops.append(('text', 295, y+35, "Terms:", 9, False))
+
+        # Bottom company address
+        y = 670
+        for line in company_address:
+            ops.append(('text', 64, y, line, 9, False))
+            y += 10
+
+    return tuple(ops)
+
+def header_field_ops(data):
+    """Return the draw operations for the invoice's fields above the service table."""
+    ops = []
+
+    # Invoice details (top right)
+    ops.append(('text', 445, 40, f"Invoice # {data['invoice_number']}", 12, True))
+
+    # Evenly spaced invoice details
+    detail_y = 65
+    spacing = 15
+    for key, size in [('date', 10), ('day', 10), ('time', 10), ('bill_to', 9), ('location', 9)]:
+        ops.append(('text', 487, detail_y, data[key], size, False))
+        detail_y += spacing
+
+    # Customer Info (both columns)
+    for x in [55, 280]:
+        ops.append(('text', x, 160, data['customer_name'], 9, False))
+        ops.append(('text', x, 170, data['customer_contact'], 9, False))
+        ops.append(('text', x, 180, data['customer_address'], 9, False))
+        ops.append(('text', x, 190, data['customer_city_state'], 9, False))
+    return ops
+
+def bottom_field_ops(data):
+    """Return the draw operations for the invoice's fields in the bottom section."""
+    ops = []
+    y = 560
+    ops.append(('text', 333, y, data['bill_to'], 9, False))
+    ops.append(('text', 478, y+15, data['invoice_number'], 9, False))
+    ops.append(('text', 478, y, data['date'], 9, False))
+
+    y += 35
+    ops.append(('text', 323, y, data['terms'], 9, False))
+
+    # Bottom addresses
+    y = 580
+    for text in [data['customer_name'], data['customer_contact'],
+                data['customer_address'], data['customer_city_state']]:
+        ops.append(('text', 64, y, text, 9, False))
+        y += 10
+    return ops
+
+def draw_ops(ops, draw_text, draw_rect, draw_line):
+    """Replay draw operations through the caller's drawing helpers."""
+    for op in ops:
+        if op[0] == 'text':
+            _, x, y, text, size, bold = op
+            draw_text(x, y, text, size=size, bold=bold)
+        elif op[0] == 'rect':
+            draw_rect(*op[1:])
+        elif op[0] == 'line':
+            draw_line(*op[1:])
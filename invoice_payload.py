@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape, unescape
+
+# Bump when the payload layout changes
+PAYLOAD_VERSION = 1
+PAYLOAD_NAMESPACE = "urn:pdf-edit:invoice:1"
+
+XMP_TEMPLATE = """<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+<rdf:Description rdf:about="" xmlns:inv="{namespace}">
+<inv:version>{version}</inv:version>
+<inv:sha256>{digest}</inv:sha256>
+<inv:payload>{payload}</inv:payload>
+</rdf:Description>
+</rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+PAYLOAD_RE = re.compile(r'<inv:version>(\d+)</inv:version>\s*<inv:sha256>([0-9a-f]{64})</inv:sha256>\s*'
+                        r'<inv:payload>(.*?)</inv:payload>', re.S)
+
+def payload_bytes(data):
+    """Serialize the invoice data dict compactly and deterministically."""
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+def build_xmp(data):
+    """Return the XMP packet carrying the invoice data and its SHA-256."""
+    payload = payload_bytes(data)
+    return XMP_TEMPLATE.format(namespace=PAYLOAD_NAMESPACE, version=PAYLOAD_VERSION,
+                               digest=hashlib.sha256(payload).hexdigest(),
+                               payload=escape(payload.decode())).encode("utf-8")
+
+def embed_payload(c, data):
+    """Attach the invoice data to canvas c's document as its XMP metadata stream."""
+    from reportlab.pdfbase.pdfdoc import PDFDictionary, PDFName, PDFStream
+    stream = PDFStream(PDFDictionary({"Type": PDFName("Metadata"), "Subtype": PDFName("XML")}),
+                       build_xmp(data), filters=[])
+    # XMP is meant to stay readable without decompressing
+    c._doc.Catalog.Metadata = stream
+
+def read_payload(pdf_path):
+    """Return the invoice data embedded in a PDF, or None if it has none.
+
+    Only the catalog's metadata stream is read; no page is parsed. Raises
+    ValueError if the payload fails its checksum.
+    """
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        xmp = doc.get_xml_metadata()
+    match = PAYLOAD_RE.search(xmp or "")
+    if not match:
+        return None
+    version, digest, payload = match.groups()
+    payload = unescape(payload).encode()
+    if int(version) != PAYLOAD_VERSION or hashlib.sha256(payload).hexdigest() != digest:
+        raise ValueError(f"{pdf_path}: embedded invoice payload failed its checksum")
+    return json.loads(payload)
+
+# Helper function for formatting the dollar strings the generator draws
+def _dollars(value):
+    return f"${value:.2f}"
+
+def rendered_amounts(data):
+    """Return the dollar strings create_invoice_pdf draws for this data."""
+    amounts = data.get('amounts') or {}
+    strings = [_dollars(item['price']) for item in data.get('service_items') or ()]
+    strings += [_dollars(amounts[key]) for key in ('subtotal', 'tax', 'paid', 'total', 'due') if key in amounts]
+    return strings
+
+def verify_pdf(pdf_path, expected=None, cross_check=False):
+    """Verify a generated PDF from its embedded payload.
+
+    Checks the payload's checksum and, when given, that it matches the
+    expected data dict. With cross_check=True the rendered text is also
+    extracted to confirm every amount was actually drawn. Returns a dict
+    with 'path', 'status' ('ok', 'missing', 'corrupt' or 'mismatch') and
+    a list of 'problems'.
+    """
+    result = {"path": pdf_path, "status": "ok", "problems": []}
+    try:
+        data = read_payload(pdf_path)
+    except ValueError as e:
+        result["status"] = "corrupt"
+        result["problems"].append(str(e))
+        return result
+    if data is None:
+        result["status"] = "missing"
+        return result
+
+    if expected is not None:
+        expected = json.loads(payload_bytes(expected))
+        for key in sorted(set(expected) | set(data)):
+            if expected.get(key) != data.get(key):
+                result["problems"].append(f"{key}: expected {expected.get(key)!r}, embedded {data.get(key)!r}")
+
+    if cross_check:
+        from document_cache import load_document
+        text = "".join(load_document(pdf_path, parts=("text",))["text"])
+        for amount in rendered_amounts(data):
+            if amount not in text:
+                result["problems"].append(f"{amount} is in the payload but not in the rendered text")
+
+    if result["problems"]:
+        result["status"] = "mismatch"
+    return result
+
+def _verify_job(args):
+    return verify_pdf(*args)
+
+def verify_many(pdf_paths, expected=None, cross_check=False, workers=None):
+    """Verify many PDFs in parallel; expected optionally maps path -> data dict."""
+    jobs = [(path, (expected or {}).get(path), cross_check) for path in pdf_paths]
+    if workers == 1 or len(jobs) <= 1:
+        return [_verify_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_verify_job, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
+
+def print_verify_results(results, show_ok=False):
+    """Print a line per problem PDF and a summary count per status."""
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        if result["status"] != "ok" or show_ok:
+            print(f"{result['path']}: {result['status']}")
+            for problem in result["problems"]:
+                print(f"  {problem}")
+    print(", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+from reportlab import rl_config
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+from font_metrics import DEFAULT_FONTS
+
+# compression    - Flate-compress page and form content streams
+# base85         - ASCII85-wrap the compressed streams (7-bit safe, ~25% larger,
+#                  and slow: reportlab encodes it in pure Python here)
+# object_streams - repack the finished file with object streams and a
+#                  compressed xref table (an extra PyMuPDF pass)
+# embed_fonts    - draw with TrueType fonts, embedded as per-document subsets,
+#                  instead of the unembedded standard Helvetica
+OutputProfile = namedtuple("OutputProfile", ["name", "compression", "base85", "object_streams", "embed_fonts"])
+
+PROFILES = {
+    # What reportlab does out of the box
+    "default": OutputProfile("default", compression=True, base85=True, object_streams=False, embed_fonts=False),
+    # Least CPU per invoice; files are several times larger
+    "fast": OutputProfile("fast", compression=False, base85=False, object_streams=False, embed_fonts=False),
+    # Fewest bytes per invoice, for storage and egress
+    "small": OutputProfile("small", compression=True, base85=False, object_streams=True, embed_fonts=False),
+    # Self-contained: renders the same without the viewer's copy of Helvetica
+    "archival": OutputProfile("archival", compression=True, base85=False, object_streams=False, embed_fonts=True),
+}
+DEFAULT_PROFILE = "default"
+
+# TrueType fonts used when embedding (shipped with reportlab): name -> file
+EMBEDDED_FONTS = (("Vera", "Vera.ttf"), ("VeraBd", "VeraBd.ttf"))
+
+def get_profile(profile=None):
+    """Return the OutputProfile for a name (or pass one through); None is the default."""
+    if isinstance(profile, OutputProfile):
+        return profile
+    try:
+        return PROFILES[profile or DEFAULT_PROFILE]
+    except KeyError:
+        raise ValueError(f"Unknown output profile '{profile}' (choose from {', '.join(PROFILES)})") from None
+
+@lru_cache(maxsize=None)
+def _register_embedded_fonts():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    for name, filename in EMBEDDED_FONTS:
+        pdfmetrics.registerFont(TTFont(name, filename))
+    return tuple(name for name, _ in EMBEDDED_FONTS)
+
+def profile_fonts(profile=None):
+    """Return the (regular, bold) font names to draw with under a profile."""
+    if get_profile(profile).embed_fonts:
+        return _register_embedded_fonts()
+    return DEFAULT_FONTS
+
+def new_canvas(output, profile=None):
+    """Return a letter-size canvas writing to output with the profile's stream compression."""
+    profile = get_profile(profile)
+    # The initial font lands in every page's resources, so keep it one we embed
+    return canvas.Canvas(output, pagesize=letter, pageCompression=int(profile.compression),
+                         initialFontName=profile_fonts(profile)[0])
+
+# reportlab only reads useA85 when it serializes streams, i.e. in save().
+# It is a process-wide setting with no per-document equivalent, so saves
+# hold this lock while they use it: threads saving at once take turns
+# (drawing still runs in parallel). Code that saves a reportlab canvas
+# without going through save_canvas can still see another profile's value.
+_BASE85_LOCK = threading.Lock()
+
+@contextmanager
+def _base85(enabled):
+    with _BASE85_LOCK:
+        saved = rl_config.useA85
+        rl_config.useA85 = int(enabled)
+        try:
+            yield
+        finally:
+            rl_config.useA85 = saved
+
+def pack_object_streams(pdf_bytes):
+    """Rewrite a PDF with object streams, a compressed xref and duplicate objects merged."""
+    import fitz
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.tobytes(garbage=3, deflate=True, use_objstms=1)
+
+def save_canvas(c, output, profile=None):
+    """Save canvas c to output (a path or binary file object) under a profile."""
+    profile = get_profile(profile)
+    with _base85(profile.base85):
+        if not profile.object_streams:
+            c.save()
+            return
+        pdf = c.getpdfdata()
+    pdf = pack_object_streams(pdf)
+    if hasattr(output, "write"):
+        output.write(pdf)
+    else:
+        with open(output, "wb") as f:
+            f.write(pdf)
+
+def save_document(doc, path, profile=None):
+    """Finish a PyMuPDF document that was built up with incremental saves.
+
+    Profiles with object streams get a full rewrite (which also merges the
+    fonts, forms and images repeated across appended parts); the rest just
+    write the last increment.
+    """
+    if not get_profile(profile).object_streams:
+        doc.saveIncr()
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    doc.save(tmp_path, garbage=3, deflate=True, use_objstms=1)
+    os.replace(tmp_path, path)
@@ -0,0 +1,290 @@
+import io
+import os
+import time
+import zipfile
+
+import fitz
+
+import instrumentation
+from output_profiles import get_profile, new_canvas, profile_fonts, save_canvas, save_document
+from pdf_generator import create_invoice_pdf, draw_invoice_page
+from table_flow import fits_single_page, create_statement_pdf
+
+# Invoices drawn on one canvas before it is appended to the output
+DEFAULT_CHUNK_SIZE = 200
+# Invoices between fsyncs of the output file
+DEFAULT_CHECKPOINT_EVERY = 2000
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+def render_merged_parts(invoices, template=True, assets=(), profile=None):
+    """Render invoices for MergedPdfSink.add_rendered.
+
+    Returns a list of (pdf bytes, [(invoice number, pages), ...]): each run
+    of single-page invoices shares one canvas, and each statement is a part
+    of its own. profile is the sink's chunk profile.
+    """
+    profile = get_profile(profile)
+    fonts = profile_fonts(profile)
+    parts = []
+    buffer = canvas = None
+    entries = []
+    for data in invoices:
+        if fits_single_page(data['service_items'], fonts[0]):
+            if canvas is None:
+                buffer = io.BytesIO()
+                canvas = new_canvas(buffer, profile)
+            draw_invoice_page(canvas, data, template=template, assets=assets, fonts=fonts)
+            canvas.showPage()
+            entries.append((data.get('invoice_number'), 1))
+            continue
+        if canvas is not None:
+            save_canvas(canvas, buffer, profile)
+            parts.append((buffer.getvalue(), entries))
+            buffer = canvas = None
+            entries = []
+        statement = io.BytesIO()
+        pages = create_statement_pdf(statement, data, verbose=False, assets=assets, payload=False, profile=profile)
+        parts.append((statement.getvalue(), [(data.get('invoice_number'), pages)]))
+    if canvas is not None:
+        save_canvas(canvas, buffer, profile)
+        parts.append((buffer.getvalue(), entries))
+    return parts
+
+# Helper function for rendering one invoice as a standalone PDF
+def _render_pdf(data, template, assets, payload, profile):
+    buffer = io.BytesIO()
+    create_invoice_pdf(buffer, data, verbose=False, template=template,
+                       assets=assets, payload=payload, profile=profile)
+    return buffer.getvalue()
+
+def render_zip_entries(invoices, template=False, assets=(), payload=True, profile=None):
+    """Render each invoice to its own PDF for ZipSink.add_rendered; return [(pdf bytes, invoice number), ...]."""
+    return [(_render_pdf(data, template, assets, payload, profile), data.get('invoice_number'))
+            for data in invoices]
+
+class MergedPdfSink:
+    """Streams many invoices into one multi-page PDF, bookmarked by invoice number.
+
+    Single-page invoices are drawn onto a shared canvas in chunks, so the
+    static layer and branding images are embedded once per chunk rather
+    than once per invoice. Each full chunk is appended to the output as an
+    incremental update, which keeps memory bounded by the chunk size; the
+    file is fsynced only every checkpoint_every invoices and on close.
+    The per-document XMP payload is not written in merged output, so
+    `pdf-edit verify` has nothing to check it against. With an
+    object-stream profile ("small") the whole file is repacked on close.
+    add() renders in this process; for a pool, render with render_job()
+    in the workers and append the results here with add_rendered().
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE, checkpoint_every=DEFAULT_CHECKPOINT_EVERY,
+                 template=True, assets=(), profile=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.checkpoint_every = checkpoint_every
+        self.template = template
+        self.assets = assets
+        self.profile = get_profile(profile)
+        # Chunks are repacked (if at all) with the finished file, not one by one
+        self.chunk_profile = self.profile._replace(object_streams=False)
+        self.fonts = profile_fonts(self.profile)
+        self.doc = None
+        self.toc = []
+        self.pages = 0
+        self.invoices = 0
+        self.since_checkpoint = 0
+        self._buffer = None
+        self._canvas = None
+        self._chunk_invoices = 0
+        if os.path.exists(path):
+            os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _append_pdf(self, pdf_bytes):
+        """Append a rendered PDF to the output file as an incremental update."""
+        if self.doc is None:
+            # The first chunk becomes the file; later chunks are appended to it
+            with open(self.path, "wb") as f:
+                f.write(pdf_bytes)
+            self.doc = fitz.open(self.path)
+        else:
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as part:
+                self.doc.insert_pdf(part)
+            with instrumentation.timer("sink.append"):
+                self.doc.saveIncr()
+
+    def _flush_chunk(self):
+        if self._canvas is None:
+            return
+        save_canvas(self._canvas, self._buffer, self.chunk_profile)
+        self._append_pdf(self._buffer.getvalue())
+        self._buffer = self._canvas = None
+        self._chunk_invoices = 0
+
+    def _checkpoint(self, force=False):
+        if force or self.since_checkpoint >= self.checkpoint_every:
+            if self.doc is not None:
+                with open(self.path, "rb+") as f, instrumentation.timer("sink.fsync"):
+                    os.fsync(f.fileno())
+            self.since_checkpoint = 0
+
+    # Helper function for the bookkeeping once an invoice's pages are in
+    def _added(self, invoice_number, pages):
+        first_page = self.pages + 1
+        self.pages += pages
+        self.toc.append([1, f"Invoice {invoice_number or self.invoices + 1}", first_page])
+        self.invoices += 1
+        self.since_checkpoint += 1
+        instrumentation.count("sink_invoices")
+        self._checkpoint()
+        return first_page
+
+    def add(self, data):
+        """Append one invoice and return its first page number (1-based)."""
+        if fits_single_page(data['service_items'], self.fonts[0]):
+            if self._canvas is None:
+                self._buffer = io.BytesIO()
+                self._canvas = new_canvas(self._buffer, self.chunk_profile)
+            draw_invoice_page(self._canvas, data, template=self.template, assets=self.assets, fonts=self.fonts)
+            self._canvas.showPage()
+            self._chunk_invoices += 1
+            first_page = self._added(data.get('invoice_number'), 1)
+            if self._chunk_invoices >= self.chunk_size:
+                self._flush_chunk()
+            return first_page
+        # Statements keep their own canvas; keep page order by flushing first
+        self._flush_chunk()
+        buffer = io.BytesIO()
+        pages = create_statement_pdf(buffer, data, verbose=False, assets=self.assets, payload=False,
+                                     profile=self.chunk_profile)
+        self._append_pdf(buffer.getvalue())
+        return self._added(data.get('invoice_number'), pages)
+
+    def render_job(self):
+        """Return (function, options, chunk size) for rendering invoices in other processes.
+
+        function(invoices, **options) returns parts for add_rendered; call
+        it with at most chunk size invoices at a time.
+        """
+        options = {"template": self.template, "assets": self.assets, "profile": self.chunk_profile}
+        return render_merged_parts, options, self.chunk_size
+
+    def add_rendered(self, parts):
+        """Append invoices rendered by render_merged_parts; return their first page numbers."""
+        self._flush_chunk()
+        first_pages = []
+        for pdf_bytes, entries in parts:
+            self._append_pdf(pdf_bytes)
+            for invoice_number, pages in entries:
+                first_pages.append(self._added(invoice_number, pages))
+        return first_pages
+
+    def close(self):
+        """Write the last chunk and the bookmarks, then fsync."""
+        if self.invoices == 0 and self.doc is None:
+            return
+        self._flush_chunk()
+        if self.doc is not None:
+            self.doc.set_toc(self.toc)
+            save_document(self.doc, self.path, self.profile)
+            self.doc.close()
+            self.doc = None
+            self._checkpoint(force=True)
+
+class ZipSink:
+    """Streams invoices into a ZIP archive, one PDF per entry.
+
+    Each invoice is rendered in memory and written straight into the
+    archive, so only the current invoice and the archive's directory are
+    held in memory. PDFs are already compressed, so entries are stored
+    unless compress=True. The file is fsynced every checkpoint_every
+    invoices and on close. profile is the output profile for each PDF.
+    """
+
+    def __init__(self, path, checkpoint_every=DEFAULT_CHECKPOINT_EVERY, compress=False,
+                 template=False, assets=(), payload=True, profile=None):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.template = template
+        self.assets = assets
+        self.payload = payload
+        self.profile = get_profile(profile)
+        self.file = open(path, "wb")
+        self.zip = zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED)
+        self.names = set()
+        self.invoices = 0
+        self.since_checkpoint = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, name, pdf_bytes):
+        # Keep entry names unique
+        stem, ext = os.path.splitext(name)
+        suffix = 1
+        while name in self.names:
+            suffix += 1
+            name = f"{stem}_{suffix}{ext}"
+        self.names.add(name)
+
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = self.zip.compression
+        self.zip.writestr(info, pdf_bytes)
+
+        self.invoices += 1
+        self.since_checkpoint += 1
+        instrumentation.count("sink_invoices")
+        if self.since_checkpoint >= self.checkpoint_every:
+            with instrumentation.timer("sink.fsync"):
+                _fsync(self.file)
+            self.since_checkpoint = 0
+        return name
+
+    def add(self, data, name=None):
+        """Append one invoice and return its entry name."""
+        if name is None:
+            name = f"{data.get('invoice_number') or self.invoices + 1}.pdf"
+        pdf_bytes = _render_pdf(data, self.template, self.assets, self.payload, self.profile)
+        return self._write(name, pdf_bytes)
+
+    def render_job(self):
+        """Return (function, options, chunk size) for rendering invoices in other processes.
+
+        function(invoices, **options) returns parts for add_rendered.
+        """
+        options = {"template": self.template, "assets": self.assets, "payload": self.payload,
+                   "profile": self.profile}
+        return render_zip_entries, options, DEFAULT_CHUNK_SIZE
+
+    def add_rendered(self, parts):
+        """Append invoices rendered by render_zip_entries; return their entry names."""
+        return [self._write(f"{invoice_number or self.invoices + 1}.pdf", pdf_bytes)
+                for pdf_bytes, invoice_number in parts]
+
+    def close(self):
+        """Write the central directory and fsync."""
+        if self.zip is None:
+            return
+        self.zip.close()
+        _fsync(self.file)
+        self.file.close()
+        self.zip = None
+
+def open_sink(path, **options):
+    """Return a sink for path: a merged PDF for .pdf, a ZIP archive for .zip."""
+    if path.lower().endswith(".zip"):
+        return ZipSink(path, **options)
+    if path.lower().endswith(".pdf"):
+        return MergedPdfSink(path, **options)
+    raise ValueError(f"Don't know how to write invoices to {path} (use .pdf or .zip)")
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+DEFAULT_INDEX_PATH = os.path.join(os.environ.get("PDF_EDIT_CACHE_DIR", ".cache"), "fingerprints.sqlite")
+
+# Bump when the content, text or perceptual hash changes, so old rows are recomputed
+FINGERPRINT_VERSION = 2
+
+# The perceptual hash is a difference hash of a HASH_SIZE x HASH_SIZE
+# grayscale thumbnail, rendered at PHASH_ZOOM: HASH_SIZE**2 bits
+HASH_SIZE = 32
+PHASH_ZOOM = 0.5
+# Near-duplicate lookup splits the hash into BANDS exact-match buckets (one
+# thumbnail row each); two hashes within BANDS - 1 bits share a bucket
+BANDS = HASH_SIZE
+BAND_BITS = HASH_SIZE * HASH_SIZE // BANDS
+# The thumbnail is too coarse to see text: on the invoice corpus, pages of
+# different invoices from one template are 0-14 bits apart. Near
+# duplicates therefore also need the same page text (see near_duplicates),
+# and the distance only allows for rendering noise: a re-render with the
+# same fonts is 0 bits off, while adding the branding images moves it ~20
+# and switching to embedded fonts ~55.
+DEFAULT_MAX_DISTANCE = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, page_count INTEGER, version INTEGER);
+CREATE TABLE IF NOT EXISTS pages (
+    path TEXT, page INTEGER, content_hash TEXT, phash BLOB, text_hash TEXT, PRIMARY KEY (path, page));
+CREATE INDEX IF NOT EXISTS pages_by_content ON pages (content_hash);
+CREATE TABLE IF NOT EXISTS bands (band INTEGER, value INTEGER, path TEXT, page INTEGER);
+CREATE INDEX IF NOT EXISTS bands_by_value ON bands (band, value);
+CREATE INDEX IF NOT EXISTS bands_by_page ON bands (path, page);
+CREATE TABLE IF NOT EXISTS renders (
+    output_path TEXT PRIMARY KEY, content_hash TEXT, zoom REAL);
+CREATE TABLE IF NOT EXISTS diffs (
+    hash_a TEXT, hash_b TEXT, params TEXT, result TEXT, PRIMARY KEY (hash_a, hash_b, params));
+"""
+
+def page_content_hash(doc, page):
+    """Hash everything a page's rendering depends on, without rendering it.
+
+    Covers the content streams, the page dictionary, and the dictionaries
+    and raw streams of the images and form XObjects it uses; fonts are
+    covered by their dictionaries (font programs are assumed immutable).
+    """
+    digest = hashlib.sha256()
+    digest.update(doc.xref_object(page.xref, compressed=True).encode())
+    for xref in page.get_contents():
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    xrefs = {img[0] for img in page.get_images(full=True)} | {xobj[0] for xobj in page.get_xobjects()}
+    for xref in sorted(xrefs):
+        digest.update(doc.xref_object(xref, compressed=True).encode())
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    for font in page.get_fonts(full=True):
+        digest.update(doc.xref_object(font[0], compressed=True).encode())
+    return digest.hexdigest()
+
+def page_text_hash(page):
+    """Hash a page's extracted text, with runs of whitespace collapsed."""
+    return hashlib.sha256(" ".join(page.get_text().split()).encode()).hexdigest()
+
+@instrumentation.timed("fingerprint.phash")
+def perceptual_hash(page, zoom=PHASH_ZOOM, hash_size=HASH_SIZE):
+    """Return the difference hash of a low-resolution render of a page as an int.
+
+    Each bit says whether a thumbnail pixel is brighter than its right-hand
+    neighbour, so the hash survives small shifts, antialiasing and
+    re-encoding, but moves when the layout or text changes.
+    """
+    import fitz
+    import numpy as np
+    from PIL import Image
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    thumb = np.asarray(Image.fromarray(samples).resize((hash_size + 1, hash_size), Image.BOX), dtype=np.int16)
+    bits = np.packbits(thumb[:, 1:] > thumb[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+def hash_bands(phash):
+    """Split a hash into BANDS integers of BAND_BITS each, first row first."""
+    mask = (1 << BAND_BITS) - 1
+    total = BANDS * BAND_BITS
+    return [(phash >> (total - BAND_BITS * (i + 1))) & mask for i in range(BANDS)]
+
+def _file_stat(pdf_path):
+    stat = os.stat(pdf_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def fingerprint_pdf(pdf_path, known=None):
+    """Return [(page, content_hash, phash, text_hash)] for every page of a PDF.
+
+    known maps page -> (content_hash, phash, text_hash) from a previous run;
+    pages whose content hash still matches reuse the stored hashes unrendered.
+    """
+    import fitz
+    known = known or {}
+    fingerprints = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            digest = page_content_hash(doc, page)
+            previous = known.get(page.number)
+            if previous and previous[0] == digest:
+                fingerprints.append((page.number, *previous))
+            else:
+                instrumentation.count("fingerprint_renders")
+                fingerprints.append((page.number, digest, perceptual_hash(page), page_text_hash(page)))
+    return fingerprints
+
+def _fingerprint_job(args):
+    pdf_path, known = args
+    try:
+        return pdf_path, _file_stat(pdf_path), fingerprint_pdf(pdf_path, known), None
+    except Exception as e:
+        return pdf_path, None, None, f"{type(e).__name__}: {e}"
+
+class FingerprintIndex:
+    """Per-page content and perceptual hashes of a PDF corpus, kept in SQLite.
+
+    update() re-fingerprints only files whose size or mtime moved and
+    re-renders only pages whose content hash moved. near_duplicates() finds
+    pages with the same text within a Hamming distance. With
+    same_text=False it finds visually similar pages (e.g. one template)
+    through indexed band lookups rather than a scan: a page is a candidate
+    only if it shares a band (a thumbnail row) exactly, and blank bands are
+    not indexed, so a match is guaranteed only while max_distance < the
+    number of non-blank bands.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        # Indexes written before pages had a text hash get the column added
+        # (their rows are recomputed, being an older FINGERPRINT_VERSION)
+        if "text_hash" not in {row[1] for row in self.db.execute("PRAGMA table_info(pages)")}:
+            self.db.execute("ALTER TABLE pages ADD COLUMN text_hash TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_by_text ON pages (text_hash)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def _is_current(self, pdf_path):
+        row = self.db.execute("SELECT size, mtime_ns, version FROM files WHERE path = ?", (pdf_path,)).fetchone()
+        return row is not None and tuple(row) == (*_file_stat(pdf_path), FINGERPRINT_VERSION)
+
+    def _known(self, pdf_path):
+        # Hashes stored by an older FINGERPRINT_VERSION are recomputed
+        rows = self.db.execute("SELECT page, content_hash, phash, text_hash FROM pages JOIN files USING (path) "
+                               "WHERE path = ? AND version = ?", (pdf_path, FINGERPRINT_VERSION))
+        return {page: (digest, int.from_bytes(phash, "big"), text_hash) for page, digest, phash, text_hash in rows}
+
+    def _store(self, pdf_path, stat, fingerprints, known):
+        """Write one file's fingerprints; return the page numbers that changed."""
+        changed = []
+        for page, digest, phash, text_hash in fingerprints:
+            if known.get(page) == (digest, phash, text_hash):
+                continue
+            changed.append(page)
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                            (pdf_path, page, digest, phash.to_bytes(BANDS * BAND_BITS // 8, "big"), text_hash))
+            self.db.execute("DELETE FROM bands WHERE path = ? AND page = ?", (pdf_path, page))
+            self.db.executemany("INSERT INTO bands VALUES (?, ?, ?, ?)",
+                                [(band, value, pdf_path, page)
+                                 for band, value in enumerate(hash_bands(phash)) if value])
+        # Pages past the new end of the file are gone
+        self.db.execute("DELETE FROM pages WHERE path = ? AND page >= ?", (pdf_path, len(fingerprints)))
+        self.db.execute("DELETE FROM bands WHERE path = ? AND page >= ?", (pdf_path, len(fingerprints)))
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                        (pdf_path, *stat, len(fingerprints), FINGERPRINT_VERSION))
+        return changed
+
+    def update(self, pdf_paths, workers=None):
+        """Fingerprint new or modified PDFs.
+
+        Returns {path: [changed page numbers]} for every file that was
+        re-read (an unchanged file re-read after a touch maps to []).
+        """
+        jobs = []
+        for pdf_path in pdf_paths:
+            if not self._is_current(pdf_path):
+                jobs.append((pdf_path, self._known(pdf_path)))
+        if workers == 1 or len(jobs) <= 1:
+            outcomes = [_fingerprint_job(job) for job in jobs]
+        else:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(_fingerprint_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+        changes = {}
+        for (pdf_path, known), (_, stat, fingerprints, error) in zip(jobs, outcomes):
+            if error:
+                print(f"Failed {pdf_path}: {error}")
+                continue
+            changes[pdf_path] = self._store(pdf_path, stat, fingerprints, known)
+        self.db.commit()
+        return changes
+
+    def page_hashes(self, pdf_path):
+        """Return the content hash of each page of a PDF, fingerprinting it if needed."""
+        self.update([pdf_path], workers=1)
+        rows = self.db.execute("SELECT content_hash FROM pages WHERE path = ? ORDER BY page", (pdf_path,))
+        return [digest for digest, in rows]
+
+    def exact_duplicates(self, pdf_path, page=0):
+        """Return (path, page) of every other page with the same content hash."""
+        row = self.db.execute("SELECT content_hash FROM pages WHERE path = ? AND page = ?",
+                              (pdf_path, page)).fetchone()
+        if row is None:
+            return []
+        rows = self.db.execute("SELECT path, page FROM pages WHERE content_hash = ? AND NOT (path = ? AND page = ?)",
+                               (row[0], pdf_path, page))
+        return [tuple(r) for r in rows]
+
+    def near_duplicates(self, pdf_path, page=0, max_distance=DEFAULT_MAX_DISTANCE, same_text=True):
+        """Return [(path, page, distance)] of pages whose phash is within max_distance, nearest first.
+
+        With same_text (the default) only pages with the same text count;
+        otherwise pages of one template with different data match too.
+        """
+        row = self.db.execute("SELECT phash, text_hash FROM pages WHERE path = ? AND page = ?",
+                              (pdf_path, page)).fetchone()
+        if row is None:
+            return []
+        return self._near(int.from_bytes(row[0], "big"), max_distance, exclude=(pdf_path, page),
+                          text_hash=row[1] if same_text else None)
+
+    def _near(self, phash, max_distance, exclude=None, text_hash=None):
+        if text_hash is not None:
+            rows = self.db.execute("SELECT path, page, phash FROM pages WHERE text_hash = ?", (text_hash,)).fetchall()
+        else:
+            keys = [(band, value) for band, value in enumerate(hash_bands(phash)) if value]
+            if not keys:
+                return []
+            rows = self.db.execute(
+                "SELECT DISTINCT path, page, phash FROM bands JOIN pages USING (path, page) "
+                f"WHERE (band, value) IN (VALUES {', '.join(['(?, ?)'] * len(keys))})",
+                [v for key in keys for v in key]).fetchall()
+        instrumentation.count("fingerprint_candidates", len(rows))
+
+        matches = []
+        for path, page, stored in rows:
+            distance = hamming(phash, int.from_bytes(stored, "big"))
+            if distance <= max_distance and (path, page) != exclude:
+                matches.append((path, page, distance))
+        return sorted(matches, key=lambda m: (m[2], m[0], m[1]))
+
+    def duplicate_groups(self, max_distance=DEFAULT_MAX_DISTANCE, same_text=True):
+        """Group every indexed page with its near duplicates (see near_duplicates).
+
+        Returns a list of groups (lists of (path, page)) with more than one
+        member; grouping is transitive.
+        """
+        parent = {}
+
+        def find(key):
+            while parent.setdefault(key, key) != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        rows = self.db.execute("SELECT path, page, phash, text_hash FROM pages").fetchall()
+        for path, page, phash, text_hash in rows:
+            for other_path, other_page, _ in self._near(int.from_bytes(phash, "big"), max_distance,
+                                                        exclude=(path, page),
+                                                        text_hash=text_hash if same_text else None):
+                parent[find((path, page))] = find((other_path, other_page))
+
+        groups = {}
+        for key in parent:
+            groups.setdefault(find(key), []).append(key)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+
+    def render_is_current(self, output_path, content_hash, zoom):
+        """Check whether output_path is a render of a page with this content hash."""
+        row = self.db.execute("SELECT content_hash, zoom FROM renders WHERE output_path = ?",
+                              (output_path,)).fetchone()
+        return row is not None and tuple(row) == (content_hash, zoom) and os.path.exists(output_path)
+
+    def record_render(self, output_path, content_hash, zoom):
+        self.db.execute("INSERT OR REPLACE INTO renders VALUES (?, ?, ?)", (output_path, content_hash, zoom))
+        self.db.commit()
+
+    def cached_diff(self, hash_a, hash_b, params):
+        """Return the stored diff result for two page hashes, or None."""
+        row = self.db.execute("SELECT result FROM diffs WHERE hash_a = ? AND hash_b = ? AND params = ?",
+                              (hash_a, hash_b, params)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store_diff(self, hash_a, hash_b, params, result):
+        self.db.execute("INSERT OR REPLACE INTO diffs VALUES (?, ?, ?, ?)",
+                        (hash_a, hash_b, params, json.dumps(result)))
+
+def print_duplicate_groups(groups):
+    """Print each group of near-duplicate pages."""
+    for i, members in enumerate(groups, 1):
+        print(f"Group {i} ({len(members)} pages):")
+        for path, page in members:
+            print(f"  {path} page {page + 1}")
+    print(f"{len(groups)} group(s) of near-duplicate pages")
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from batch_generate import collect_sources
+
+    parser = argparse.ArgumentParser(description="Fingerprint a PDF corpus and report near-duplicate pages.")
+    parser.add_argument("sources", nargs="+", help="PDFs, directories or globs")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="SQLite index file")
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help=f"Hamming distance (of {BANDS * BAND_BITS} bits) that counts as a near duplicate")
+    parser.add_argument("--any-text", action="store_true",
+                        help="Group visually similar pages even when their text differs (e.g. by template)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    args = parser.parse_args()
+
+    pdf_paths = [path for source in args.sources for path in collect_sources(source)]
+    with FingerprintIndex(args.index) as index:
+        start = time.perf_counter()
+        changes = index.update(pdf_paths, args.workers)
+        updated = time.perf_counter()
+        changed_pages = sum(len(pages) for pages in changes.values())
+        print(f"Fingerprinted {len(changes)} of {len(pdf_paths)} PDFs ({changed_pages} changed pages) "
+              f"in {updated - start:.2f}s")
+        print_duplicate_groups(index.duplicate_groups(args.max_distance, same_text=not args.any_text))
+        print(f"Grouped in {time.perf_counter() - updated:.2f}s")
@@ -1,9 +1,27 @@
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
 from PyPDF2 import PdfReader
-import re
-from decimal import Decimal
+import os
+import shutil
+import fitz
+from content_stream import load_page_fonts, text_segments, encode_hex
+from correction_rules import compile_rules
+import instrumentation
+
+# Corrections applied by default: (find, replace, position check on x, y).
+# Larger campaigns load a rule file instead (see correction_rules.load_rules)
+CORRECTIONS = [
+    ('$217.75', '$200.00', None),
+    # Only the tax amount; the TOTAL and AMOUNT DUE $0.00 values sit below y=500
+    ('$0.00', '$35.50', lambda x, y: y > 500),
+]
+
+# The same corrections for create_corrected_pdf, whose positions come from
+# PyPDF2's text matrix, where the tax amount is the $0.00 below y=500
+REDRAW_CORRECTIONS = [
+    ('$217.75', '$200.00', None),
+    ('$0.00', '$35.50', lambda x, y: y < 500),
+]
 
 def extract_positions(pdf_path):
     """Extract positions of text elements from the PDF."""
@@ -26,8 +44,10 @@ def extract_positions(pdf_path):
     page.extract_text(visitor_text=visitor_body)
     return positions
 
-def create_corrected_pdf(input_path: str, output_path: str):
+def create_corrected_pdf(input_path: str, output_path: str, verbose=True, rules=REDRAW_CORRECTIONS):
     """Create a new PDF with corrected values."""
+    rule_set = compile_rules(rules)
+    
     # Get positions from original PDF
     positions = extract_positions(input_path)
     
@@ -38,25 +58,150 @@ def create_corrected_pdf(input_path: str, output_path: str):
     c.setFont("Helvetica", 12)
     
     # Print positions for debugging
-    print("\nFound text elements:")
+    if verbose:
+        print("\nFound text elements:")
     for pos in positions:
-        print(f"Text: {pos['text']}, Position: ({pos['x']:.2f}, {pos['y']:.2f})")
+        if verbose:
+            print(f"Text: {pos['text']}, Position: ({pos['x']:.2f}, {pos['y']:.2f})")
         
-        # Replace values
-        text = pos['text']
-        if text == '$217.75':
-            text = '$200.00'
-        elif text == '$0.00' and pos['y'] < 500:  # Only replace the tax amount
-            text = '$35.50'
-        
-        # Draw text at the same position
+        # Replace whole values, then draw the text at the same position
+        text = rule_set.apply(pos['text'], pos['x'], pos['y'], whole=True)
         c.drawString(pos['x'], pos['y'], text)
     
     # Save the PDF
     c.save()
-    print(f"\nCreated new PDF with corrected values at {output_path}")
+    if verbose:
+        print(f"\nCreated new PDF with corrected values at {output_path}")
+
+def plan_run_edits(run, rules, report):
+    """Find rule matches in one text run and return the segment edits.
+    
+    rules is a correction_rules.RuleSet (or anything compile_rules takes);
+    all literal rules are matched in one pass over the run's text. Returns
+    a list of (segment index, first code, end code, new codes); the
+    replacement is encoded in the font of the segment where the match starts.
+    """
+    rules = compile_rules(rules)
+    # Map every character of the run back to (segment, code) it came from
+    text = []
+    char_codes = []
+    for seg_index, segment in enumerate(run):
+        for code_index, code_text in enumerate(segment['text']):
+            for char in code_text:
+                text.append(char)
+                char_codes.append((seg_index, code_index))
+    text = ''.join(text)
+    
+    edits = []
+    taken = [False] * len(text)
+    for rule_index, start, end, replace in rules.matches(text):
+        if any(taken[start:end]):
+            continue
+        seg_first, code_first = char_codes[start]
+        seg_last, code_last = char_codes[end - 1]
+        x, y = run[seg_first]['origin']
+        if not rules.allows(rule_index, x, y):
+            continue
+        rule = rules.rules[rule_index]
+        result = {'rule': rule.id, 'find': text[start:end], 'replace': replace, 'x': x, 'y': y}
+        
+        # A match must start and end on whole character codes
+        if ((start > 0 and char_codes[start - 1] == char_codes[start]) or
+                (end < len(text) and char_codes[end] == char_codes[end - 1])):
+            result['status'] = 'split glyph'
+            report.append(result)
+            continue
+        
+        new_raw = run[seg_first]['font'].encode(replace)
+        if new_raw is None:
+            # The embedded (subset) font has no glyph for some character
+            result['status'] = 'missing glyph'
+            report.append(result)
+            continue
+        
+        new_codes = run[seg_first]['font'].split(new_raw)
+        if seg_first == seg_last:
+            edits.append((seg_first, code_first, code_last + 1, new_codes))
+        else:
+            edits.append((seg_first, code_first, len(run[seg_first]['codes']), new_codes))
+            for seg_index in range(seg_first + 1, seg_last):
+                edits.append((seg_index, 0, len(run[seg_index]['codes']), []))
+            edits.append((seg_last, 0, code_last + 1, []))
+        for i in range(start, end):
+            taken[i] = True
+        result['status'] = 'replaced'
+        report.append(result)
+    return edits
+
+@instrumentation.timed("edit")
+def edit_pdf_in_place(input_path: str, output_path: str = None, rules=CORRECTIONS,
+                      incremental=True, verbose=True):
+    """Rewrite matching text in the page content streams.
+    
+    Everything else on the page (images, tables, labels) is left untouched.
+    With incremental=True only the changed streams are appended to the file
+    as a PDF incremental update; otherwise the whole file is rewritten.
+    rules may be a rule list or a compiled correction_rules.RuleSet.
+    """
+    rules = compile_rules(rules)
+    if incremental and output_path and output_path != input_path:
+        shutil.copyfile(input_path, output_path)
+        doc = fitz.open(output_path)
+    else:
+        doc = fitz.open(input_path)
+    
+    report = []
+    for page in doc:
+        fonts = load_page_fonts(doc, page)
+        xrefs = page.get_contents()
+        streams = [doc.xref_stream(xref) for xref in xrefs]
+        
+        # Collect the byte-span rewrites for each content stream
+        stream_edits = {}
+        for run in text_segments(streams, fonts):
+            edits = plan_run_edits(run, rules, report)
+            # Apply edits right to left within each segment
+            segment_codes = {}
+            for seg_index, first, end, new_codes in sorted(edits, key=lambda e: (e[0], -e[1])):
+                codes = segment_codes.setdefault(seg_index, list(run[seg_index]['codes']))
+                codes[first:end] = new_codes
+            for seg_index, codes in segment_codes.items():
+                segment = run[seg_index]
+                stream_edits.setdefault(segment['stream'], []).append(
+                    (segment['start'], segment['end'], encode_hex(b''.join(codes))))
+        
+        for stream_index, edits in stream_edits.items():
+            data = streams[stream_index]
+            for start, end, new_bytes in sorted(edits, reverse=True):
+                data = data[:start] + new_bytes + data[end:]
+            doc.update_stream(xrefs[stream_index], data)
+    
+    changed = any(r['status'] == 'replaced' for r in report)
+    instrumentation.count("edits_replaced", sum(r['status'] == 'replaced' for r in report))
+    with instrumentation.timer("edit.save"):
+        if incremental:
+            if changed:
+                doc.saveIncr()
+            doc.close()
+        elif output_path and output_path != input_path:
+            doc.save(output_path, garbage=3, deflate=True)
+            doc.close()
+        else:
+            # PyMuPDF only saves over the open file incrementally, so
+            # rewrite to a temporary file and move it into place
+            tmp_path = f"{input_path}.{os.getpid()}.tmp"
+            doc.save(tmp_path, garbage=3, deflate=True)
+            doc.close()
+            os.replace(tmp_path, input_path)
+    
+    if verbose:
+        print("\nEdits:")
+        for r in report:
+            print(f"{r['find']} -> {r['replace']} at ({r['x']:.2f}, {r['y']:.2f}): {r['status']}")
+        print(f"\nSaved corrected PDF at {output_path or input_path}")
+    return report
 
 if __name__ == "__main__":
     input_pdf = "pdfs/incorrect.pdf"
     output_pdf = "pdfs/corrected.pdf"
-    create_corrected_pdf(input_pdf, output_pdf) 
\ No newline at end of file
+    edit_pdf_in_place(input_pdf, output_pdf) 
\ No newline at end of file
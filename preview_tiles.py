@@ -0,0 +1,294 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+
+DEFAULT_TILE_DIR = os.path.join(os.environ.get("PDF_EDIT_CACHE_DIR", ".cache"), "tiles")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Past max_bytes, evict down to this fraction of it
+EVICT_TO = 0.9
+
+# Tiles are TILE_SIZE pixels square (smaller along the page's right and bottom edges)
+TILE_SIZE = 256
+# Zoom factor of each level; at level 0 a letter page fits in a single tile
+ZOOM_LEVELS = (0.25, 0.5, 1, 2, 4)
+THUMBNAIL_WIDTH = 200
+
+# Documents each render thread keeps open
+OPEN_DOCUMENTS = 16
+
+class TileCache:
+    """Directory of PNG tiles, evicted least recently used first to stay under max_bytes.
+
+    Recency is kept in memory and mirrored in the files' mtimes, so it
+    survives a restart. Several processes may share a directory: when a
+    process's own count goes past max_bytes it re-scans the directory,
+    which picks up the other processes' tiles and use, then evicts the
+    oldest down to EVICT_TO of the limit. Between scans each process only
+    counts its own writes, so the directory can overshoot by about
+    (1 - EVICT_TO) * max_bytes per process. A tile another process
+    evicted is just a miss.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_TILE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Tile name -> size in bytes, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        with self.lock:
+            self._scan()
+            self._evict()
+
+    # Helper function for reloading the index from the directory, oldest
+    # first by mtime; called with the lock held
+    def _scan(self):
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".png"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(found))
+        self.total_bytes = sum(self.entries.values())
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, name):
+        """Return the path of a cached tile (marking it used), or None."""
+        with self.lock:
+            if name not in self.entries:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(name)
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.total_bytes -= self.entries.pop(name, 0)
+                self.stats["misses"] += 1
+            return None
+        with self.lock:
+            self.stats["hits"] += 1
+        return path
+
+    def put(self, name, data):
+        """Store a tile and return its path, evicting old tiles past max_bytes."""
+        path = self.path(name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            if self.total_bytes > self.max_bytes:
+                self._scan()
+                self._evict()
+        return path
+
+    # Helper function for dropping the oldest tiles once over max_bytes;
+    # called with the lock held
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        while self.total_bytes > self.max_bytes * EVICT_TO and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+def tile_rect(col, row, zoom, tile_size=TILE_SIZE, origin=(0, 0)):
+    """Return the page area (x0, y0, x1, y1) in points that a tile covers.
+
+    origin is the page rectangle's top-left corner, where tile (0, 0) starts.
+    """
+    step = tile_size / zoom
+    x, y = origin
+    return (x + col * step, y + row * step, x + (col + 1) * step, y + (row + 1) * step)
+
+class PreviewService:
+    """Renders page thumbnails and tiles on demand, through a disk TileCache.
+
+    Tiles are keyed by the page's content hash (see page_fingerprints), so
+    an edited page gets new tiles while an unchanged page, in this file or
+    a copy of it, reuses its old ones. Rendering runs in a thread pool;
+    PyMuPDF documents aren't safe to share between threads, so each thread
+    keeps its own open documents (and their page hashes) and no tile
+    request opens the file again while it is unchanged.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_TILE_DIR, max_bytes=DEFAULT_MAX_BYTES, workers=None,
+                 tile_size=TILE_SIZE, zoom_levels=ZOOM_LEVELS):
+        self.cache = TileCache(cache_dir, max_bytes)
+        self.tile_size = tile_size
+        self.zoom_levels = tuple(zoom_levels)
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self._local = threading.local()
+        # Every thread's open documents, so close() can reach them
+        self._all_documents = []
+        self._documents_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Stop the render threads and close every document they opened."""
+        self.pool.shutdown()
+        with self._documents_lock:
+            for documents in self._all_documents:
+                for _, doc, _ in documents.values():
+                    doc.close()
+                documents.clear()
+
+    def _document(self, pdf_path):
+        """Return this thread's (doc, page hashes) for a PDF, reopening it only if the file changed."""
+        import fitz
+        documents = getattr(self._local, "documents", None)
+        if documents is None:
+            documents = self._local.documents = OrderedDict()
+            with self._documents_lock:
+                self._all_documents.append(documents)
+        stat = os.stat(pdf_path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        entry = documents.get(pdf_path)
+        if entry is not None and entry[0] == stamp:
+            documents.move_to_end(pdf_path)
+            return entry[1], entry[2]
+        if entry is not None:
+            entry[1].close()
+        doc = fitz.open(pdf_path)
+        instrumentation.count("preview_documents_opened")
+        documents[pdf_path] = (stamp, doc, {})
+        if len(documents) > OPEN_DOCUMENTS:
+            documents.popitem(last=False)[1][1].close()
+        return doc, documents[pdf_path][2]
+
+    def _page(self, pdf_path, page_number):
+        """Return (page, content hash) for a page of a PDF."""
+        from page_fingerprints import page_content_hash
+        doc, page_hashes = self._document(pdf_path)
+        page = doc[page_number]
+        if page_number not in page_hashes:
+            page_hashes[page_number] = page_content_hash(doc, page)
+        return page, page_hashes[page_number]
+
+    def zoom(self, level):
+        if not 0 <= level < len(self.zoom_levels):
+            raise ValueError(f"Zoom level {level} out of range (0-{len(self.zoom_levels) - 1})")
+        return self.zoom_levels[level]
+
+    def grid(self, pdf_path, page_number, level):
+        """Return the (columns, rows) of tiles covering a page at a zoom level."""
+        page, _ = self._page(pdf_path, page_number)
+        step = self.tile_size / self.zoom(level)
+        return -int(-page.rect.width // step), -int(-page.rect.height // step)
+
+    def tiles_for_rect(self, pdf_path, page_number, level, rect):
+        """Return the (col, row) of every tile overlapping rect (x0, y0, x1, y1, in points)."""
+        columns, rows = self.grid(pdf_path, page_number, level)
+        step = self.tile_size / self.zoom(level)
+        page, _ = self._page(pdf_path, page_number)
+        x0, y0, x1, y1 = (rect[0] - page.rect.x0, rect[1] - page.rect.y0,
+                          rect[2] - page.rect.x0, rect[3] - page.rect.y0)
+        return [(col, row)
+                for row in range(max(0, int(y0 // step)), min(rows, int(-(-y1 // step))))
+                for col in range(max(0, int(x0 // step)), min(columns, int(-(-x1 // step))))]
+
+    def _render(self, name, page, zoom, clip=None):
+        import fitz
+        with instrumentation.timer("preview.render"):
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+            data = pix.tobytes("png")
+        instrumentation.count("preview_tiles_rendered")
+        return self.cache.put(name, data)
+
+    def tile_path(self, pdf_path, page_number, level, col, row):
+        """Return the path of a tile's PNG, rendering it first if it isn't cached."""
+        page, page_hash = self._page(pdf_path, page_number)
+        zoom = self.zoom(level)
+        name = f"{page_hash[:32]}_z{zoom:g}_t{self.tile_size}_{col}_{row}.png"
+        path = self.cache.get(name)
+        if path is None:
+            import fitz
+            clip = fitz.Rect(tile_rect(col, row, zoom, self.tile_size, (page.rect.x0, page.rect.y0))) & page.rect
+            if clip.is_empty:
+                raise ValueError(f"Tile ({col}, {row}) is off page {page_number} at level {level}")
+            path = self._render(name, page, zoom, clip)
+        return path
+
+    def thumbnail_path(self, pdf_path, page_number=0, width=THUMBNAIL_WIDTH):
+        """Return the path of a whole-page thumbnail `width` pixels wide, rendering it if needed."""
+        page, page_hash = self._page(pdf_path, page_number)
+        name = f"{page_hash[:32]}_thumb{width}.png"
+        path = self.cache.get(name)
+        if path is None:
+            path = self._render(name, page, width / page.rect.width)
+        return path
+
+    def tiles(self, pdf_path, page_number, level, coords=None):
+        """Render (or fetch) many tiles of a page in the pool; return {(col, row): path}.
+
+        coords defaults to every tile on the page.
+        """
+        if coords is None:
+            columns, rows = self.grid(pdf_path, page_number, level)
+            coords = [(col, row) for row in range(rows) for col in range(columns)]
+        futures = {(col, row): self.pool.submit(self.tile_path, pdf_path, page_number, level, col, row)
+                   for col, row in coords}
+        return {coord: future.result() for coord, future in futures.items()}
+
+    def region(self, pdf_path, page_number, level, rect):
+        """Return {(col, row): path} for the tiles a zoomed view of rect needs."""
+        return self.tiles(pdf_path, page_number, level, self.tiles_for_rect(pdf_path, page_number, level, rect))
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render cached preview tiles and thumbnails of a PDF.")
+    parser.add_argument("pdf", nargs="+", help="PDF(s) to preview")
+    parser.add_argument("--page", type=int, default=0, help="Page number (0-based)")
+    parser.add_argument("--level", type=int, action="append", default=None,
+                        help=f"Zoom level(s) to tile, 0-{len(ZOOM_LEVELS) - 1} (zoom {', '.join(map(str, ZOOM_LEVELS))}); "
+                             "default: thumbnails only")
+    parser.add_argument("--cache-dir", default=DEFAULT_TILE_DIR, help="Tile cache directory")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                        help="Evict tiles past this many megabytes")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Render threads")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = 0
+    with PreviewService(args.cache_dir, int(args.max_mb * 1024 * 1024), args.workers) as service:
+        for pdf_path in args.pdf:
+            print(f"{pdf_path}: thumbnail {service.thumbnail_path(pdf_path, args.page)}")
+            count += 1
+            for level in args.level or ():
+                paths = service.tiles(pdf_path, args.page, level)
+                columns, rows = service.grid(pdf_path, args.page, level)
+                print(f"  level {level}: {columns}x{rows} tiles")
+                count += len(paths)
+        cache = service.cache
+        elapsed = time.perf_counter() - start
+        print(f"\n{count} images in {elapsed:.2f}s ({cache.stats['hits']} cached, {cache.stats['misses']} rendered, "
+              f"{cache.stats['evictions']} evicted; cache holds {cache.total_bytes / 1024 / 1024:.1f} MB)")
+    return 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+import numpy as np
+
+import instrumentation
+from spatial_index import SpatialIndex
+
+DEFAULT_ZOOM = 2
+DEFAULT_TILE = 32
+# Mean absolute difference per channel (0-255) above which a tile differs
+DEFAULT_THRESHOLD = 2.0
+
+@instrumentation.timed("rasterize")
+def render_page_array(doc, page_number, zoom=DEFAULT_ZOOM):
+    """Render a page to an (h, w, 3) uint8 array straight from Pixmap.samples."""
+    page = doc[page_number]
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False, colorspace=fitz.csRGB)
+    # Rows can be padded past width * n, so reshape by stride first
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return samples[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+def tile_scores(a, b, tile=DEFAULT_TILE):
+    """Return a (rows, cols) array of mean absolute differences per tile.
+
+    Each band of tile rows is compared with one memcmp first and skipped
+    when identical, so matching regions cost almost nothing.
+    """
+    height = max(a.shape[0], b.shape[0])
+    width = max(a.shape[1], b.shape[1])
+    rows = -(-height // tile)
+    cols = -(-width // tile)
+    scores = np.zeros((rows, cols), dtype=np.float32)
+
+    # Pad both images to whole tiles (white, like an empty page)
+    padded = []
+    for img in (a, b):
+        canvas = np.full((rows * tile, cols * tile, 3), 255, dtype=np.uint8)
+        canvas[:img.shape[0], :img.shape[1]] = img[:, :, :3]
+        padded.append(canvas)
+    a, b = padded
+
+    for row in range(rows):
+        band_a = a[row * tile:(row + 1) * tile]
+        band_b = b[row * tile:(row + 1) * tile]
+        if band_a.tobytes() == band_b.tobytes():
+            continue
+        diff = np.abs(band_a.astype(np.int16) - band_b.astype(np.int16))
+        # (tile, cols, tile, 3) -> mean over each tile's pixels and channels
+        scores[row] = diff.reshape(tile, cols, tile, 3).mean(axis=(0, 2, 3))
+    return scores
+
+def differing_regions(scores, threshold=DEFAULT_THRESHOLD):
+    """Group adjacent differing tiles and return their (row0, col0, row1, col1) boxes."""
+    mask = scores > threshold
+    seen = np.zeros_like(mask)
+    regions = []
+    for row, col in zip(*np.nonzero(mask)):
+        if seen[row, col]:
+            continue
+        # Flood fill over the (small) tile grid
+        stack = [(row, col)]
+        seen[row, col] = True
+        r0, c0, r1, c1 = row, col, row, col
+        while stack:
+            r, c = stack.pop()
+            r0, c0, r1, c1 = min(r0, r), min(c0, c), max(r1, r), max(c1, c)
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < mask.shape[0] and 0 <= nc < mask.shape[1] and mask[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    stack.append((nr, nc))
+        regions.append((int(r0), int(c0), int(r1) + 1, int(c1) + 1))
+    return regions
+
+def diff_page(path_a, path_b, page_number, zoom=DEFAULT_ZOOM, tile=DEFAULT_TILE,
+              threshold=DEFAULT_THRESHOLD, heatmap_path=None):
+    """Diff one page of two PDFs and return a result dict."""
+    with fitz.open(path_a) as doc_a, fitz.open(path_b) as doc_b:
+        result = {"page": page_number, "regions": []}
+        if page_number >= len(doc_a) or page_number >= len(doc_b):
+            result["status"] = "missing page"
+            return result
+
+        a = render_page_array(doc_a, page_number, zoom)
+        b = render_page_array(doc_b, page_number, zoom)
+        if a.shape == b.shape and a.tobytes() == b.tobytes():
+            # Identical rasters: nothing else to do
+            result["status"] = "identical"
+            return result
+
+        with instrumentation.timer("raster_diff.tiles"):
+            scores = tile_scores(a, b, tile)
+        result["max_score"] = float(scores.max())
+        regions = differing_regions(scores, threshold)
+        result["status"] = "different" if regions else "within threshold"
+
+        spans = []
+        for doc in (doc_a, doc_b):
+            for block in doc[page_number].get_text("dict")["blocks"]:
+                for line in block.get("lines", []):
+                    spans.extend(s for s in line["spans"] if s["text"].strip())
+        span_index = SpatialIndex(spans)
+
+        scale = tile / zoom
+        for r0, c0, r1, c1 in regions:
+            bbox = (c0 * scale, r0 * scale, c1 * scale, r1 * scale)
+            nearest = span_index.nearest(bbox)
+            span = nearest[0] if nearest else None
+            result["regions"].append({
+                "bbox": bbox,
+                "score": float(scores[r0:r1, c0:c1].max()),
+                "nearest_text": span["text"].strip() if span else None,
+            })
+
+        if heatmap_path:
+            save_heatmap(scores, heatmap_path, tile)
+        return result
+
+def save_heatmap(scores, output_path, tile=DEFAULT_TILE):
+    """Save the tile scores as a red heatmap PNG at raster resolution."""
+    from PIL import Image
+    peak = scores.max() or 1.0
+    intensity = (scores / peak * 255).astype(np.uint8)
+    heat = np.zeros(scores.shape + (3,), dtype=np.uint8)
+    heat[..., 0] = 255
+    heat[..., 1] = 255 - intensity
+    heat[..., 2] = 255 - intensity
+    heat = heat.repeat(tile, axis=0).repeat(tile, axis=1)
+    Image.fromarray(heat).save(output_path)
+
+def _heatmap_path(heatmap_dir, path_b, page_number):
+    if not heatmap_dir:
+        return None
+    stem = os.path.splitext(os.path.basename(path_b))[0]
+    return os.path.join(heatmap_dir, f"{stem}_p{page_number}_heatmap.png")
+
+def _diff_job(args):
+    path_a, path_b, page_number, zoom, tile, threshold, heatmap_dir = args
+    heatmap_path = _heatmap_path(heatmap_dir, path_b, page_number)
+    result = diff_page(path_a, path_b, page_number, zoom, tile, threshold, heatmap_path)
+    result["file_a"] = path_a
+    result["file_b"] = path_b
+    return result
+
+def diff_many(pairs, zoom=DEFAULT_ZOOM, tile=DEFAULT_TILE, threshold=DEFAULT_THRESHOLD,
+              heatmap_dir=None, workers=None, fingerprints=None):
+    """Diff many (expected, actual) PDF pairs, one process-pool job per page.
+
+    With a page_fingerprints.FingerprintIndex, pages with identical content
+    hashes are reported identical without rendering, and a pair of page
+    hashes diffed before with the same settings reuses the stored result,
+    so a re-check only renders pages whose fingerprint moved.
+    """
+    params = json.dumps([zoom, tile, threshold])
+    results = []
+    # (slot in results, job) for every page that has to be rendered
+    jobs = []
+    # slot -> (hash_a, hash_b), for storing freshly computed diffs
+    hash_pairs = {}
+    for path_a, path_b in pairs:
+        if fingerprints is not None:
+            hashes_a = fingerprints.page_hashes(path_a)
+            hashes_b = fingerprints.page_hashes(path_b)
+            page_count = max(len(hashes_a), len(hashes_b))
+        else:
+            with fitz.open(path_a) as doc_a, fitz.open(path_b) as doc_b:
+                page_count = max(len(doc_a), len(doc_b))
+        for page_number in range(page_count):
+            if fingerprints is not None and page_number < min(len(hashes_a), len(hashes_b)):
+                hash_a, hash_b = hashes_a[page_number], hashes_b[page_number]
+                cached = ({"page": page_number, "regions": [], "status": "identical"} if hash_a == hash_b
+                          else fingerprints.cached_diff(hash_a, hash_b, params))
+                heatmap_path = _heatmap_path(heatmap_dir, path_b, page_number)
+                # A cached difference still needs rendering if its heatmap is missing
+                if cached and (cached["status"] == "identical" or not heatmap_path or os.path.exists(heatmap_path)):
+                    instrumentation.count("raster_diff_cached")
+                    results.append(dict(cached, page=page_number, file_a=path_a, file_b=path_b))
+                    continue
+                hash_pairs[len(results)] = (hash_a, hash_b)
+            jobs.append((len(results), (path_a, path_b, page_number, zoom, tile, threshold, heatmap_dir)))
+            results.append(None)
+
+    if heatmap_dir:
+        os.makedirs(heatmap_dir, exist_ok=True)
+    job_args = [job for _, job in jobs]
+    if workers == 1 or len(job_args) <= 1:
+        done = [_diff_job(job) for job in job_args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_diff_job, job_args,
+                                 chunksize=max(1, len(job_args) // (4 * (workers or os.cpu_count() or 1)))))
+
+    for (slot, _), result in zip(jobs, done):
+        results[slot] = result
+        if slot in hash_pairs:
+            stored = {k: v for k, v in result.items() if k not in ("file_a", "file_b")}
+            fingerprints.store_diff(*hash_pairs[slot], params, stored)
+    if fingerprints is not None:
+        fingerprints.db.commit()
+    return results
+
+def print_diff_results(results):
+    """Print the differing regions found by diff_many."""
+    for result in results:
+        name_a = os.path.basename(result["file_a"])
+        name_b = os.path.basename(result["file_b"])
+        print(f"\n{name_a} vs {name_b}, page {result['page'] + 1}: {result['status']}")
+        for region in result["regions"]:
+            x0, y0, x1, y1 = region["bbox"]
+            print(f"  Differs at ({x0:.0f}, {y0:.0f})-({x1:.0f}, {y1:.0f}), "
+                  f"score {region['score']:.1f}, near '{region['nearest_text']}'")
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    expected = sys.argv[1] if len(sys.argv) > 1 else "pdfs/correct.pdf"
+    actual = sys.argv[2] if len(sys.argv) > 2 else "pdfs/generated.pdf"
+    start = time.perf_counter()
+    results = diff_many([(expected, actual)], heatmap_dir="pdfs")
+    print_diff_results(results)
+    print(f"\nDiffed {len(results)} page(s) in {time.perf_counter() - start:.2f}s")
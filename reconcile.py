@@ -0,0 +1,182 @@
+import json
+import re
+
+import numpy as np
+
+# Sales tax rates by jurisdiction; override or extend with --rates FILE
+TAX_RATES = {
+    "NYC": 0.08875,
+}
+DEFAULT_JURISDICTION = "NYC"
+
+# Rates are applied as integer parts-per-million so all arithmetic stays in cents
+RATE_SCALE = 1_000_000
+
+AMOUNT_FIELDS = ("subtotal", "tax", "total", "paid", "due")
+
+CHECKS = ("subtotal_mismatch", "tax_mismatch", "total_mismatch", "due_mismatch", "baked_in_tax",
+          "unknown_jurisdiction")
+
+def to_cents(value):
+    """Convert a float, number string or '$1,234.56' string to integer cents."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        text = value.replace("$", "").replace(",", "").strip("() ")
+        negative = text.startswith("-")
+        whole, _, frac = text.lstrip("-").partition(".")
+        cents = int(whole or 0) * 100 + int((frac + "00")[:2])
+        return -cents if negative else cents
+    return int(round(value * 100))
+
+def rate_ppm(rate):
+    """Return a tax rate (e.g. 0.08875) as integer parts per million."""
+    return int(round(rate * RATE_SCALE))
+
+def build_table(records, rates=TAX_RATES):
+    """Load invoice dicts (as from extract_invoice_data) into integer-cents arrays.
+
+    Returns a dict of NumPy arrays, one row per invoice: the amount fields,
+    'items_sum' and 'item_count', the jurisdiction's 'rate_ppm' and
+    whether it was in rates ('known_rate'; unknown ones get rate 0), plus
+    flattened 'item_cents' / 'item_owner' arrays for per-item checks and
+    an 'ids' list of invoice numbers.
+    """
+    jurisdictions = {name: rate_ppm(rate) for name, rate in rates.items()}
+    columns = {field: [] for field in AMOUNT_FIELDS}
+    rate_column = []
+    known_column = []
+    ids = []
+    item_cents = []
+    item_owner = []
+    for row, data in enumerate(records):
+        amounts = data.get('amounts') or {}
+        for field in AMOUNT_FIELDS:
+            columns[field].append(to_cents(amounts.get(field)))
+        jurisdiction = data.get('jurisdiction') or DEFAULT_JURISDICTION
+        rate_column.append(jurisdictions.get(jurisdiction, 0))
+        known_column.append(jurisdiction in jurisdictions)
+        ids.append(data.get('invoice_number'))
+        for item in data.get('service_items') or ():
+            item_cents.append(to_cents(item['price']))
+            item_owner.append(row)
+
+    rows = len(ids)
+    table = {field: np.array(values, dtype=np.int64) for field, values in columns.items()}
+    table['rate_ppm'] = np.array(rate_column, dtype=np.int64)
+    table['known_rate'] = np.array(known_column, dtype=bool)
+    table['item_cents'] = np.array(item_cents, dtype=np.int64)
+    table['item_owner'] = np.array(item_owner, dtype=np.int64)
+    # Summed in int64; bincount's float64 weights lose cents past 2**53
+    table['items_sum'] = np.zeros(rows, dtype=np.int64)
+    np.add.at(table['items_sum'], table['item_owner'], table['item_cents'])
+    table['item_count'] = np.bincount(table['item_owner'], minlength=rows).astype(np.int64)
+    table['ids'] = ids
+    return table
+
+def _gross_up(base_cents, rate):
+    # Round half up: base * (1 + rate)
+    return (base_cents * (RATE_SCALE + rate) + RATE_SCALE // 2) // RATE_SCALE
+
+def _is_baked_in(amount_cents, rate):
+    """True where an amount is a whole-dollar base grossed up by the tax rate."""
+    base = (amount_cents * RATE_SCALE + (RATE_SCALE + rate) // 2) // (RATE_SCALE + rate)
+    return (amount_cents > 0) & (base % 100 == 0) & (_gross_up(base, rate) == amount_cents)
+
+def reconcile(table, tolerance_cents=1):
+    """Run every consistency check over the table and return boolean arrays.
+
+    subtotal_mismatch    - line items don't add up to the subtotal
+    tax_mismatch         - tax is more than tolerance_cents off subtotal * rate
+    total_mismatch       - total != subtotal + tax
+    due_mismatch         - amount due != total - paid
+    baked_in_tax         - every line item is a whole-dollar price with the
+                           tax already added (like incorrect.pdf's $217.75 =
+                           $200.00 * 1.08875); a single arbitrary price
+                           matches by chance about 1% of the time, so
+                           one-item hits are candidates, not proof
+    unknown_jurisdiction - the invoice's jurisdiction isn't in the rates;
+                           the tax checks are skipped for it
+    """
+    subtotal, tax, total = table['subtotal'], table['tax'], table['total']
+    rate = table['rate_ppm']
+    has_items = table['item_count'] > 0
+    known = table['known_rate']
+
+    expected_tax = (subtotal * rate + RATE_SCALE // 2) // RATE_SCALE
+
+    # Per item, then "all items" per invoice via a count of the items that fail
+    item_rate = rate[table['item_owner']]
+    item_ok = _is_baked_in(table['item_cents'], item_rate)
+    failing = np.zeros(len(subtotal), dtype=np.int64)
+    np.add.at(failing, table['item_owner'], ~item_ok)
+
+    return {
+        "subtotal_mismatch": has_items & (table['items_sum'] != subtotal),
+        "tax_mismatch": known & (np.abs(tax - expected_tax) > tolerance_cents),
+        "total_mismatch": total != subtotal + tax,
+        "due_mismatch": table['due'] != total - table['paid'],
+        "baked_in_tax": known & has_items & (failing == 0),
+        "unknown_jurisdiction": ~known,
+    }
+
+def print_reconciliation(table, flags, show=10):
+    """Print how many invoices fail each check and a few example invoice numbers."""
+    rows = len(table['ids'])
+    print(f"Reconciled {rows} invoice(s)")
+    for check in CHECKS:
+        hits = np.flatnonzero(flags[check])
+        examples = ", ".join(str(table['ids'][i]) for i in hits[:show])
+        print(f"  {check:20} {len(hits):8d}" + (f"  e.g. {examples}" if len(hits) else ""))
+
+def load_records(path):
+    """Load invoice dicts from a JSONL file (one per line, as written by
+    `pdf-edit extract --all-pages`) or a JSON list."""
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def _extract_records(pdf_path):
+    from pdf_generator import iter_invoices
+    return list(iter_invoices(pdf_path))
+
+def extract_corpus_records(pdf_paths, workers=None):
+    """Extract every invoice in the given PDFs, in parallel across files."""
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [record for records in pool.map(_extract_records, pdf_paths) for record in records]
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from batch_generate import collect_sources
+
+    parser = argparse.ArgumentParser(description="Reconcile invoice amounts across a corpus.")
+    parser.add_argument("sources", nargs="+", help="PDFs, directories or globs, or .json/.jsonl extracted records")
+    parser.add_argument("--rates", default=None, help="JSON file of {jurisdiction: rate} to use")
+    parser.add_argument("--tolerance", type=int, default=1, help="Allowed tax difference in cents")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes for PDF extraction")
+    args = parser.parse_args()
+
+    rates = dict(TAX_RATES)
+    if args.rates:
+        with open(args.rates) as f:
+            rates.update(json.load(f))
+
+    start = time.perf_counter()
+    records = []
+    pdf_paths = []
+    for source in args.sources:
+        if re.search(r'\.jsonl?$', source):
+            records.extend(load_records(source))
+        else:
+            pdf_paths.extend(collect_sources(source))
+    if pdf_paths:
+        records.extend(extract_corpus_records(pdf_paths, args.workers))
+    loaded = time.perf_counter()
+
+    table = build_table(records, rates)
+    flags = reconcile(table, args.tolerance)
+    print_reconciliation(table, flags)
+    print(f"\nLoaded in {loaded - start:.2f}s, reconciled in {time.perf_counter() - loaded:.2f}s")
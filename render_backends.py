@@ -0,0 +1,306 @@
+from abc import ABC, abstractmethod
+
+from reportlab.lib.pagesizes import letter
+
+from output_profiles import get_profile, new_canvas, save_canvas
+
+class RenderBackend(ABC):
+    """Drawing primitives for one PDF document.
+
+    Coordinates are in points with y measured from the top of the page, like
+    the rest of the layout; a text y is its baseline. Backends without form
+    XObjects (supports_forms False) have the caller draw the static layer
+    directly instead; their form methods raise NotImplementedError.
+    """
+
+    name = None
+    supports_forms = False
+
+    @abstractmethod
+    def text(self, x, y, text, font_name, size):
+        """Draw text with its baseline at y."""
+
+    @abstractmethod
+    def rect(self, x, y, w, h, stroke=1, fill=0):
+        """Draw a rectangle whose top left corner is at (x, y)."""
+
+    @abstractmethod
+    def line(self, x1, y1, x2, y2, width=1):
+        """Draw a straight line."""
+
+    @abstractmethod
+    def draw_assets(self, names, placements=None):
+        """Draw the named branding images (see asset_registry)."""
+
+    @abstractmethod
+    def embed_payload(self, data):
+        """Attach the invoice data as the document's XMP metadata (see invoice_payload)."""
+
+    @abstractmethod
+    def new_page(self):
+        """Finish the current page and start a new one."""
+
+    @abstractmethod
+    def save(self):
+        """Write the document to the output."""
+
+    # Helper function for the form methods of backends without forms
+    def _no_forms(self):
+        raise NotImplementedError(f"The {self.name} render backend has no form XObjects "
+                                  f"(check supports_forms before using them)")
+
+    def has_form(self, name):
+        """Check whether a form XObject with this name has been defined."""
+        self._no_forms()
+
+    def begin_form(self, name):
+        """Start recording drawing into a named form XObject."""
+        self._no_forms()
+
+    def end_form(self):
+        """Finish the form XObject being recorded."""
+        self._no_forms()
+
+    def do_form(self, name):
+        """Draw a named form XObject on the current page."""
+        self._no_forms()
+
+class ReportlabBackend(RenderBackend):
+    """Draws on a reportlab canvas, converting y to reportlab's bottom-up coordinates."""
+
+    name = "reportlab"
+    supports_forms = True
+
+    def __init__(self, output=None, profile=None, canvas=None):
+        self.output = output
+        self.profile = get_profile(profile)
+        self.canvas = canvas if canvas is not None else new_canvas(output, self.profile)
+        self.height = letter[1]
+        # Current font, so repeated draws in the same font skip setFont
+        self.current_font = None
+
+    def text(self, x, y, text, font_name, size):
+        if self.current_font != (font_name, size):
+            self.canvas.setFont(font_name, size)
+            self.current_font = (font_name, size)
+        self.canvas.drawString(x, self.height - y, text)
+
+    def rect(self, x, y, w, h, stroke=1, fill=0):
+        self.canvas.rect(x, self.height - y - h, w, h, stroke=stroke, fill=fill)
+
+    def line(self, x1, y1, x2, y2, width=1):
+        self.canvas.setLineWidth(width)
+        self.canvas.line(x1, self.height - y1, x2, self.height - y2)
+
+    def has_form(self, name):
+        return self.canvas.hasForm(name)
+
+    def begin_form(self, name):
+        self.canvas.beginForm(name)
+
+    def end_form(self):
+        self.canvas.endForm()
+        # Font state inside the form is separate from the page's
+        self.current_font = None
+
+    def do_form(self, name):
+        self.canvas.doForm(name)
+
+    def draw_assets(self, names, placements=None):
+        from asset_registry import ASSET_PLACEMENTS, draw_assets
+        draw_assets(self.canvas, names, self.height, placements or ASSET_PLACEMENTS)
+
+    def embed_payload(self, data):
+        from invoice_payload import embed_payload
+        embed_payload(self.canvas, data)
+
+    def new_page(self):
+        self.canvas.showPage()
+        # A new page starts with a fresh graphics state
+        self.current_font = None
+
+    def save(self):
+        save_canvas(self.canvas, self.output, self.profile)
+
+# PyMuPDF's names for the standard fonts the layout uses
+PYMUPDF_BASE14 = {"Helvetica": "helv", "Helvetica-Bold": "hebo"}
+
+# Helper function for writing a number into a content stream
+def _num(value):
+    return f"{value:.4f}".rstrip("0").rstrip(".")
+
+# Helper function for writing text as a PDF literal string (WinAnsi encoded)
+def _pdf_string(text):
+    data = text.encode("cp1252", "replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+class PyMuPDFBackend(RenderBackend):
+    """Builds the document with PyMuPDF and writes each page's content stream directly.
+
+    PyMuPDF's own Shape.insert_text looks up the page's font resources
+    again on every call, which made it several times slower than
+    reportlab; here each font and branding image is added to the document
+    once and referenced from every page, and all of a page's drawing goes
+    into one content stream. There are no form XObjects.
+    Under the profile, compression maps to deflate, object_streams to a
+    packed rewrite and embed_fonts to subsetted TrueType fonts; base85 has
+    no equivalent and is ignored.
+    """
+
+    name = "pymupdf"
+
+    def __init__(self, output=None, profile=None):
+        import fitz
+        self.output = output
+        self.profile = get_profile(profile)
+        self.doc = fitz.open()
+        self.width, self.height = letter
+        # Font resource name -> font xref, once the font is in the document
+        self.fonts = {}
+        # Asset name -> image xref, once the image is in the document
+        self.images = {}
+        self.page = None
+        self.new_page()
+
+    def _link_resource(self, kind, resource, xref):
+        # New pages keep their resources in a separate object
+        where, value = self.doc.xref_get_key(self.page.xref, "Resources")
+        if where == "xref":
+            self.doc.xref_set_key(int(value.split()[0]), f"{kind}/{resource}", f"{xref} 0 R")
+        else:
+            self.doc.xref_set_key(self.page.xref, f"Resources/{kind}/{resource}", f"{xref} 0 R")
+
+    def _font(self, font_name):
+        """Return the resource name for a font, adding it to the current page if needed."""
+        resource = PYMUPDF_BASE14.get(font_name, font_name)
+        if resource in self.page_fonts:
+            return resource
+        xref = self.fonts.get(resource)
+        if xref is not None:
+            # Already in the document; just reference it from this page
+            self._link_resource("Font", resource, xref)
+        elif font_name in PYMUPDF_BASE14:
+            # A standard font needs no file or widths, only its dictionary
+            xref = self.doc.get_new_xref()
+            self.doc.update_object(xref, f"<</Type/Font/Subtype/Type1/BaseFont/{font_name}"
+                                         f"/Encoding/WinAnsiEncoding>>")
+            self._link_resource("Font", resource, xref)
+        else:
+            # A TrueType font registered with reportlab (see output_profiles)
+            from reportlab.pdfbase import pdfmetrics
+            xref = self.page.insert_font(fontname=resource, fontfile=pdfmetrics.getFont(font_name).face.filename,
+                                         set_simple=True)
+        self.fonts[resource] = xref
+        self.page_fonts.add(resource)
+        return resource
+
+    def text(self, x, y, text, font_name, size):
+        resource = self._font(font_name)
+        if not self.in_text:
+            # Text state (Tf) doesn't carry over from one text object to the next
+            self.ops.append(b"BT")
+            self.in_text = True
+            self.current_font = None
+        if self.current_font != (resource, size):
+            self.ops.append(f"/{resource} {_num(size)} Tf".encode())
+            self.current_font = (resource, size)
+        self.ops.append(f"1 0 0 1 {_num(x)} {_num(self.height - y)} Tm ".encode() + _pdf_string(text) + b" Tj")
+
+    # Helper function for leaving the text object before drawing paths (or images)
+    def _path(self, ops):
+        if self.in_text:
+            self.ops.append(b"ET")
+            self.in_text = False
+        self.ops.append(ops.encode())
+
+    def rect(self, x, y, w, h, stroke=1, fill=0):
+        paint = {(1, 0): "S", (0, 1): "f", (1, 1): "B"}.get((stroke, fill), "n")
+        self._path(f"1 w {_num(x)} {_num(self.height - y - h)} {_num(w)} {_num(h)} re {paint}")
+
+    def line(self, x1, y1, x2, y2, width=1):
+        self._path(f"{_num(width)} w {_num(x1)} {_num(self.height - y1)} m {_num(x2)} {_num(self.height - y2)} l S")
+
+    def _image(self, name):
+        """Return the resource name for an asset, adding it to the current page if needed."""
+        from asset_registry import asset_image_data, asset_xobject_name
+        resource = asset_xobject_name(name)
+        if resource in self.page_images:
+            return resource
+        xref = self.images.get(name)
+        if xref is None:
+            # The prepared JPEG goes in as-is, like asset_registry.register_asset
+            data, width, height, color_space = asset_image_data(name)
+            xref = self.doc.get_new_xref()
+            self.doc.update_object(xref, f"<</Type/XObject/Subtype/Image/Width {width}/Height {height}"
+                                         f"/ColorSpace/{color_space}/BitsPerComponent 8>>")
+            self.doc.update_stream(xref, data, compress=0)
+            self.doc.xref_set_key(xref, "Filter", "/DCTDecode")
+            self.images[name] = xref
+        self._link_resource("XObject", resource, xref)
+        self.page_images.add(resource)
+        return resource
+
+    def draw_assets(self, names, placements=None):
+        from asset_registry import ASSET_PLACEMENTS, asset_rect
+        for name in names:
+            resource = self._image(name)
+            x, y, w, h = asset_rect(name, placements or ASSET_PLACEMENTS)
+            self._path(f"q {_num(w)} 0 0 {_num(h)} {_num(x)} {_num(self.height - y - h)} cm /{resource} Do Q")
+
+    def embed_payload(self, data):
+        from invoice_payload import build_xmp
+        self.doc.set_xml_metadata(build_xmp(data).decode("utf-8"))
+
+    def _finish_page(self):
+        if self.page is None:
+            return
+        if self.in_text:
+            self.ops.append(b"ET")
+        xref = self.doc.get_new_xref()
+        self.doc.update_object(xref, "<<>>")
+        self.doc.update_stream(xref, b"\n".join(self.ops), compress=int(self.profile.compression))
+        self.page.set_contents(xref)
+        self.page = None
+
+    def new_page(self):
+        self._finish_page()
+        self.page = self.doc.new_page(width=self.width, height=self.height)
+        self.page_fonts = set()
+        self.page_images = set()
+        self.ops = []
+        self.in_text = False
+        self.current_font = None
+
+    def save(self):
+        self._finish_page()
+        if self.profile.embed_fonts:
+            self.doc.subset_fonts()
+        pdf = self.doc.tobytes(garbage=3 if self.profile.object_streams else 0,
+                               deflate=self.profile.compression,
+                               use_objstms=int(self.profile.object_streams))
+        self.doc.close()
+        if hasattr(self.output, "write"):
+            self.output.write(pdf)
+        else:
+            with open(self.output, "wb") as f:
+                f.write(pdf)
+
+BACKENDS = {
+    "reportlab": ReportlabBackend,
+    "pymupdf": PyMuPDFBackend,
+}
+DEFAULT_BACKEND = "reportlab"
+
+def new_backend(output, profile=None, backend=None):
+    """Return a backend (by name; None is the default) drawing a new document for output."""
+    try:
+        backend_class = BACKENDS[backend or DEFAULT_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown render backend '{backend}' (choose from {', '.join(BACKENDS)})") from None
+    return backend_class(output, profile)
+
+def as_backend(target):
+    """Pass a backend through, or wrap a bare reportlab canvas in one."""
+    if isinstance(target, RenderBackend):
+        return target
+    return ReportlabBackend(canvas=target)
@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Only the standard library is imported at module level so the client
+# starts fast; the PDF libraries are imported (once) inside the workers.
+
+# Without a per-user runtime directory the socket goes in a private
+# directory under the temp dir, created (mode 0700) by the daemon
+PRIVATE_SOCKET_DIR = os.path.join(tempfile.gettempdir(), f"pdf-edit-{os.getuid()}")
+DEFAULT_SOCKET = os.environ.get("PDF_EDIT_SOCKET") or os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or PRIVATE_SOCKET_DIR, "pdf-edit.sock")
+
+def _warm_worker():
+    """Import the PDF backends and fill the font metric caches once per worker."""
+    import string
+    import pdf_generator
+    import pdf_editor  # noqa: F401
+    import raster_diff  # noqa: F401
+    import preview_tiles  # noqa: F401
+    from font_metrics import string_width
+
+    for font_name in ("Helvetica", "Helvetica-Bold"):
+        for size in (9, 10, 12):
+            string_width(string.printable, font_name, size)
+    pdf_generator.build_static_layer(pdf_generator.COMPANY_ADDRESS)
+
+def job_extract(source):
+    from pdf_generator import extract_invoice_data
+    return extract_invoice_data(source, verbose=False)
+
+def job_generate(output, data=None, source=None, template=False):
+    from pdf_generator import extract_invoice_data, create_invoice_pdf
+    if data is None:
+        data = extract_invoice_data(source, verbose=False)
+    create_invoice_pdf(output, data, verbose=False, template=template)
+    return {"output": output}
+
+def job_edit(input, output=None, rules=None):
+    from pdf_editor import edit_pdf_in_place, CORRECTIONS
+    if rules is not None:
+        # Rules over the wire are plain [find, replace] pairs
+        rules = [(find, replace, None) for find, replace in rules]
+    report = edit_pdf_in_place(input, output, CORRECTIONS if rules is None else rules, verbose=False)
+    return {"output": output or input, "edits": report}
+
+def job_compare(expected, actual, zoom=2):
+    from raster_diff import diff_many
+    return diff_many([(expected, actual)], zoom=zoom, workers=1)
+
+# One preview service per worker, so its open documents and tile index
+# stay warm between requests
+_PREVIEW = None
+# Render threads per worker's preview service; the daemon already runs a
+# worker process per CPU
+PREVIEW_THREADS = 1
+
+def _preview_service():
+    global _PREVIEW
+    if _PREVIEW is None:
+        from preview_tiles import PreviewService
+        _PREVIEW = PreviewService(workers=PREVIEW_THREADS)
+    return _PREVIEW
+
+def job_thumbnail(pdf, page=0, width=None):
+    from preview_tiles import THUMBNAIL_WIDTH
+    return {"path": _preview_service().thumbnail_path(pdf, page, width or THUMBNAIL_WIDTH)}
+
+def job_tile(pdf, level, col, row, page=0):
+    return {"path": _preview_service().tile_path(pdf, page, level, col, row)}
+
+def job_region(pdf, level, rect, page=0):
+    # Tiles come back as [col, row, path] so they survive JSON
+    tiles = _preview_service().region(pdf, page, level, rect)
+    return {"tiles": [[col, row, path] for (col, row), path in sorted(tiles.items())]}
+
+JOBS = {
+    "extract": job_extract,
+    "generate": job_generate,
+    "edit": job_edit,
+    "compare": job_compare,
+    "thumbnail": job_thumbnail,
+    "tile": job_tile,
+    "region": job_region,
+}
+
+def _run_job(op, args):
+    return JOBS[op](**args)
+
+# Helper function for creating the private socket directory, refusing one
+# that another user made or that others can get into
+def _make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a private directory owned by this user")
+
+# Helper function for removing a stale socket; anything that isn't a
+# socket we own is left alone
+def _remove_socket(socket_path):
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise FileExistsError(f"{socket_path} exists and is not a socket owned by this user")
+    os.remove(socket_path)
+
+class RenderDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket server that dispatches JSON-line jobs to a warm worker pool."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, workers=None, max_queue=None, queue_timeout=5.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        # Backpressure: at most max_queue jobs in flight; callers past that
+        # wait up to queue_timeout, then get a 'busy' reply
+        self.slots = threading.BoundedSemaphore(max_queue or self.workers * 2)
+        self.queue_timeout = queue_timeout
+        if os.path.dirname(socket_path) == PRIVATE_SOCKET_DIR:
+            _make_private_dir(PRIVATE_SOCKET_DIR)
+        _remove_socket(socket_path)
+        super().__init__(socket_path, JobHandler)
+
+    def server_bind(self):
+        # Only this user may connect: the socket is created 0600 (bind
+        # applies the umask) rather than chmodded after the fact
+        old_umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(old_umask)
+
+    def warm_up(self):
+        """Start every worker now rather than on the first jobs."""
+        futures = [self.pool.submit(time.sleep, 0) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+        try:
+            _remove_socket(self.server_address)
+        except FileExistsError:
+            pass
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection: one JSON request per line."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            start = time.perf_counter()
+            response = {}
+            try:
+                request = json.loads(line)
+                response["id"] = request.get("id")
+                op = request["op"]
+                if op not in JOBS:
+                    raise ValueError(f"unknown op {op!r}")
+                if not self.server.slots.acquire(timeout=self.server.queue_timeout):
+                    response["status"] = "busy"
+                else:
+                    try:
+                        future = self.server.pool.submit(_run_job, op, request.get("args", {}))
+                        response["result"] = future.result()
+                        response["status"] = "ok"
+                    finally:
+                        self.server.slots.release()
+            except Exception as e:
+                response["status"] = "error"
+                response["error"] = f"{type(e).__name__}: {e}"
+            response["server_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+class DaemonClient:
+    """Thin client for the render daemon; records per-request latency."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.reader = self.sock.makefile("rb")
+        self.latencies = []
+        self.next_id = 0
+
+    def request(self, op, **args):
+        """Send one job and wait for its reply."""
+        self.next_id += 1
+        payload = json.dumps({"id": self.next_id, "op": op, "args": args}).encode() + b"\n"
+        start = time.perf_counter()
+        self.sock.sendall(payload)
+        response = json.loads(self.reader.readline())
+        response["client_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        self.latencies.append(response["client_ms"])
+        return response
+
+    def latency_summary(self):
+        """Return count and p50/p90/p99/max of the recorded latencies (ms)."""
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return {"count": 0}
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+        return {"count": len(ordered), "p50_ms": pct(50), "p90_ms": pct(90),
+                "p99_ms": pct(99), "max_ms": ordered[-1]}
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+def _exit_on_signal(signum, frame):
+    sys.exit(0)
+
+def serve(socket_path=DEFAULT_SOCKET, workers=None, max_queue=None):
+    """Run the daemon until interrupted or terminated."""
+    # Shut down cleanly (and remove the socket) on SIGTERM too
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    server = RenderDaemon(socket_path, workers, max_queue)
+    server.warm_up()
+    print(f"Render daemon listening on {socket_path} with {server.workers} warm workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm render daemon and client.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = sub.add_parser("serve", help="Run the daemon")
+    serve_parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes")
+    serve_parser.add_argument("--max-queue", type=int, default=None, help="Maximum jobs in flight")
+
+    client_parser = sub.add_parser("client", help="Send a job to a running daemon")
+    client_parser.add_argument("op", choices=sorted(JOBS), help="Job type")
+    client_parser.add_argument("args", nargs="?", default="{}", help="Job arguments as JSON")
+    client_parser.add_argument("-n", "--repeat", type=int, default=1, help="Send the job N times")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.socket, args.workers, args.max_queue)
+        return 0
+
+    client = DaemonClient(args.socket)
+    job_args = json.loads(args.args)
+    response = None
+    for _ in range(args.repeat):
+        response = client.request(args.op, **job_args)
+    client.close()
+    print(json.dumps(response, indent=2, default=str))
+    summary = client.latency_summary()
+    if summary["count"] > 1:
+        print(f"\n{summary['count']} requests: p50 {summary['p50_ms']:.2f} ms, "
+              f"p90 {summary['p90_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+    return 0 if response and response.get("status") == "ok" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import math
+from collections import defaultdict
+
+# Grid cell size in points; about a line of text high and a few words wide
+DEFAULT_CELL_SIZE = 36
+
+def bbox_distance(a, b):
+    """Return the gap between two (x0, y0, x1, y1) boxes (0 if they overlap)."""
+    dx = max(b[0] - a[2], a[0] - b[2], 0)
+    dy = max(b[1] - a[3], a[1] - b[3], 0)
+    return math.hypot(dx, dy)
+
+def _overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+class SpatialIndex:
+    """Uniform grid over element bboxes, one grid per page.
+
+    Elements are dicts with a 'bbox' (x0, y0, x1, y1) and optionally a
+    'page' (default 0), as returned by analyze_pdf_layout or the document
+    cache's spans. Queries only visit the grid cells they touch, so their
+    cost depends on the size of the region, not the size of the document.
+    """
+
+    def __init__(self, elements, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.elements = list(elements)
+        self.grids = defaultdict(lambda: defaultdict(list))
+        # Page extents, so row/column queries know where to stop
+        self.extents = {}
+        for i, elem in enumerate(self.elements):
+            page = elem.get('page', 0)
+            x0, y0, x1, y1 = elem['bbox']
+            grid = self.grids[page]
+            for cell in self._cells((x0, y0, x1, y1)):
+                grid[cell].append(i)
+            ex = self.extents.get(page)
+            self.extents[page] = (x0, y0, x1, y1) if ex is None else (
+                min(ex[0], x0), min(ex[1], y0), max(ex[2], x1), max(ex[3], y1))
+
+    def __len__(self):
+        return len(self.elements)
+
+    def _cells(self, bbox):
+        size = self.cell_size
+        for cx in range(math.floor(bbox[0] / size), math.floor(bbox[2] / size) + 1):
+            for cy in range(math.floor(bbox[1] / size), math.floor(bbox[3] / size) + 1):
+                yield cx, cy
+
+    def _matches(self, elem, types):
+        return types is None or elem.get('type') in types
+
+    def query_bbox(self, bbox, page=0, types=None):
+        """Return the elements whose bbox overlaps bbox, in document order."""
+        grid = self.grids.get(page)
+        if not grid:
+            return []
+        found = set()
+        for cell in self._cells(bbox):
+            for i in grid.get(cell, ()):
+                if i not in found and _overlaps(self.elements[i]['bbox'], bbox):
+                    found.add(i)
+        return [self.elements[i] for i in sorted(found) if self._matches(self.elements[i], types)]
+
+    def nearest(self, bbox, page=0, k=1, types=None, max_distance=None):
+        """Return up to k elements closest to bbox (a box or an (x, y) point), nearest first.
+
+        Searches rings of grid cells outwards from bbox and stops once the
+        next ring can't hold anything closer than the k-th best so far.
+        """
+        if len(bbox) == 2:
+            bbox = (bbox[0], bbox[1], bbox[0], bbox[1])
+        grid = self.grids.get(page)
+        if not grid:
+            return []
+        size = self.cell_size
+        cx0, cy0 = math.floor(bbox[0] / size), math.floor(bbox[1] / size)
+        cx1, cy1 = math.floor(bbox[2] / size), math.floor(bbox[3] / size)
+        # Rings needed to cover the whole page from here
+        ext = self.extents[page]
+        max_ring = max(cx0 - math.floor(ext[0] / size), math.floor(ext[2] / size) - cx1,
+                       cy0 - math.floor(ext[1] / size), math.floor(ext[3] / size) - cy1, 0)
+
+        best = {}
+        for ring in range(max_ring + 1):
+            if len(best) >= k:
+                kth = sorted(best.values())[k - 1]
+                # Anything in this ring is at least (ring - 1) cells away
+                if (ring - 1) * size > kth:
+                    break
+            if max_distance is not None and (ring - 1) * size > max_distance:
+                break
+            for cx in range(cx0 - ring, cx1 + ring + 1):
+                for cy in range(cy0 - ring, cy1 + ring + 1):
+                    # Only the outer edge of the ring is new
+                    if ring and cx0 - ring < cx < cx1 + ring and cy0 - ring < cy < cy1 + ring:
+                        continue
+                    for i in grid.get((cx, cy), ()):
+                        if i in best or not self._matches(self.elements[i], types):
+                            continue
+                        distance = bbox_distance(bbox, self.elements[i]['bbox'])
+                        if max_distance is None or distance <= max_distance:
+                            best[i] = distance
+
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0]))[:k]
+        return [self.elements[i] for i, _ in ranked]
+
+    def row(self, y, page=0, tolerance=3, types=None):
+        """Return the elements whose vertical extent includes y (± tolerance), left to right."""
+        ext = self.extents.get(page)
+        if ext is None:
+            return []
+        hits = self.query_bbox((ext[0], y - tolerance, ext[2], y + tolerance), page, types)
+        return sorted(hits, key=lambda elem: elem['bbox'][0])
+
+    def column(self, x, page=0, tolerance=3, types=None):
+        """Return the elements whose horizontal extent includes x (± tolerance), in y order."""
+        ext = self.extents.get(page)
+        if ext is None:
+            return []
+        hits = self.query_bbox((x - tolerance, ext[1], x + tolerance, ext[3]), page, types)
+        return sorted(hits, key=lambda elem: elem['bbox'][1])
+
+    def right_of(self, elem, page=None, types=None, tolerance=3):
+        """Return the elements on elem's row that start to the right of it, nearest first."""
+        if page is None:
+            page = elem.get('page', 0)
+        x0, y0, x1, y1 = elem['bbox']
+        mid = (y0 + y1) / 2
+        return [other for other in self.row(mid, page, tolerance, types)
+                if other is not elem and other['bbox'][0] >= x1 - tolerance]
@@ -0,0 +1,328 @@
+import io
+import os
+import tempfile
+import time
+from itertools import islice
+
+from reportlab.lib.pagesizes import letter
+
+from asset_registry import PAGE_ASSETS, SIGNATURE_ASSETS, ASSET_PLACEMENTS, draw_assets
+from font_metrics import string_width, wrap_text
+from invoice_extract import fill_amount_fallbacks
+from invoice_payload import build_xmp, embed_payload
+import instrumentation
+from invoice_layout import (PRICE_RIGHT_EDGE, QUANTITY_RIGHT_EDGE, bottom_field_ops, build_static_layer,
+                            draw_ops, header_field_ops)
+from output_profiles import get_profile, new_canvas, profile_fonts, save_canvas, save_document
+
+# Line-item row geometry (matches the single-page invoice layout)
+DESCRIPTION_WIDTH = 2.875 * 72
+LINE_HEIGHT = 12
+ROW_PADDING = 5
+
+# Vertical layout, in top-down coordinates
+SINGLE_PAGE_ROWS_TOP = 260      # First row on the single-page invoice
+SINGLE_PAGE_ROWS_BOTTOM = 300   # Amounts rule on the single-page invoice
+FIRST_PAGE_HEADER_Y = 225       # Table header below the customer block
+CONTINUATION_HEADER_Y = 105     # Table header on continuation pages, below the logo
+FIRST_PAGE_ROWS_BOTTOM = 545    # Rows on page 1 must end above the bottom section
+ROWS_BOTTOM = 720               # Rows must end above the continuation footer
+FOOTER_Y = 745                  # "Continued" subtotal line
+PAGE_LABEL_Y = 25               # "Page N", above the invoice number
+AMOUNTS_HEIGHT = 80             # Room needed for the final amounts block
+
+TABLE_HEADER_FORM = "line_item_table_header"
+
+# Pages drawn on one canvas before it is appended to the output file
+STATEMENT_CHUNK_PAGES = 200
+
+def layout_rows(items, font_name="Helvetica", font_size=10):
+    """Yield (item, wrapped_lines, row_height) for each line item, lazily."""
+    for item in items:
+        lines = wrap_text(item['description'], DESCRIPTION_WIDTH, font_name, font_size)
+        yield item, lines, max(ROW_PADDING, len(lines) * LINE_HEIGHT + ROW_PADDING)
+
+def fits_single_page(items, font_name="Helvetica"):
+    """Check whether the line items fit the fixed slot on the single-page invoice."""
+    # Every row is at least LINE_HEIGHT + ROW_PADDING tall, so only the first
+    # few items can ever fit; never look further than that
+    max_rows = (SINGLE_PAGE_ROWS_BOTTOM - SINGLE_PAGE_ROWS_TOP) // (LINE_HEIGHT + ROW_PADDING) + 1
+    y = SINGLE_PAGE_ROWS_TOP
+    for _, lines, row_height in layout_rows(islice(items, max_rows + 1), font_name):
+        # The last wrapped line must stay above the amounts rule
+        if y + (len(lines) - 1) * LINE_HEIGHT > SINGLE_PAGE_ROWS_BOTTOM - ROW_PADDING:
+            return False
+        y += row_height
+    return True
+
+def flow_rows(rows, first_top, page_top, page_bottom, first_bottom=None):
+    """Assign rows to pages.
+
+    Yields (page_index, y, item, lines) one row at a time, moving to a new
+    page whenever the next row would cross page_bottom (first_bottom on the
+    first page, if given). Runs in linear time and holds only the current row.
+    """
+    page_index = 0
+    y = first_top
+    for item, lines, row_height in rows:
+        bottom = first_bottom if page_index == 0 and first_bottom is not None else page_bottom
+        if y + row_height > bottom and y > (first_top if page_index == 0 else page_top):
+            page_index += 1
+            y = page_top
+        yield page_index, y, item, lines
+        y += row_height
+
+# Helper function for appending a rendered chunk to the output file (the
+# first chunk becomes the file); returns the open PyMuPDF document
+def _append_chunk(doc, pdf_bytes, path):
+    import fitz
+    if doc is None:
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+        return fitz.open(path)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as part:
+        doc.insert_pdf(part)
+    return doc
+
+@instrumentation.timed("render.statement")
+def create_statement_pdf(output_path, data, items=None, verbose=True, assets=(), payload=True, profile=None):
+    """Create a multi-page invoice whose line items flow across pages.
+
+    Page 1 has every field of the single-page invoice (details, both
+    customer columns, the bottom section and addresses); only the item
+    table and the amounts below it flow onto continuation pages.
+    items may be any iterable (e.g. a generator over a large export); it is
+    consumed once, row by row, so the items themselves are never all held.
+    Pages are drawn onto a canvas STATEMENT_CHUNK_PAGES at a time; each
+    full canvas is appended to the output file as an incremental update
+    (output to a file object goes through a temporary file), so memory
+    stays bounded by the chunk size. Each page repeats the table header, and every
+    page break carries a running subtotal forward. Of the named branding
+    assets, the logo goes on every page and signatures beside the final
+    amounts; each image is embedded once and referenced from every page.
+    With payload=True the data (with the final amounts) is embedded too;
+    items passed separately are streamed, so only their count is kept.
+    profile names the output profile (see output_profiles).
+    """
+    own_items = items is None
+    page_assets = [name for name in assets if name in PAGE_ASSETS]
+    signature_assets = [name for name in assets if name in SIGNATURE_ASSETS]
+
+    if items is None:
+        items = data['service_items']
+
+    # Chunks are repacked (if at all) with the finished file, not one by one
+    chunk_profile = get_profile(profile)._replace(object_streams=False)
+    chunk = io.BytesIO()
+    c = new_canvas(chunk, chunk_profile)
+    chunk_pages = 0
+    doc = None
+    chunk_path = None
+    fonts = profile_fonts(profile)
+    width, height = letter
+
+    # Current font, so repeated draws in the same font skip setFont
+    current_font = [None]
+
+    # Helper function for drawing text (with y-coordinate conversion)
+    def draw_text(x, y, text, size=10, bold=False, right_align=False):
+        if text is None:  # Handle None values
+            text = ""
+        text = str(text)  # Convert to string
+        font_name = fonts[1] if bold else fonts[0]
+        if current_font[0] != (font_name, size):
+            c.setFont(font_name, size)
+            current_font[0] = (font_name, size)
+        if right_align:
+            x = x - string_width(text, font_name, size)
+        c.drawString(x, height - y, text)
+
+    # Helper function for drawing rectangles (with y-coordinate conversion)
+    def draw_rect(x, y, w, h, stroke=1, fill=0):
+        c.rect(x, height - y - h, w, h, stroke=stroke, fill=fill)
+
+    # Helper function for drawing lines (with y-coordinate conversion)
+    def draw_line(x1, y1, x2, y2, width=1):
+        c.setLineWidth(width)
+        c.line(x1, height - y1, x2, height - y2)
+
+    # Helper function for the repeated table header, stamped from a form XObject
+    def draw_table_header(y):
+        if not c.hasForm(TABLE_HEADER_FORM):
+            c.beginForm(TABLE_HEADER_FORM)
+            c.rect(15, height - 25, 580, 25)
+            draw_text(18, 15, "Service Description", bold=True)
+            draw_text(290, 15, "Quantity", bold=True)
+            draw_text(473, 15, "Price", bold=True)
+            c.endForm()
+            current_font[0] = None
+        c.saveState()
+        c.translate(0, -(y - 5))
+        c.doForm(TABLE_HEADER_FORM)
+        c.restoreState()
+
+    # Helper function for ending a page; a full chunk is appended to the
+    # output file and drawing carries on on a fresh canvas
+    def end_page():
+        nonlocal c, chunk, chunk_pages, doc, chunk_path
+        c.showPage()
+        chunk_pages += 1
+        if chunk_pages < STATEMENT_CHUNK_PAGES:
+            return
+        if chunk_path is None:
+            if hasattr(output_path, "write"):
+                fd, chunk_path = tempfile.mkstemp(suffix=".pdf")
+                os.close(fd)
+            else:
+                chunk_path = output_path
+        save_canvas(c, chunk, chunk_profile)
+        doc = _append_chunk(doc, chunk.getvalue(), chunk_path)
+        with instrumentation.timer("statement.append"):
+            doc.saveIncr()
+        chunk = io.BytesIO()
+        c = new_canvas(chunk, chunk_profile)
+        chunk_pages = 0
+
+    # Helper function for the header at the top of every page
+    def draw_page_header(page_number):
+        # A new page starts with a fresh graphics state
+        current_font[0] = None
+        if page_number == 1:
+            # The single-page layout minus its item table and amounts
+            company_address = tuple(data['company_address'])
+            draw_ops(build_static_layer(company_address, ("header", "bottom")), draw_text, draw_rect, draw_line)
+            draw_assets(c, page_assets, height)
+            draw_ops(header_field_ops(data) + bottom_field_ops(data), draw_text, draw_rect, draw_line)
+            draw_text(445, PAGE_LABEL_Y, f"Page {page_number}", size=9)
+            draw_table_header(FIRST_PAGE_HEADER_Y)
+        else:
+            draw_text(50, 65, data['company_address'][0], size=12, bold=True)
+            draw_text(445, 40, f"Invoice # {data['invoice_number']}", size=12, bold=True)
+            draw_text(445, PAGE_LABEL_Y, f"Page {page_number}", size=9)
+            draw_assets(c, page_assets, height)
+            draw_table_header(CONTINUATION_HEADER_Y)
+
+    item_count = 0
+    first_top = FIRST_PAGE_HEADER_Y + 35
+    # Continuation rows start below the BROUGHT FORWARD line
+    page_top = CONTINUATION_HEADER_Y + 50
+
+    page_number = 1
+    running_subtotal = 0.0
+    y = first_top
+    draw_page_header(page_number)
+
+    rows = layout_rows(items, fonts[0])
+    for page_index, y, item, lines in flow_rows(rows, first_top, page_top, ROWS_BOTTOM, FIRST_PAGE_ROWS_BOTTOM):
+        if page_index + 1 != page_number:
+            # Close the current page with the subtotal so far
+            draw_text(330, FOOTER_Y, "CONTINUED - SUBTOTAL", size=9, bold=True)
+            draw_text(PRICE_RIGHT_EDGE, FOOTER_Y, f"${running_subtotal:.2f}", size=9, right_align=True)
+            end_page()
+            page_number = page_index + 1
+            draw_page_header(page_number)
+            draw_text(366, page_top - 15, "BROUGHT FORWARD", size=9, bold=True)
+            draw_text(PRICE_RIGHT_EDGE, page_top - 15, f"${running_subtotal:.2f}", size=9, right_align=True)
+
+        for i, line in enumerate(lines):
+            draw_text(18, y + (i * LINE_HEIGHT), line)
+        draw_text(QUANTITY_RIGHT_EDGE, y, str(item['quantity']), right_align=True)
+        draw_text(PRICE_RIGHT_EDGE, y, f"${item['price']:.2f}", right_align=True)
+        running_subtotal += item['price']
+        item_count += 1
+        y += max(ROW_PADDING, len(lines) * LINE_HEIGHT + ROW_PADDING)
+
+    # Final amounts, on a fresh page if they don't fit under the last row
+    amounts = {'subtotal': 0.0, 'tax': 0.0, 'total': 0.0, 'paid': 0.0, 'due': 0.0}
+    amounts.update(data.get('amounts') or {})
+    if not amounts['subtotal']:
+        amounts['subtotal'] = round(running_subtotal, 2)
+    fill_amount_fallbacks(amounts, [])
+    if y + AMOUNTS_HEIGHT > (FIRST_PAGE_ROWS_BOTTOM if page_number == 1 else ROWS_BOTTOM):
+        end_page()
+        page_number += 1
+        draw_page_header(page_number)
+        y = page_top
+
+    y += 15
+    if signature_assets:
+        # Signatures sit left of the amounts block, side by side
+        placements = {}
+        x = 18
+        for name in signature_assets:
+            _, _, w, h = ASSET_PLACEMENTS[name]
+            placements[name] = (x, y - 10, w, h)
+            x += w + 20
+        draw_assets(c, signature_assets, height, placements)
+    c.setLineWidth(1)
+    c.line(365, height - (y - 15), 500, height - (y - 15))
+    for label, value in [("SUBTOTAL", f"${amounts['subtotal']:.2f}"),
+                         ("TAX", f"${amounts['tax']:.2f}"),
+                         ("AMT PAID", f"(${amounts['paid']:.2f})"),
+                         ("TOTAL", f"${amounts['total']:.2f}"),
+                         ("AMOUNT DUE", f"${amounts['due']:.2f}")]:
+        draw_text(366, y, label, bold=True)
+        draw_text(PRICE_RIGHT_EDGE, y, value, right_align=True)
+        y += 15
+
+    if page_number > 1:
+        # Page 1's bottom section has the terms; repeat them on the last page
+        draw_text(295, FOOTER_Y, "Terms:", size=9)
+        draw_text(323, FOOTER_Y, data['terms'], size=9)
+
+    embedded = None
+    if payload:
+        embedded = dict(data, amounts=amounts, service_item_count=item_count)
+        if not own_items:
+            embedded['service_items'] = None
+    with instrumentation.timer("save"):
+        if doc is None:
+            # Everything fit in one chunk
+            if embedded is not None:
+                embed_payload(c, embedded)
+            save_canvas(c, chunk, profile)
+            if hasattr(output_path, "write"):
+                output_path.write(chunk.getvalue())
+            else:
+                with open(output_path, "wb") as f:
+                    f.write(chunk.getvalue())
+        else:
+            # The last page is always still on the current canvas
+            save_canvas(c, chunk, chunk_profile)
+            doc = _append_chunk(doc, chunk.getvalue(), chunk_path)
+            if embedded is not None:
+                doc.set_xml_metadata(build_xmp(embedded).decode("utf-8"))
+            save_document(doc, chunk_path, profile)
+            doc.close()
+            if chunk_path is not output_path:
+                with open(chunk_path, "rb") as f:
+                    output_path.write(f.read())
+                os.remove(chunk_path)
+    instrumentation.count("statement_pages", page_number)
+    if verbose:
+        print(f"\nCreated {page_number}-page invoice PDF at {output_path}")
+    return page_number
+
+def synthetic_items(count, description="PEST CONTROL SERVICE VISIT INCLUDING INSPECTION AND TREATMENT"):
+    """Generate count line items lazily, for exercising the table flow."""
+    for i in range(count):
+        yield {
+            'description': f"{description} #{i + 1}",
+            'quantity': "1.00",
+            'price': 25.0 + (i % 7),
+        }
+
+if __name__ == "__main__":
+    import sys
+    from pdf_generator import extract_invoice_data
+
+    data = extract_invoice_data("pdfs/correct.pdf", verbose=False)
+    data['amounts'] = {}
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+
+    print("=== Line-item table flow ===\n")
+    for count in counts:
+        start = time.perf_counter()
+        pages = create_statement_pdf(f"pdfs/statement_{count}.pdf", data, synthetic_items(count), verbose=False)
+        elapsed = time.perf_counter() - start
+        print(f"{count:>6} items: {pages:>5} pages in {elapsed:.2f}s ({elapsed * 1e6 / count:.1f} us/item)")
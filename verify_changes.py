@@ -1,20 +1,19 @@
-from PyPDF2 import PdfReader
-import re
+from document_cache import load_document
 
 def extract_dollar_amounts(pdf_path):
-    reader = PdfReader(pdf_path)
-    amounts = []
-    for page in reader.pages:
-        text = page.extract_text()
-        # Find all dollar amounts
-        for match in re.finditer(r'\$\d+\.\d{2}', text):
-            amounts.append(match.group())
-    return amounts
+    # Dollar amounts are parsed once per file and cached by content hash
+    return list(load_document(pdf_path, parts=("text",))["dollar_amounts"])
 
-print("=== Original PDF ===")
-original_amounts = extract_dollar_amounts("pdfs/incorrect.pdf")
-print("Dollar amounts found:", original_amounts)
+def main(original_path="pdfs/incorrect.pdf", modified_path="pdfs/corrected.pdf"):
+    print("=== Original PDF ===")
+    original_amounts = extract_dollar_amounts(original_path)
+    print("Dollar amounts found:", original_amounts)
 
-print("\n=== Modified PDF ===")
-modified_amounts = extract_dollar_amounts("pdfs/corrected.pdf")
-print("Dollar amounts found:", modified_amounts) 
\ No newline at end of file
+    print("\n=== Modified PDF ===")
+    modified_amounts = extract_dollar_amounts(modified_path)
+    print("Dollar amounts found:", modified_amounts)
+
+if __name__ == "__main__":
+    from document_cache import enable_disk_cache
+    enable_disk_cache()
+    main() 
\ No newline at end of file
@@ -1,15 +1,8 @@
-from PyPDF2 import PdfReader
-import re
+from document_cache import load_document
 
 def extract_dollar_amounts(pdf_path):
-    reader = PdfReader(pdf_path)
-    amounts = []
-    for page in reader.pages:
-        text = page.extract_text()
-        # Find all dollar amounts
-        for match in re.finditer(r'\$\d+\.\d{2}', text):
-            amounts.append(match.group())
-    return amounts
+    # Dollar amounts are parsed once per file and cached by content hash
+    return list(load_document(pdf_path, parts=("text",))["dollar_amounts"])
 
 def analyze_amounts(amounts):
     """Analyze the amounts in the correct order."""
@@ -44,7 +37,21 @@ def analyze_amounts(amounts):
         print(f"Tax Rate: {(tax/subtotal)*100:.3f}% (should be 8.875%)")
         print(f"Total Check: ${subtotal + tax:.2f} (should equal ${amount_due:.2f})")
 
-print("=== Generated PDF Analysis ===")
-amounts = extract_dollar_amounts("pdfs/generated.pdf")
-print("Dollar amounts found:", amounts)
-analyze_amounts(amounts) 
\ No newline at end of file
+def main(pdf_path="pdfs/generated.pdf"):
+    print("=== Generated PDF Analysis ===")
+    
+    # Generated PDFs carry their source data; check that instead of re-extracting
+    from invoice_payload import verify_pdf, print_verify_results
+    result = verify_pdf(pdf_path, cross_check=True)
+    if result["status"] != "missing":
+        print_verify_results([result], show_ok=True)
+        return
+    
+    amounts = extract_dollar_amounts(pdf_path)
+    print("Dollar amounts found:", amounts)
+    analyze_amounts(amounts)
+
+if __name__ == "__main__":
+    from document_cache import enable_disk_cache
+    enable_disk_cache()
+    main() 
\ No newline at end of file